@@ -0,0 +1,172 @@
+import os
+import json
+from concurrent.futures import ThreadPoolExecutor
+from chunking import count_tokens
+from doc_ids import parse_doc_id
+from json_output import parse_json_object, record_retry
+from pipeline_config import (
+    CONTEXT_WINDOW, JSON_MODE, OUTPUT_TOKENS, get_llm, judge_candidates, judge_results, llm_cache, llm_tracer,
+)
+from prompt_registry import get_prompt
+from run_manifest import RunManifest, atomic_write_json, hash_text
+
+# Levels of summaries of summaries before giving up and sending what is left
+MAX_SUMMARY_LEVELS = 5
+
+
+def aggregate_evaluations(input_folder, candidates):
+    """
+    Aggregate evaluations from all per-document JSON files (kept for folders
+    outside the results store; run_assessment reads the store).
+    """
+    aggregated_scores = {model: [] for model in candidates}
+    aggregated_explanations = {model: [] for model in candidates}
+
+    # Collect evaluation files
+    evaluation_files = [f for f in os.listdir(input_folder) if f.endswith('.json')]
+
+    for eval_file in evaluation_files:
+        file_path = os.path.join(input_folder, eval_file)
+        with open(file_path, 'r') as f:
+            evaluations = json.load(f)
+            for model in candidates:
+                if model in evaluations:
+                    aggregated_scores[model].append(evaluations[model]["score"])
+                    aggregated_explanations[model].append(evaluations[model]["explanation"])
+
+    return aggregated_scores, aggregated_explanations
+
+
+def prompt_budget(prompt):
+    """Tokens left for the explanations in a prompt, keeping room for the answer."""
+    return CONTEXT_WINDOW - OUTPUT_TOKENS - count_tokens(prompt)
+
+
+def make_batches(texts, groups, max_tokens):
+    """
+    Split texts into consecutive batches of at most max_tokens tokens that never
+    mix two groups, so a new document only changes the batches of its own group.
+    """
+    batches = []
+    current, current_tokens, current_group = [], 0, None
+    for text, group in zip(texts, groups):
+        tokens = count_tokens(text)
+        if current and (group != current_group or current_tokens + tokens > max_tokens):
+            batches.append(current)
+            current, current_tokens = [], 0
+        current.append(text)
+        current_tokens += tokens
+        current_group = group
+    if current:
+        batches.append(current)
+    return batches
+
+
+def summarize_batch(llm_evaluator, model_name, explanations):
+    prompt = get_prompt("assessment_batch_summary").format(model_name=model_name, explanations="\n\n".join(explanations))
+    with llm_tracer.context(step="batch_summary"):
+        return llm_evaluator.invoke(prompt).strip()
+
+
+def reduce_explanations(llm_evaluator, model_name, explanations, groups, max_workers=4):
+    """
+    Shrink the explanations until they fit in the assessment prompt: they are
+    summarized in batches, in parallel, and the summaries are summarized again
+    level by level. Explanations that already fit are returned unchanged.
+
+    Only the texts of the current level are kept, so the prompt size does not
+    grow with the number of documents. The first level is batched per bank and
+    every summary is stored in the response cache, keyed by the text of its
+    batch, so after new evaluations only the batches that changed are sent.
+    """
+    final_budget = prompt_budget(get_prompt("assessment"))
+    batch_budget = prompt_budget(get_prompt("assessment_batch_summary"))
+
+    for level in range(1, MAX_SUMMARY_LEVELS + 1):
+        if count_tokens("\n\n".join(explanations)) <= final_budget:
+            break
+        batches = make_batches(explanations, groups, batch_budget)
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(batches))) as executor:
+            explanations = list(executor.map(llm_tracer.bind(lambda batch: summarize_batch(llm_evaluator, model_name, batch)),
+                                             batches))
+        groups = [None] * len(explanations)  # Upper levels may mix banks
+        print(f"{model_name}: level {level}, {sum(len(b) for b in batches)} texts summarized in {len(batches)} batches")
+    else:
+        if count_tokens("\n\n".join(explanations)) > final_budget:
+            print(f"Warning: the summaries for {model_name} still exceed the context window; the judge may see them truncated.")
+
+    return explanations
+
+
+def generate_model_assessment(llm_evaluator, model_name, scores, explanations):
+    """Generate a general assessment for a model using the judge model."""
+    average_score = sum(scores) / len(scores)
+    explanations_text = "\n\n".join(explanations)
+
+    prompt = get_prompt("assessment").format(
+        model_name=model_name,
+        average_score=average_score,
+        explanations=explanations_text
+    )
+
+    for attempt in range(3):  # Retry up to 3 times if needed
+        if attempt > 0:
+            record_retry()
+        with llm_tracer.context(step="assessment", attempt=attempt):
+            with llm_cache.refresh(attempt > 0):  # Retries must reach the model, not the cache
+                response = llm_evaluator.invoke(prompt).strip()
+            result = parse_json_object(response)
+            valid = result is not None and "strengths" in result and "weaknesses" in result
+            llm_tracer.outcome("valid" if valid else "invalid")
+        if valid:
+            return result
+        if result is None:
+            print(f"Attempt {attempt + 1}: Invalid format, retrying...")
+
+    raise ValueError(f"Failed to generate assessment for {model_name} after 3 attempts.")
+
+
+def run_assessment(judge, input_folder, output_folder, manifest_path, max_workers=4):
+    """
+    Summarize the judge's per-document evaluations into one assessment per
+    candidate model. When the explanations do not fit in one prompt they are
+    first reduced by reduce_explanations, using max_workers parallel calls.
+    """
+    llm_evaluator = get_llm(judge)
+    llm_json = get_llm(judge, json_mode=JSON_MODE)  # The batch summaries are plain text, the assessment is JSON
+    candidates = judge_candidates(judge)
+
+    os.makedirs(output_folder, exist_ok=True)  # Ensure output folder exists
+    manifest = RunManifest(manifest_path)
+
+    # Aggregate per-document evaluations from the results store, importing the files it does not have yet
+    judge_results.import_folder(judge, input_folder)
+    scores, explanations, docs = judge_results.aggregate(judge, candidates)
+
+    # Generate assessments for each model
+    for model in candidates:
+        if scores[model] and explanations[model]:
+            # Skip models whose evaluations did not change since the last assessment
+            input_hash = hash_text(llm_evaluator.model, llm_evaluator.num_ctx, get_prompt("assessment"),
+                                   get_prompt("assessment_batch_summary"),
+                                   json.dumps(scores[model]), *explanations[model])
+            if manifest.is_done(model, input_hash):
+                print(f"[{judge}] Assessment for {model} is up to date. Skipping.")
+                continue
+
+            print(f"[{judge}] Generating assessment for model: {model}")
+            manifest.start(model, input_hash)
+            try:
+                banks = [parse_doc_id(doc)[1] for doc in docs[model]]
+                with llm_tracer.context(stage="assess", model=llm_evaluator.model, doc=model):
+                    summaries = reduce_explanations(llm_evaluator, model, explanations[model], banks, max_workers)
+                    assessment = generate_model_assessment(llm_json, model, scores[model], summaries)
+                output_file = os.path.join(output_folder, f"{model}_assessment.json")
+                atomic_write_json(output_file, assessment)
+                manifest.complete(model, input_hash, output_file)
+                print(f"[{judge}] Assessment for {model} saved to {output_file}.")
+            except Exception as e:
+                manifest.fail(model, input_hash, e)
+                print(f"[{judge}] Failed to generate assessment for {model}: {e}")
+        else:
+            print(f"[{judge}] No data available for model: {model}.")
@@ -0,0 +1,112 @@
+"""
+Micro-benchmark of text_cleaning.clean against the notebook 3 version.
+
+Cleans every transcript of the corpus with both implementations, checks
+that the outputs are byte-identical and reports the time of each one. The
+raw texts come from the PDF extraction cache (pdf_extraction.py) or from a
+folder of .txt files.
+
+    python benchmark_cleaning.py                          # the Transcripts/ folder next to DATA_FOLDER
+    python benchmark_cleaning.py --texts /home/arthurblb/mestrado/transcricoes_processadas/ --repeat 5
+"""
+import re
+import time
+import argparse
+from pdf_extraction import CACHE_FOLDER, load_texts
+from data_folder import TRANSCRIPT_FOLDER
+from text_cleaning import QNA_START_PATTERNS, clean, split_text
+
+
+# Copied from 3.Separate_Q&A_Workflow.ipynb, used as the reference output
+def clean_reference(text):
+
+    text = text.replace("\n", ' ')
+    text = text.replace("”", '')
+    text = text.replace("“", '')
+    text = text.replace("\"", '')
+    text = text.replace("\uf0b7", '')
+
+    #lista com bolinha
+    text = re.sub(r'(\s)?(;\s)?(•)', "; ", text.strip())
+    text = re.sub(r'(: ;)', ": ", text.strip())
+    text = re.sub(r'(\.;)', ". ", text.strip())
+
+    # nu-2021-4T21-Script 4T21.pdf
+    text = re.sub(r'(; -)', ". ", text.strip())
+    text = re.sub(r'(\. -)', ". ", text.strip())
+    text = re.sub(r'^(-)', "", text.strip())
+    text = re.sub(r'(: \d.)', ': .', text.strip())
+    text = re.sub(r'(; e (\d+\.)?)', '.', text.strip())
+    text = re.sub(r'(: ●)', '.', text.strip())
+    text = re.sub(r'(; ●)', '.', text.strip())
+    text = re.sub(r'(●)', '', text.strip())
+
+    text = re.sub("_______________________________________________________________", "", text)
+
+    text = re.sub(r"Sra\.", "Senhora ", text, flags=re.IGNORECASE)
+    text = re.sub(r"Sr\.", "Senhor ", text, flags=re.IGNORECASE)
+    text = re.sub(r"Srs\.", "Senhores ", text, flags=re.IGNORECASE)
+    text = re.sub(r'b\.p\.\s([A-Z])', 'bp. \\1', text).strip()
+    text = re.sub('b.p.', 'bp', text).strip()
+    text = re.sub('p.p.', 'pp', text).strip()
+    text = re.sub('help!', 'help', text).strip() # bmgb -> tirar a exclamação para evitar quebra de sentenças
+
+    text = re.sub(r'\s+', ' ', text).strip() # deixar por ultimo, pois as substituicoes anteriores podem inserir multiplos espaços
+
+    return text
+
+
+def split_text_reference(text):
+    pattern = r"|".join(QNA_START_PATTERNS)
+    match = re.search(pattern, text, re.IGNORECASE)
+    if match:
+        split_index = match.start()
+        return text[:split_index].strip(), text[split_index:].strip()
+    return text, None
+
+
+def time_function(function, texts, repeat):
+    """Best wall time over repeat runs of function on every text."""
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for text in texts:
+            function(text)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare the compiled clean/split_text with the notebook version.")
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--pdfs", default=TRANSCRIPT_FOLDER, help="Folder with the transcript PDFs")
+    source.add_argument("--texts", help="Folder with raw .txt transcripts")
+    parser.add_argument("--pdf-cache", default=CACHE_FOLDER, help="Folder of the PDF extraction cache")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per implementation (the best one is reported)")
+    args = parser.parse_args()
+
+    texts = load_texts(args.pdfs, args.texts, args.pdf_cache)
+    mismatches = [name for name, text in texts.items() if clean(text) != clean_reference(text)]
+    cleaned = [clean(text) for text in texts.values()]
+    mismatches += [name for name, text in zip(texts, cleaned) if split_text(text) != split_text_reference(text)]
+
+    size_mb = sum(len(text.encode("utf-8")) for text in texts.values()) / 1e6
+    print(f"{len(texts)} transcripts, {size_mb:.1f} MB")
+    if mismatches:
+        print(f"Output differs from the notebook version for: {', '.join(sorted(set(mismatches)))}")
+    else:
+        print("Output identical to the notebook version")
+
+    for name, function, inputs in [
+        ("clean (notebook)", clean_reference, list(texts.values())),
+        ("clean (compiled)", clean, list(texts.values())),
+        ("split_text (notebook)", split_text_reference, cleaned),
+        ("split_text (compiled)", split_text, cleaned),
+    ]:
+        elapsed = time_function(function, inputs, args.repeat)
+        print(f"{name:<22} {elapsed:8.3f}s  {size_mb / elapsed if elapsed else 0:8.1f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
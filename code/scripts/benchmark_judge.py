@@ -0,0 +1,96 @@
+"""
+Compare the tokens processed per document by the two judge modes.
+
+Runs the judge on a few transcripts in "single" mode (one call per candidate
+answer) and in "shared" mode (all answers in one call), bypassing the response
+cache, and reports the prompt and completion tokens counted by Ollama.
+Nothing is written to the results folders.
+
+    python benchmark_judge.py --judge llama --docs 5
+"""
+import time
+import argparse
+import threading
+from langchain_community.llms import Ollama
+from langchain_core.callbacks import BaseCallbackHandler
+from judge import JUDGE_MODES, evaluate_document, read_file
+from pipeline import load_corpus
+from pipeline_config import JSON_MODE, KEEP_ALIVE, MODELS, candidate_output_file, judge_candidates, llm_cache, qna_folder
+
+
+class TokenCounter(BaseCallbackHandler):
+    """Sum the prompt and completion tokens reported by Ollama for every call."""
+
+    def __init__(self):
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._lock = threading.Lock()
+
+    def on_llm_end(self, response, **kwargs):
+        with self._lock:
+            for generations in response.generations:
+                for generation in generations:
+                    info = generation.generation_info or {}
+                    self.calls += 1
+                    self.prompt_tokens += info.get("prompt_eval_count", 0)
+                    self.completion_tokens += info.get("eval_count", 0)
+
+
+def benchmark_mode(judge, mode, documents):
+    """Judge the documents ({filename: (text, responses)}) in one mode and return the totals."""
+    counter = TokenCounter()
+    llm_evaluator = Ollama(model=MODELS[judge], keep_alive=KEEP_ALIVE, format="json" if JSON_MODE else None,
+                           callbacks=[counter])
+
+    start = time.time()
+    with llm_cache.refresh():  # Every call must reach the model to be counted
+        for text, responses in documents.values():
+            evaluate_document(llm_evaluator, text, responses, mode)
+    elapsed = time.time() - start
+
+    return {
+        "calls": counter.calls,
+        "prompt_tokens": counter.prompt_tokens,
+        "completion_tokens": counter.completion_tokens,
+        "seconds": elapsed,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tokens processed per document by each judge mode.")
+    parser.add_argument("--judge", choices=list(MODELS), default=list(MODELS)[0])
+    parser.add_argument("--docs", type=int, default=5, help="Number of transcripts to judge")
+    args = parser.parse_args()
+
+    candidates = judge_candidates(args.judge)
+    corpus = load_corpus(qna_folder())
+    documents = {}
+    for filename, text in corpus.items():
+        name_file = filename.split(".")[0]
+        try:
+            responses = {c: read_file(candidate_output_file(c, name_file)) for c in candidates}
+        except FileNotFoundError:
+            continue  # Not every candidate answered this transcript yet
+        documents[filename] = (text, responses)
+        if len(documents) == args.docs:
+            break
+
+    if not documents:
+        print("No transcript has answers from every candidate.")
+        return
+
+    num_docs = len(documents)
+    print(f"Judge {args.judge} on {num_docs} documents, candidates: {', '.join(candidates)}")
+    print(f"{'mode':<8} {'calls/doc':>10} {'prompt/doc':>11} {'output/doc':>11} {'total/doc':>10} {'s/doc':>7}")
+    for mode in JUDGE_MODES:
+        result = benchmark_mode(args.judge, mode, documents)
+        total = result["prompt_tokens"] + result["completion_tokens"]
+        print(
+            f"{mode:<8} {result['calls'] / num_docs:>10.1f} {result['prompt_tokens'] / num_docs:>11.0f} "
+            f"{result['completion_tokens'] / num_docs:>11.0f} {total / num_docs:>10.0f} {result['seconds'] / num_docs:>7.2f}"
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,443 @@
+"""
+End-to-end benchmark of the pipeline against a local stand-in for Ollama.
+
+A fake server speaking the Ollama generate API answers every request with a
+plausible answer for its prompt (topics for the extraction, "Sim" for the
+validation, JSON scores for the judge, ...), after a configurable latency and
+at a configurable generation speed, and turns a configurable share of the
+answers into malformed ones. The extraction, judge and assessment stages then
+run unchanged, in a separate process, on a synthetic corpus in a temporary
+data folder (nothing is read from or written to Divided_text), so a run takes
+seconds instead of hours of inference.
+
+For every stage it reports documents per second, model calls per document,
+retries and tokens; the peak memory of the pipeline process is reported for
+the whole run. A report can be saved as a baseline and later runs compared
+with it:
+
+    python benchmark_pipeline.py --docs 40 --save-baseline /tmp/baseline.json
+    python benchmark_pipeline.py --docs 40 --baseline /tmp/baseline.json
+    python benchmark_pipeline.py --latency 0.5 --tokens-per-second 30 --malformed-rate 0.1 --judge-mode shared
+    python benchmark_pipeline.py --endpoints 3 --stalled-endpoints 1    # router and failover
+    python benchmark_pipeline.py --prompt-tokens-per-second 2000 --strip-boilerplate
+"""
+import os
+import re
+import sys
+import json
+import time
+import random
+import hashlib
+import argparse
+import tempfile
+import threading
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from chunking import count_tokens
+from prompt_registry import get_prompt
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+STAGES = ["extract", "judge", "assess"]
+
+# Requests sent by each stage, by the template they come from
+STAGE_KINDS = {
+    "extract": ["extraction", "extraction_reduce", "validation"],
+    "judge": ["judge_evaluation", "judge_evaluation_shared"],
+    "assess": ["assessment", "assessment_batch_summary"],
+}
+# Templates recognised in the prompts, the most specific first: the judge prompts
+# contain a task and answers in the extraction format, the extraction prompt is the fallback
+KINDS = ["judge_evaluation_shared", "judge_evaluation", "assessment_batch_summary", "assessment", "validation",
+         "extraction_reduce", "qna_cutoff", "extraction"]
+
+TOPICS = ["Margem financeira", "Inadimplência", "Carteira de crédito", "Taxa Selic", "Custo de captação",
+          "Despesas administrativas", "Segmento agro", "Cartão de crédito", "Provisões", "Capital regulatório",
+          "Digitalização", "Crédito imobiliário", "Seguros", "Tarifas bancárias", "Middle market"]
+WORDS = ("o a de que do da em um para com não uma os no se na por mais as dos como mas foi ao ele das tem à seu "
+         "sua ou ser quando muito nos já está também só pelo pela até isso entre era depois sem mesmo aos ter "
+         "crédito carteira margem resultado trimestre banco clientes inadimplência custo receita despesa capital "
+         "guidance crescimento provisão cenário juros taxa segmento empresas pessoa física rentabilidade").split()
+BANKS = ["itub", "bbas", "sanb", "bbdc", "bpan", "brsr"]
+# Opening script and disclaimer read in every call of a bank, and the operator's line before each question
+OPENING = ("Operadora: Bom dia e obrigada por aguardarem. Sejam bem-vindos à teleconferência do {bank} para discussão "
+           "dos resultados do {quarter}º trimestre de {year}. Informamos que este evento está sendo gravado e que "
+           "todos os participantes estarão apenas ouvindo durante a apresentação. As declarações que possam ser "
+           "feitas durante esta teleconferência relativas às perspectivas de negócios do {bank}, projeções e metas "
+           "operacionais e financeiras constituem-se em crenças e premissas da diretoria, bem como em informações "
+           "atualmente disponíveis. Considerações futuras não são garantias de desempenho. Envolvem riscos, "
+           "incertezas e premissas, pois se referem a eventos futuros.")
+OPERATOR = ("Operadora: Com licença, senhoras e senhores, lembrando que para fazer uma pergunta basta digitar asterisco "
+            "um. Nossa próxima pergunta vem de {name}, do banco {broker}.")
+
+
+def template_marker(name):
+    """The first line of a template up to its first placeholder, which identifies its prompts."""
+    first_line = next(line for line in get_prompt(name).splitlines() if line.strip())
+    return first_line.split("{")[0].strip()
+
+
+class FakeOllama:
+    """
+    HTTP server answering /api/generate like Ollama.
+
+    Each answer takes latency seconds plus its tokens divided by
+    tokens_per_second (and its prompt tokens divided by
+    prompt_tokens_per_second, when given), and malformed_rate of them are replaced by an answer
+    in the wrong format. Calls, tokens and repeated prompts (retries) are
+    counted per template. start() can be called several times to serve on
+    several ports, as separate endpoints sharing the counters; a stalled
+    endpoint accepts the requests and never answers.
+    """
+
+    def __init__(self, latency=0.05, tokens_per_second=200.0, malformed_rate=0.0, seed=0, prompt_tokens_per_second=0.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.prompt_tokens_per_second = prompt_tokens_per_second
+        self.malformed_rate = malformed_rate
+        self.markers = [(kind, template_marker(kind)) for kind in KINDS]
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._seen = set()
+        self.counts = {}
+        self.endpoint_calls = {}
+        self._servers = []
+        self._stopped = threading.Event()
+
+    def kind(self, prompt):
+        for kind, marker in self.markers:
+            if marker in prompt:
+                return kind
+        return "extraction"
+
+    def answer(self, kind, prompt, malformed):
+        if kind in ("extraction", "extraction_reduce"):
+            if malformed:
+                return "Os principais tópicos foram a margem e o crédito, e o público pareceu satisfeito."
+            with self._lock:
+                topics = self._random.sample(TOPICS, 5)
+            return "Tarefa 1:\n" + "\n".join(f"- {topic}" for topic in topics) + "\n\nTarefa 2:\n- positivo"
+        if kind == "validation":
+            return "Não" if malformed else "Sim"
+        if malformed:
+            return "Desculpe, não consigo avaliar essa resposta no formato pedido."
+        if kind == "judge_evaluation":
+            return json.dumps({"score": 7, "explanation": "Os tópicos são relevantes, mas alguns são genéricos."},
+                              ensure_ascii=False)
+        if kind == "judge_evaluation_shared":
+            labels = re.findall(r"Resposta do Modelo ([A-Z]):", prompt)
+            return json.dumps({label: {"score": 7, "explanation": "Tópicos relevantes."} for label in labels},
+                              ensure_ascii=False)
+        if kind == "assessment":
+            return json.dumps({"strengths": ["Tópicos relevantes"], "weaknesses": ["Tópicos genéricos"],
+                               "recommendations": ["Ser mais específico"], "summary": "Bom desempenho."},
+                              ensure_ascii=False)
+        if kind == "assessment_batch_summary":
+            return "- Tópicos relevantes\n- Alguns tópicos genéricos"
+        return "Agora vamos iniciar a sessão de perguntas e respostas."
+
+    def generate(self, body):
+        """Return (answer, stats) for a generate request, after the simulated generation time."""
+        prompt = body.get("prompt", "")
+        kind = self.kind(prompt)
+        key = hashlib.sha256(f"{body.get('model')}\x00{prompt}".encode("utf-8")).hexdigest()
+        with self._lock:
+            malformed = self._random.random() < self.malformed_rate
+            retry = key in self._seen and kind != "validation"  # the same validation prompt can come from two documents
+            self._seen.add(key)
+        text = self.answer(kind, prompt, malformed)
+        prompt_tokens = count_tokens(prompt)
+        completion_tokens = count_tokens(text)
+        prompt_seconds = self.latency + (prompt_tokens / self.prompt_tokens_per_second if self.prompt_tokens_per_second else 0.0)
+        generation_seconds = completion_tokens / self.tokens_per_second
+        time.sleep(prompt_seconds + generation_seconds)
+
+        with self._lock:
+            counts = self.counts.setdefault(kind, {"calls": 0, "retries": 0, "malformed": 0,
+                                                   "prompt_tokens": 0, "completion_tokens": 0})
+            counts["calls"] += 1
+            counts["retries"] += retry
+            counts["malformed"] += malformed
+            counts["prompt_tokens"] += prompt_tokens
+            counts["completion_tokens"] += completion_tokens
+        return text, {"prompt_eval_count": prompt_tokens, "eval_count": completion_tokens,
+                      "prompt_eval_duration": int(prompt_seconds * 1e9), "eval_duration": int(generation_seconds * 1e9)}
+
+    def snapshot(self):
+        with self._lock:
+            return {kind: dict(counts) for kind, counts in self.counts.items()}
+
+    def start(self, port=0, stalled=False):
+        """Serve in a background thread and return the base URL."""
+        fake = self
+        url = None
+
+        class Handler(BaseHTTPRequestHandler):
+            def log_message(self, *args):
+                pass
+
+            def _send(self, payload, content_type="application/json"):
+                data = payload.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                if self.path == "/api/version":
+                    self._send(json.dumps({"version": "0.0.0-fake"}))
+                else:
+                    self._send(json.dumps({"models": []}))
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/api/generate":
+                    self.send_error(404)
+                    return
+                if stalled:
+                    fake._stopped.wait()
+                    return
+                text, stats = fake.generate(body)
+                with fake._lock:
+                    fake.endpoint_calls[url] = fake.endpoint_calls.get(url, 0) + 1
+                done = {"model": body.get("model"), "response": "", "done": True, **stats}
+                if body.get("stream", True):
+                    # One chunk with the text and the final one with the counts, as NDJSON
+                    lines = [{"model": body.get("model"), "response": text, "done": False}, done]
+                    self._send("".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines),
+                               "application/x-ndjson")
+                else:
+                    self._send(json.dumps(dict(done, response=text), ensure_ascii=False))
+
+        server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+        server.daemon_threads = True
+        url = f"http://127.0.0.1:{server.server_address[1]}"
+        self._servers.append(server)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return url
+
+    def stop(self):
+        self._stopped.set()
+        for server in self._servers:
+            server.shutdown()
+            server.server_close()
+        self._servers = []
+
+
+def synthetic_transcript(rng, tokens, name):
+    """Q&A-like text of about the given number of tokens, with the boilerplate of a real call."""
+    bank, year, quarter = name.split("-")
+    sentences = [OPENING.format(bank=bank.upper(), year=year, quarter=quarter)]
+    while count_tokens(" ".join(sentences)) < tokens:
+        if rng.random() < 0.1:
+            sentences.append(OPERATOR.format(name=rng.choice(['Jorge', 'Ana', 'Pedro']),
+                                             broker=rng.choice(['Safra', 'BTG', 'XP'])))
+        words = rng.choices(WORDS, k=rng.randint(8, 25))
+        sentences.append(" ".join(words).capitalize() + rng.choice([".", ".", "?"]))
+    return " ".join(sentences)
+
+
+def make_data_folder(folder, num_docs, doc_tokens, seed=0):
+    """Write the synthetic Q&A transcripts and ChatGPT answers the stages read. Returns the document names."""
+    rng = random.Random(seed)
+    os.makedirs(os.path.join(folder, "qna"), exist_ok=True)
+    chatgpt_folder = os.path.join(folder, "output", "chatgpt", "unsupervised")
+    os.makedirs(chatgpt_folder, exist_ok=True)
+    names = []
+    for i in range(num_docs):
+        name = f"{BANKS[i % len(BANKS)]}-{2010 + i // (4 * len(BANKS))}-{(i // len(BANKS)) % 4 + 1}"
+        with open(os.path.join(folder, "qna", f"{name}.txt"), "w") as f:
+            f.write(synthetic_transcript(rng, doc_tokens, name))
+        topics = rng.sample(TOPICS, 5)
+        with open(os.path.join(chatgpt_folder, f"{name}txt_output.txt"), "w") as f:
+            f.write("Tarefa 1:\n" + "\n".join(f"- {topic}" for topic in topics) + "\n\nTarefa 2:\n- positivo")
+        names.append(name)
+    return names
+
+
+def run_child(args):
+    """Run the stages one after the other in this process and write their timings and counters as JSON."""
+    import resource
+    from format_validator import validation_stats
+    from json_output import json_stats
+    from pipeline import run_pipeline
+    from pipeline_config import get_llm, judge_candidates, llm_cache
+
+    # LangChain is imported on the first client; keep its import time out of the first stage
+    for model in args.models:
+        get_llm(model)
+
+    num_docs = len(os.listdir(os.path.join(os.environ["PIPELINE_DATA_FOLDER"], "qna")))
+    stages = {}
+    for stage in args.stages:
+        start = time.perf_counter()
+        run_pipeline(args.models, [stage], max_workers=args.workers, judge_mode=args.judge_mode,
+                     strip_boilerplate=args.strip_boilerplate)
+        # The assessment works on one summary per judge and candidate, the other stages on every document per model
+        units = sum(len(judge_candidates(model)) for model in args.models) if stage == "assess" else num_docs * len(args.models)
+        stages[stage] = {"seconds": time.perf_counter() - start, "units": units}
+    report = {
+        "stages": stages,
+        "validation": validation_stats(),
+        "json": json_stats(),
+        "cache": llm_cache.stats(),
+        "peak_memory_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+    }
+    with open(args.child, "w") as f:
+        json.dump(report, f)
+
+
+def run_benchmark(docs=20, doc_tokens=1500, models=("llama", "qwen"), stages=STAGES, workers=None, judge_mode="single",
+                  latency=0.05, tokens_per_second=200.0, malformed_rate=0.0, seed=0, verbose=False,
+                  endpoints=1, stalled_endpoints=0, timeout=5, prompt_tokens_per_second=0.0, strip_boilerplate=False):
+    """
+    Run the pipeline against the fake server on a synthetic corpus and return
+    the report. With several endpoints the calls are spread over them by the
+    router (OLLAMA_HOSTS), stalled_endpoints of them never answering, so their
+    requests fail over after timeout seconds. workers defaults to 4 per endpoint.
+    With strip_boilerplate the pipeline removes the transcripts' boilerplate.
+    """
+    workers = workers or 4 * endpoints
+    fake = FakeOllama(latency, tokens_per_second, malformed_rate, seed, prompt_tokens_per_second)
+    urls = [fake.start(stalled=i < stalled_endpoints) for i in range(endpoints)]
+    try:
+        with tempfile.TemporaryDirectory(prefix="benchmark_pipeline_") as folder:
+            make_data_folder(folder, docs, doc_tokens, seed)
+            child_report = os.path.join(folder, "child_report.json")
+            env = dict(os.environ, PIPELINE_DATA_FOLDER=folder + os.sep, OLLAMA_HOSTS=",".join(urls),
+                       OLLAMA_TIMEOUT=str(timeout))
+            command = [sys.executable, os.path.abspath(__file__), "--child", child_report,
+                       "--models", *models, "--stages", *stages, "--workers", str(workers),
+                       "--judge-mode", judge_mode] + (["--strip-boilerplate"] if strip_boilerplate else [])
+            log_path = os.path.join(folder, "pipeline.log")
+            start = time.perf_counter()
+            with open(log_path, "w") as log:
+                process = subprocess.run(command, cwd=SCRIPTS_FOLDER, env=env,
+                                         stdout=None if verbose else log, stderr=subprocess.STDOUT if not verbose else None)
+            elapsed = time.perf_counter() - start
+            if process.returncode != 0:
+                with open(log_path) as log:
+                    tail = log.read()[-2000:]
+                raise RuntimeError(f"The pipeline failed (exit code {process.returncode}):\n{tail}")
+            with open(child_report) as f:
+                child = json.load(f)
+    finally:
+        fake.stop()
+
+    counts = fake.snapshot()
+    report = {
+        "settings": {"docs": docs, "doc_tokens": doc_tokens, "models": list(models), "workers": workers,
+                     "judge_mode": judge_mode, "latency": latency, "tokens_per_second": tokens_per_second,
+                     "malformed_rate": malformed_rate, "endpoints": endpoints, "stalled_endpoints": stalled_endpoints,
+                     "prompt_tokens_per_second": prompt_tokens_per_second, "strip_boilerplate": strip_boilerplate},
+        "stages": {},
+        "total_seconds": elapsed,
+        "peak_memory_mb": child["peak_memory_mb"],
+        "validation": child["validation"],
+        "json": child["json"],
+        "endpoints": [{"url": url, "stalled": i < stalled_endpoints, "calls": fake.endpoint_calls.get(url, 0)}
+                      for i, url in enumerate(urls)],
+    }
+    for stage, timing in child["stages"].items():
+        kinds = [counts.get(kind, {}) for kind in STAGE_KINDS[stage]]
+        calls = sum(kind.get("calls", 0) for kind in kinds)
+        retries = sum(kind.get("retries", 0) for kind in kinds)
+        units = timing["units"]
+        report["stages"][stage] = {
+            "seconds": timing["seconds"],
+            "docs_per_sec": units / timing["seconds"] if timing["seconds"] else 0.0,
+            "calls": calls,
+            "calls_per_doc": calls / units if units else 0.0,
+            "retries": retries,
+            "retry_rate": retries / calls if calls else 0.0,
+            "malformed": sum(kind.get("malformed", 0) for kind in kinds),
+            "prompt_tokens": sum(kind.get("prompt_tokens", 0) for kind in kinds),
+            "completion_tokens": sum(kind.get("completion_tokens", 0) for kind in kinds),
+        }
+    return report
+
+
+def print_report(report):
+    settings = report["settings"]
+    print(f"{settings['docs']} documents x {len(settings['models'])} models, {settings['workers']} workers, "
+          f"latency {settings['latency']}s, {settings['tokens_per_second']} tokens/s, "
+          f"{settings['malformed_rate']:.0%} malformed")
+    print(f"{'stage':<8} {'seconds':>8} {'docs/s':>8} {'calls':>6} {'calls/doc':>9} {'retries':>7} "
+          f"{'retry %':>7} {'tokens in':>10} {'tokens out':>10}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<8} {row['seconds']:8.2f} {row['docs_per_sec']:8.2f} {row['calls']:6d} {row['calls_per_doc']:9.2f} "
+              f"{row['retries']:7d} {row['retry_rate']:7.1%} {row['prompt_tokens']:10d} {row['completion_tokens']:10d}")
+    if len(report.get("endpoints", [])) > 1:
+        print("Answered calls per endpoint: " + ", ".join(
+            f"{e['calls']}" + (" (stalled)" if e["stalled"] else "") for e in report["endpoints"]))
+    print(f"Total {report['total_seconds']:.2f}s, peak memory of the pipeline process {report['peak_memory_mb']:.0f} MB")
+
+
+def compare_with_baseline(report, baseline, tolerance=0.1):
+    """Print the change of each stage metric against a baseline report. Returns the regressions found."""
+    regressions = []
+    # Metrics where a higher value is worse
+    lower_is_better = {"seconds", "calls_per_doc", "retry_rate"}
+    print(f"\nCompared with the baseline (regressions beyond {tolerance:.0%} are flagged):")
+    rows = [(stage, metric) for stage in report["stages"] if stage in baseline["stages"]
+            for metric in ["seconds", "docs_per_sec", "calls_per_doc", "retry_rate"]]
+    for stage, metric in rows + [(None, "peak_memory_mb")]:
+        now = report["stages"][stage][metric] if stage else report[metric]
+        before = baseline["stages"][stage][metric] if stage else baseline[metric]
+        change = (now - before) / before if before else 0.0
+        worse = change > tolerance if metric in lower_is_better | {"peak_memory_mb"} else change < -tolerance
+        flag = "  REGRESSION" if worse else ""
+        if worse:
+            regressions.append((stage or "total", metric))
+        print(f"  {stage or 'total':<8} {metric:<15} {before:10.3f} -> {now:10.3f} ({change:+.1%}){flag}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the pipeline stages against a fake Ollama server.")
+    parser.add_argument("--docs", type=int, default=20, help="Synthetic transcripts")
+    parser.add_argument("--doc-tokens", type=int, default=1500, help="Approximate tokens per transcript")
+    parser.add_argument("--models", nargs="+", default=["llama", "qwen"], help="Local models to run")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES, help="Stages to run, in pipeline order")
+    parser.add_argument("--workers", type=int, default=None, help="Concurrent requests per model (default: 4 per endpoint)")
+    parser.add_argument("--judge-mode", choices=["single", "shared"], default="single")
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds before each answer")
+    parser.add_argument("--tokens-per-second", type=float, default=200.0, help="Generation speed of the fake model")
+    parser.add_argument("--prompt-tokens-per-second", type=float, default=0.0,
+                        help="Prompt processing speed of the fake model (default: prompts are free)")
+    parser.add_argument("--strip-boilerplate", action="store_true", help="Run the pipeline with --strip-boilerplate")
+    parser.add_argument("--malformed-rate", type=float, default=0.0, help="Share of answers in the wrong format")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--endpoints", type=int, default=1, help="Fake Ollama servers the calls are spread over")
+    parser.add_argument("--stalled-endpoints", type=int, default=0,
+                        help="Endpoints that accept the requests and never answer, to exercise the failover")
+    parser.add_argument("--timeout", type=int, default=5, help="Seconds before a silent endpoint is failed over")
+    parser.add_argument("--save-baseline", help="Save the report to this JSON file")
+    parser.add_argument("--baseline", help="Compare with the report saved in this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.1, help="Relative change reported as a regression")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline output")
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_child(args)
+        return
+
+    report = run_benchmark(args.docs, args.doc_tokens, args.models, [s for s in STAGES if s in args.stages],
+                           args.workers, args.judge_mode, args.latency, args.tokens_per_second,
+                           args.malformed_rate, args.seed, args.verbose, args.endpoints, args.stalled_endpoints,
+                           args.timeout, args.prompt_tokens_per_second, args.strip_boilerplate)
+    print_report(report)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            json.dump(report, f, indent=4)
+        print(f"Baseline saved to {args.save_baseline}")
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare_with_baseline(report, json.load(f), args.tolerance)
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
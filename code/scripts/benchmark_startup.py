@@ -0,0 +1,78 @@
+"""
+Startup time of the extraction scripts, up to the first request to Ollama.
+
+Each variant runs in a fresh Python process, which imports what the script
+needs, builds the extraction chain and renders the first prompt, i.e. does
+everything before the first request is sent:
+
+- hub: the previous startup, with hub.pull("rlm/rag-prompt") (network access)
+  and every LangChain module imported up front
+- registry: the current scripts, with the local prompt registry and the
+  LangChain imports deferred until the chain is built
+
+    python benchmark_startup.py --repeat 5
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+
+SCRIPTS_FOLDER = os.path.dirname(os.path.abspath(__file__))
+
+VARIANTS = {
+    "hub": """
+from langchain import hub
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnablePassthrough
+from langchain_community.llms import Ollama
+import pipeline
+rag_prompt = hub.pull("rlm/rag-prompt")
+llm = Ollama(model="llama3.1")
+chain = {"context": RunnablePassthrough(), "question": RunnablePassthrough()} | rag_prompt | llm | StrOutputParser()
+rag_prompt.invoke({"context": "texto", "question": "pergunta"})
+""",
+    "registry": """
+import pipeline
+from extraction import build_qa_chain
+from pipeline_config import get_llm
+from prompt_registry import get_prompt, rag_prompt
+chain = build_qa_chain(get_llm("llama"))
+rag_prompt().invoke({"context": "texto", "question": get_prompt("extraction")})
+""",
+}
+
+
+def time_variant(code):
+    """Wall time of one fresh process running the code, and its error message if it failed."""
+    start = time.perf_counter()
+    process = subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS_FOLDER, capture_output=True, text=True)
+    elapsed = time.perf_counter() - start
+    error = None
+    if process.returncode != 0:
+        lines = process.stderr.strip().splitlines()
+        error = next((line for line in reversed(lines) if "Error" in line), f"exit code {process.returncode}")
+    return elapsed, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time from process start to the first Ollama request.")
+    parser.add_argument("--repeat", type=int, default=3, help="Processes per variant (the median is reported)")
+    parser.add_argument("--variants", nargs="+", choices=list(VARIANTS), default=list(VARIANTS))
+    args = parser.parse_args()
+
+    print(f"{'variant':<10} {'median':>8} {'min':>8}  status")
+    for name in args.variants:
+        times, errors = [], []
+        for _ in range(args.repeat):
+            elapsed, error = time_variant(VARIANTS[name])
+            times.append(elapsed)
+            if error:
+                errors.append(error)
+        status = f"failed: {errors[-1][:100]}" if errors else "ok"
+        print(f"{name:<10} {statistics.median(times):7.2f}s {min(times):7.2f}s  {status}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,250 @@
+"""
+Removal of the boilerplate of the transcripts before they are sent to the models.
+
+The operator scripts, the legal disclaimers, the call openings and the
+speaker headers are repeated almost word for word in every call of a bank,
+and cost prompt tokens in every extraction, validation and judge call.
+BoilerplateIndex learns them once from the corpus: every run of SHINGLE
+words of every document is hashed, and the hashes found in at least
+MIN_SHARE of a bank's documents (and in MIN_DOCS of them) are kept as the
+bank's boilerplate. Filtering a text is then one pass over its words: each
+shingle is looked up in the bank's hash set, and the words covered by
+boilerplate shingles are dropped.
+
+Words are compared lowercased, without the punctuation around them and with
+the digits replaced by 0, so dates and quarter numbers do not hide a repeated
+sentence. Texts of banks missing from the index are left unchanged.
+
+    python boilerplate.py build                      # learn from the transcripts (PDFs, cleaned as in notebook 1)
+    python boilerplate.py build --part qna           # or from the divided texts
+    python boilerplate.py report --part qna          # tokens saved per document
+    python boilerplate.py report --part qna --trace <DATA_FOLDER>/traces/llm_calls.jsonl
+"""
+import os
+import re
+import json
+import sys
+import string
+import hashlib
+import argparse
+from chunking import count_tokens
+from doc_ids import parse_doc_id
+from run_manifest import atomic_write_json
+from data_folder import DATA_FOLDER, load_documents
+
+INDEX_PATH = os.path.join(DATA_FOLDER, 'cache/boilerplate_index.json')
+
+# Words per hashed span; shorter spans would also match common phrases of the answers
+SHINGLE = 8
+# A span is boilerplate when it appears in this share of a bank's documents, and in at least MIN_DOCS of them
+MIN_SHARE = 0.3
+MIN_DOCS = 3
+# Bump when the normalization or the hashing changes, so old indexes are rebuilt
+INDEX_VERSION = 1
+PYTHON = "%d.%d" % sys.version_info[:2]
+
+WORD = re.compile(r"\S+")
+PUNCTUATION = string.punctuation + "“”‘’–—…•●"
+DIGITS = str.maketrans("0123456789", "0000000000")
+
+
+def bank_of(name):
+    try:
+        return parse_doc_id(name)[1]
+    except ValueError:
+        return None
+
+
+class BoilerplateIndex:
+    """Hashes of the boilerplate spans of each bank, learned from a corpus."""
+
+    def __init__(self, hashes=None, docs=None, shingle=SHINGLE):
+        self.hashes = {bank: set(values) for bank, values in (hashes or {}).items()}
+        self.docs = dict(docs or {})
+        self.shingle = shingle
+        self._words = {}
+
+    def _word_key(self, word):
+        # Stable across processes (unlike hash() of a str), memoized since the vocabulary is small
+        key = self._words.get(word)
+        if key is None:
+            normalized = word.strip(PUNCTUATION).lower().translate(DIGITS)
+            key = int.from_bytes(hashlib.blake2b(normalized.encode("utf-8"), digest_size=8).digest(), "little")
+            self._words[word] = key
+        return key
+
+    def _shingles(self, keys):
+        # hash() of a tuple of ints does not depend on the process, only on the Python version, so it can be stored
+        n = self.shingle
+        return [hash(tuple(keys[i:i + n])) for i in range(len(keys) - n + 1)]
+
+    @classmethod
+    def learn(cls, documents, min_share=MIN_SHARE, min_docs=MIN_DOCS, shingle=SHINGLE):
+        """Build the index from the documents ({name: text}), one bank at a time."""
+        index = cls(shingle=shingle)
+        by_bank = {}
+        for name in documents:
+            by_bank.setdefault(bank_of(name), []).append(name)
+        by_bank.pop(None, None)
+
+        for bank, names in sorted(by_bank.items()):
+            frequency = {}
+            for name in names:
+                keys = [index._word_key(match.group()) for match in WORD.finditer(documents[name])]
+                for value in set(index._shingles(keys)):
+                    frequency[value] = frequency.get(value, 0) + 1
+            threshold = max(min_docs, min_share * len(names))
+            index.hashes[bank] = {value for value, count in frequency.items() if count >= threshold}
+            index.docs[bank] = len(names)
+            print(f"{bank}: {len(index.hashes[bank])} boilerplate spans in {len(names)} documents")
+        return index
+
+    def strip(self, text, bank):
+        """The text without the words covered by the bank's boilerplate spans."""
+        hashes = self.hashes.get(bank)
+        if not hashes:
+            return text
+        matches = list(WORD.finditer(text))
+        keys = [self._word_key(match.group()) for match in matches]
+        covered = bytearray(len(matches))
+        for i, value in enumerate(self._shingles(keys)):
+            if value in hashes:
+                covered[i:i + self.shingle] = b"\x01" * self.shingle
+        if not any(covered):
+            return text
+
+        pieces = []
+        last = 0
+        i = 0
+        while i < len(matches):
+            if not covered[i]:
+                i += 1
+                continue
+            pieces.append(text[last:matches[i].start()])
+            while i < len(matches) and covered[i]:
+                i += 1
+            last = matches[i].start() if i < len(matches) else len(text)
+        pieces.append(text[last:])
+        return "".join(pieces).strip()
+
+    def save(self, path=INDEX_PATH):
+        atomic_write_json(path, {"version": INDEX_VERSION, "python": PYTHON, "shingle": self.shingle, "docs": self.docs,
+                                 "hashes": {bank: sorted(values) for bank, values in self.hashes.items()}})
+
+    @classmethod
+    def load(cls, path=INDEX_PATH):
+        """The saved index, or None if it is missing or was built by another version (of the index or of Python)."""
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            data = json.load(f)
+        if data.get("version") != INDEX_VERSION or data.get("python") != PYTHON:
+            return None
+        return cls(data["hashes"], data["docs"], data["shingle"])
+
+
+def load_or_build(path, load_documents):
+    """The index saved in path, learned from load_documents() and saved if it does not exist yet."""
+    index = BoilerplateIndex.load(path)
+    if index is None:
+        print(f"Learning the boilerplate index, saved to {path}")
+        index = BoilerplateIndex.learn(load_documents())
+        index.save(path)
+    return index
+
+
+def strip_corpus(corpus, index):
+    """
+    Remove the boilerplate from every text of the corpus ({filename: text}).
+    Returns the new corpus and {filename: (tokens before, tokens after)}.
+    """
+    stripped = {}
+    tokens = {}
+    for name, text in corpus.items():
+        stripped[name] = index.strip(text, bank_of(name))
+        tokens[name] = (count_tokens(text), count_tokens(stripped[name]))
+    before = sum(b for b, _ in tokens.values())
+    saved = before - sum(a for _, a in tokens.values())
+    print(f"Boilerplate: {saved} of {before} tokens removed ({saved / before * 100 if before else 0:.1f}%) "
+          f"from {len(corpus)} transcripts")
+    return stripped, tokens
+
+
+def seconds_per_prompt_token(records):
+    """Prompt processing time per token of each model, measured on the traced calls."""
+    totals = {}
+    for record in records:
+        if record.get("event") == "call" and record.get("prompt_seconds") and record.get("prompt_tokens"):
+            seconds, tokens = totals.get(record["model"], (0.0, 0))
+            totals[record["model"]] = (seconds + record["prompt_seconds"], tokens + record["prompt_tokens"])
+    return {model: seconds / tokens for model, (seconds, tokens) in totals.items()}
+
+
+def estimated_seconds_saved(tokens, records):
+    """
+    Prompt processing time the removed tokens took in a run traced without the
+    filter: for every call that carried a transcript, its removed tokens times
+    the measured time per prompt token of the model. Returns {filename: seconds}.
+    """
+    from prompt_registry import transcript_copies
+
+    rates = seconds_per_prompt_token(records)
+    saved = {}
+    for record in records:
+        copies = transcript_copies(record.get("step"))
+        if record.get("event") != "call" or not copies or record.get("doc") not in tokens:
+            continue
+        before, after = tokens[record["doc"]]
+        seconds = (before - after) * copies * rates.get(record["model"], 0.0)
+        saved[record["doc"]] = saved.get(record["doc"], 0.0) + seconds
+    return saved
+
+
+def print_report(tokens, seconds=None, top=10):
+    rows = sorted(tokens.items(), key=lambda item: item[1][1] - item[1][0])
+    before = sum(b for b, _ in tokens.values())
+    after = sum(a for _, a in tokens.values())
+    print(f"{'document':<32} {'tokens':>8} {'after':>8} {'saved %':>8}" + (f" {'seconds':>8}" if seconds else ""))
+    for name, (b, a) in rows[:top]:
+        print(f"{name[:32]:<32} {b:8d} {a:8d} {(b - a) / b * 100 if b else 0:8.1f}"
+              + (f" {seconds.get(name, 0.0):8.1f}" if seconds else ""))
+    print(f"Corpus: {before - after} of {before} tokens removed ({(before - after) / before * 100 if before else 0:.1f}%), "
+          f"{(before - after) / len(tokens) if tokens else 0:.0f} per document")
+    if seconds:
+        print(f"Prompt processing saved on the traced calls: {sum(seconds.values()):.1f}s "
+              f"({sum(seconds.values()) / len(seconds):.1f}s per document)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Learn the boilerplate of the transcripts and measure what it costs.")
+    parser.add_argument("command", choices=["build", "report"],
+                        help="build: learn and save the index; report: tokens removed from each document")
+    parser.add_argument("--part", choices=["presentation", "qna"], help="Use the divided texts instead of the transcripts")
+    parser.add_argument("--pdfs", help="Folder with the transcript PDFs")
+    parser.add_argument("--texts", help="Folder with the raw transcripts as .txt files")
+    parser.add_argument("--index", default=INDEX_PATH, help="Index file")
+    parser.add_argument("--min-share", type=float, default=MIN_SHARE, help="Share of a bank's documents with the span")
+    parser.add_argument("--min-docs", type=int, default=MIN_DOCS, help="Minimum number of documents with the span")
+    parser.add_argument("--trace", help="LLM call trace (llm_trace.py) to convert the tokens into prompt time")
+    parser.add_argument("--top", type=int, default=10, help="Documents listed in the report")
+    args = parser.parse_args()
+
+    documents = load_documents(args.part, args.pdfs, args.texts)
+    print(f"Loaded {len(documents)} documents")
+    if args.command == "build":
+        index = BoilerplateIndex.learn(documents, args.min_share, args.min_docs)
+        index.save(args.index)
+        print(f"Index saved to {args.index}")
+        return
+
+    index = load_or_build(args.index, lambda: documents)
+    _, tokens = strip_corpus(documents, index)
+    seconds = None
+    if args.trace:
+        from llm_trace import read_trace
+        seconds = estimated_seconds_saved(tokens, read_trace(args.trace, "all"))
+    print_report(tokens, seconds, args.top)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,110 @@
+import os
+import re
+import json
+import math
+import threading
+from run_manifest import atomic_write_json, hash_text
+
+# Words and punctuation marks, the units the token estimate is based on
+WORD_PIECE = re.compile(r"\w+|[^\w\s]")
+# Conservative tokens per word piece for Portuguese text on the Llama/Qwen tokenizers
+TOKENS_PER_PIECE = 1.6
+
+# Split points, from the coarsest to the finest:
+# 1. a new question announced by the operator ("Operadora: ...", "Nossa próxima pergunta vem de ..."),
+#    not after a colon, so "Operadora: Nossa próxima pergunta" stays in one piece
+QUESTION_BOUNDARY = re.compile(
+    r"(?<![:–-])\s+(?=OPERADOR(?:A)?\s*[:–-]|Operador(?:a)?\s*[:–-]|(?:Nossa|A)\s+(?:primeira|próxima|última|seguinte)\s+pergunta)"
+)
+# 2. a change of speaker ("... obrigado. Carlos Silva: ...")
+SPEAKER_BOUNDARY = re.compile(
+    r"(?<=[.!?])\s+(?=(?:Senhora?\s+)?[A-ZÀ-Ý][\wÀ-ÿ]*(?:\s+(?:d[aeo]s?\s+)?[A-ZÀ-Ý][\wÀ-ÿ]*){0,3}\s*[:–]\s)"
+)
+# 3. the end of a sentence
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?;])\s+")
+
+BOUNDARIES = [QUESTION_BOUNDARY, SPEAKER_BOUNDARY, SENTENCE_BOUNDARY]
+
+
+def count_tokens(text):
+    """Estimate the number of model tokens in a text."""
+    return math.ceil(len(WORD_PIECE.findall(text)) * TOKENS_PER_PIECE)
+
+
+class TokenCountCache:
+    """
+    Token counts per document, stored in a JSON file keyed by the hash of the
+    text, so the counts are only computed once and are available to order the
+    jobs before any model call.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.counts = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.counts = json.load(f)
+
+    def count(self, text):
+        key = hash_text(TOKENS_PER_PIECE, text)
+        with self._lock:
+            if key not in self.counts:
+                self.counts[key] = count_tokens(text)
+                self._dirty = True
+            return self.counts[key]
+
+    def save(self):
+        with self._lock:
+            if self._dirty:
+                atomic_write_json(self.path, self.counts)
+                self._dirty = False
+
+
+def largest_first(corpus, token_counts):
+    """Return the corpus ({filename: text}) ordered from the longest to the shortest document."""
+    return dict(sorted(corpus.items(), key=lambda item: token_counts.count(item[1]), reverse=True))
+
+
+def split_into_windows(text, max_tokens):
+    """
+    Split a transcript into consecutive windows of at most max_tokens tokens,
+    cutting at question boundaries first, then at speaker changes, then at
+    sentence ends. Returns [text] if the whole transcript fits.
+    """
+    if count_tokens(text) <= max_tokens:
+        return [text]
+
+    windows = []
+    current, current_tokens = [], 0
+    for piece, piece_tokens in _split(text, max_tokens, 0):
+        # Pack consecutive pieces into the same window while they fit
+        if current and current_tokens + piece_tokens > max_tokens:
+            windows.append(" ".join(current))
+            current, current_tokens = [], 0
+        current.append(piece)
+        current_tokens += piece_tokens
+    if current:
+        windows.append(" ".join(current))
+    return windows
+
+
+def _split(text, max_tokens, level):
+    """Return (piece, tokens) pairs no larger than max_tokens, using the coarsest boundary possible."""
+    tokens = count_tokens(text)
+    if tokens <= max_tokens:
+        return [(text, tokens)]
+
+    if level == len(BOUNDARIES):
+        # No boundary left inside this piece: cut it by words
+        words = text.split()
+        step = max(1, int(max_tokens / TOKENS_PER_PIECE / 2))
+        return [(" ".join(words[i:i + step]), count_tokens(" ".join(words[i:i + step])))
+                for i in range(0, len(words), step)]
+
+    pieces = []
+    for part in BOUNDARIES[level].split(text):
+        if part.strip():
+            pieces.extend(_split(part.strip(), max_tokens, level + 1))
+    return pieces
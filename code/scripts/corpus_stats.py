@@ -0,0 +1,248 @@
+"""
+Corpus statistics of notebook 1 (EDA), computed in a single pass per document.
+
+The notebook tokenizes every transcript twice with word_tokenize (once for the
+tokens, again inside get_words), runs sent_tokenize for the sentences and
+splits the text a third time for the unique words. Here each document is
+scanned once by one regex: every token is counted, classified as a word or a
+punctuation mark, and the sentence ends are counted from the same token
+stream; the unique words are the distinct whitespace-separated strings, as in
+the notebook. Documents are processed in a pool of worker processes.
+
+The regex follows NLTK's Punkt/Treebank behaviour on these transcripts (a
+period after an abbreviation, an initial or inside a URL does not end the
+sentence and stays in its token, an ellipsis followed by a lowercase word does
+not end the sentence) but does not reproduce it exactly: on the transcripts
+listed in notebook 1 the counts are within a few percent of its df_stats
+(tests/test_corpus_stats.py).
+
+Results are cached per document in a JSON file keyed by the hash of the text,
+so adding new transcripts only computes the new ones, and are returned as a
+table with fixed column types (the df_stats of the notebook).
+
+    python corpus_stats.py                                  # PDFs (cached extraction), cleaned as in notebook 1
+    python corpus_stats.py --part qna --output /tmp/stats.csv
+"""
+import os
+import re
+import json
+import time
+import string
+import argparse
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from doc_ids import parse_doc_id
+from run_manifest import atomic_write_json, hash_text
+from data_folder import DATA_FOLDER, load_documents
+
+CACHE_PATH = os.path.join(DATA_FOLDER, 'cache/corpus_stats.json')
+
+# Close to word_tokenize on Portuguese: numbers with their separators ("1,5", "10.000"),
+# dotted words ("www.bb.com", "p.p"), hyphenated words ("disse-me"), ellipses and
+# single punctuation marks
+TOKEN = re.compile(r"\d+(?:[.,]\d+)+|\w+(?:\.\w+)+|\w+(?:-\w+)*|\.\.\.|[^\w\s]")
+SENTENCE_END = {".", "!", "?", "..."}
+# Words followed by a period that does not end the sentence (Punkt's abbreviations)
+ABBREVIATIONS = {
+    "sr", "sra", "srs", "sras", "dr", "dra", "drs", "prof", "profa", "exmo", "exma",
+    "p", "pp", "p.p", "vs", "etc", "ex", "obs", "tel", "n", "nº", "no", "aprox", "cia", "ltda",
+    "av", "pág", "pag", "jr", "mr", "mrs", "ms",
+}
+# Bump when the tokenization changes, so the cached counts are recomputed
+STATS_VERSION = 2
+
+# Column types of the statistics table
+COLUMNS = {
+    "doc_id": "string",
+    "bank": "string",
+    "year": "int16",
+    "quarter": "int8",
+    "characters": "int32",
+    "sentences": "int32",
+    "tokens": "int32",
+    "words": "int32",
+    "unique_words": "int32",
+}
+COUNTS = ["characters", "sentences", "tokens", "words", "unique_words"]
+
+
+def ends_sentence(text, match, previous):
+    """Whether the punctuation token (a TOKEN match) ends a sentence, as sent_tokenize would split it."""
+    token = match.group()
+    if token not in SENTENCE_END:
+        return False
+    # "www.bb.com", "3,5.": only punctuation followed by a space (or the end) splits
+    following = text[match.end():match.end() + 1]
+    if following and not following.isspace():
+        return False
+    if token == "." and previous is not None:
+        word = previous.group()
+        if word.lower() in ABBREVIATIONS or (len(word) == 1 and word.isalpha()):
+            return False
+    if token == "...":
+        rest = text[match.end():].lstrip()
+        if rest[:1].islower():
+            return False
+    return True
+
+
+def document_stats(text):
+    """
+    Return (characters, sentences, tokens, words, unique_words) of a text.
+
+    Words are the tokens that are not punctuation (get_words in the notebook)
+    and unique_words the number of distinct whitespace-separated strings
+    (len(set(text.split())) in the notebook). Sentences shorter than 3
+    characters are not counted, as in get_sentences. A period that does not
+    end a sentence is part of the previous token ("Sr.", "www.bb.com"), as in
+    word_tokenize.
+    """
+    tokens = 0
+    words = 0
+    sentences = 0
+    sentence_start = None
+    previous = None
+    for match in TOKEN.finditer(text):
+        token = match.group()
+        if sentence_start is None:
+            sentence_start = match.start()
+        end = ends_sentence(text, match, previous)
+        if token == "." and not end and previous is not None and previous.end() == match.start():
+            # Attached to the previous token, which was already counted
+            previous = match
+            continue
+        tokens += 1
+        if token not in string.punctuation:
+            words += 1
+        if end:
+            if match.end() - sentence_start > 2:
+                sentences += 1
+            sentence_start = None
+        previous = match
+    # Text after the last sentence end
+    if sentence_start is not None and len(text[sentence_start:].strip()) > 2:
+        sentences += 1
+    return len(text), sentences, tokens, words, len(set(text.split()))
+
+
+class StatsCache:
+    """Statistics per document, in a JSON file keyed by the hash of the text."""
+
+    def __init__(self, path=CACHE_PATH):
+        self.path = path
+        self.stats = {}
+        self._dirty = False
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                self.stats = json.load(f)
+
+    @staticmethod
+    def key(text):
+        return hash_text(STATS_VERSION, text)
+
+    def get(self, key):
+        with self._lock:
+            return self.stats.get(key)
+
+    def put(self, key, values):
+        with self._lock:
+            self.stats[key] = list(values)
+            self._dirty = True
+
+    def save(self):
+        with self._lock:
+            if self._dirty and self.path:
+                atomic_write_json(self.path, self.stats)
+                self._dirty = False
+
+
+def compute_stats(documents, workers=None, cache=None):
+    """
+    Return {name: (characters, sentences, tokens, words, unique_words)} for
+    the documents ({name: text}). Only texts missing from the cache are
+    processed, in parallel when there is more than one.
+    """
+    cache = cache if cache is not None else StatsCache(None)
+    keys = {name: cache.key(text) for name, text in documents.items()}
+    missing = {}
+    for name, key in keys.items():
+        if cache.get(key) is None and key not in missing:
+            missing[key] = documents[name]
+
+    workers = workers or os.cpu_count() or 1
+    if missing:
+        start = time.time()
+        texts = list(missing.values())
+        if workers > 1 and len(texts) > 1:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                chunksize = max(1, len(texts) // (workers * 4))
+                results = list(executor.map(document_stats, texts, chunksize=chunksize))
+        else:
+            results = [document_stats(text) for text in texts]
+        for key, values in zip(missing, results):
+            cache.put(key, values)
+        cache.save()
+        print(f"Statistics of {len(texts)} documents computed in {time.time() - start:.2f}s "
+              f"({len(documents) - len(texts)} from the cache)")
+    return {name: tuple(cache.get(key)) for name, key in keys.items()}
+
+
+def stats_table(stats):
+    """The statistics ({name: counts}) as a DataFrame with the types of COLUMNS, one row per document."""
+    import numpy as np
+    import pandas as pd
+
+    names = sorted(stats)
+    ids = []
+    banks = []
+    years = np.zeros(len(names), dtype=COLUMNS["year"])
+    quarters = np.zeros(len(names), dtype=COLUMNS["quarter"])
+    for i, name in enumerate(names):
+        try:
+            doc_id, bank, years[i], quarters[i] = parse_doc_id(name)
+        except ValueError:
+            doc_id, bank = os.path.splitext(name)[0], None
+        ids.append(doc_id)
+        banks.append(bank)
+    counts = np.array([stats[name] for name in names], dtype=COLUMNS["tokens"]).reshape(len(names), len(COUNTS))
+
+    columns = {"doc_id": pd.array(ids, dtype="string"), "bank": pd.array(banks, dtype="string"),
+               "year": years, "quarter": quarters}
+    for i, column in enumerate(COUNTS):
+        columns[column] = counts[:, i].astype(COLUMNS[column])
+    return pd.DataFrame(columns)
+
+
+def corpus_stats(documents, workers=None, cache_path=CACHE_PATH):
+    """Statistics table of the documents ({name: text}), with the per-document cache."""
+    return stats_table(compute_stats(documents, workers, StatsCache(cache_path)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sentence, token and word counts of the transcripts.")
+    parser.add_argument("--part", choices=["presentation", "qna"], help="Use the divided texts instead of the transcripts")
+    parser.add_argument("--pdfs", help="Folder with the transcript PDFs")
+    parser.add_argument("--texts", help="Folder with the raw transcripts as .txt files")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--pdf-cache", help="Folder of the PDF extraction cache (the data folder's by default)")
+    parser.add_argument("--cache", default=CACHE_PATH, help="Statistics cache file")
+    parser.add_argument("--no-cache", action="store_true", help="Compute every document again")
+    parser.add_argument("--output", help="Save the table (.csv or .parquet)")
+    args = parser.parse_args()
+
+    documents = load_documents(args.part, args.pdfs, args.texts, args.pdf_cache)
+    print(f"Loaded {len(documents)} documents")
+    table = corpus_stats(documents, args.workers, None if args.no_cache else args.cache)
+
+    print(table.groupby("bank")[COUNTS].mean().round(1).to_string())
+    if args.output:
+        if args.output.endswith(".parquet"):
+            table.to_parquet(args.output, index=False)
+        else:
+            table.to_csv(args.output, index=False)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+"""
+Columnar store of the divided transcripts.
+
+Every document of Divided_text/presentation/ and Divided_text/qna/ is saved
+once in a Parquet file with its id, bank, year and quarter already parsed,
+both texts and their token counts. Rows are sorted by bank, year and quarter
+and written in small row groups, so filters on those columns skip whole row
+groups (predicate pushdown) and the file is read through a memory map.
+
+    python corpus_store.py build
+    python corpus_store.py info --banks itub bbas --years 2018 2023
+"""
+import os
+import argparse
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from pyarrow import fs
+from chunking import count_tokens
+from doc_ids import parse_doc_id
+from data_folder import DATA_FOLDER
+
+STORE_PATH = os.path.join(DATA_FOLDER, 'corpus.parquet')
+
+SCHEMA = pa.schema([
+    ("doc_id", pa.string()),
+    ("bank", pa.string()),
+    ("year", pa.int16()),
+    ("quarter", pa.int8()),
+    ("presentation", pa.large_string()),
+    ("qna", pa.large_string()),
+    ("presentation_tokens", pa.int32()),
+    ("qna_tokens", pa.int32()),
+])
+
+# Documents per row group: the unit skipped by the filters
+ROW_GROUP_SIZE = 32
+
+
+def build_store(data_folder=DATA_FOLDER, store_path=STORE_PATH):
+    """Read the presentation and Q&A folders and write the store. Returns the number of documents."""
+    texts = {}
+    for part in ["presentation", "qna"]:
+        folder = os.path.join(data_folder, part)
+        if not os.path.isdir(folder):
+            continue
+        for filename in os.listdir(folder):
+            if filename.endswith('.txt'):
+                with open(os.path.join(folder, filename), 'r') as file:
+                    texts.setdefault(filename, {})[part] = file.read()
+
+    rows = []
+    for filename, parts in texts.items():
+        doc_id, bank, year, quarter = parse_doc_id(filename)
+        presentation = parts.get("presentation")
+        qna = parts.get("qna")
+        rows.append({
+            "doc_id": doc_id,
+            "bank": bank,
+            "year": year,
+            "quarter": quarter,
+            "presentation": presentation,
+            "qna": qna,
+            "presentation_tokens": count_tokens(presentation) if presentation else 0,
+            "qna_tokens": count_tokens(qna) if qna else 0,
+        })
+    rows.sort(key=lambda row: (row["bank"], row["year"], row["quarter"]))
+
+    # Write next to the store and move it into place, so readers never see a partial file
+    table = pa.Table.from_pylist(rows, schema=SCHEMA)
+    tmp_path = f"{store_path}.{os.getpid()}.tmp"
+    pq.write_table(table, tmp_path, row_group_size=ROW_GROUP_SIZE, compression="zstd")
+    os.replace(tmp_path, store_path)
+    return len(rows)
+
+
+def _dataset(store_path):
+    return ds.dataset(store_path, format="parquet", filesystem=fs.LocalFileSystem(use_mmap=True))
+
+
+def corpus_filter(banks=None, years=None, quarters=None, doc_ids=None):
+    """
+    Build the filter expression for a selection of documents.
+    years is an inclusive (first, last) range; the other arguments are lists.
+    """
+    conditions = []
+    if banks:
+        conditions.append(ds.field("bank").isin(list(banks)))
+    if years:
+        first, last = years
+        conditions.append((ds.field("year") >= first) & (ds.field("year") <= last))
+    if quarters:
+        conditions.append(ds.field("quarter").isin(list(quarters)))
+    if doc_ids:
+        conditions.append(ds.field("doc_id").isin(list(doc_ids)))
+    expression = None
+    for condition in conditions:
+        expression = condition if expression is None else expression & condition
+    return expression
+
+
+def read_corpus(columns=None, banks=None, years=None, quarters=None, doc_ids=None, store_path=STORE_PATH):
+    """Return the selected documents as a pyarrow Table (use .to_pandas() for a DataFrame)."""
+    return _dataset(store_path).to_table(columns=columns, filter=corpus_filter(banks, years, quarters, doc_ids))
+
+
+def iter_batches(columns=None, banks=None, years=None, quarters=None, doc_ids=None,
+                 batch_size=ROW_GROUP_SIZE, store_path=STORE_PATH):
+    """Stream the selected documents as pyarrow RecordBatches of at most batch_size rows."""
+    scanner = _dataset(store_path).scanner(
+        columns=columns, filter=corpus_filter(banks, years, quarters, doc_ids), batch_size=batch_size
+    )
+    for batch in scanner.to_batches():
+        if batch.num_rows:
+            yield batch
+
+
+def iter_documents(columns=None, **selection):
+    """Stream the selected documents one by one, as dictionaries."""
+    for batch in iter_batches(columns, **selection):
+        yield from batch.to_pylist()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or inspect the columnar corpus store.")
+    parser.add_argument("command", choices=["build", "info"])
+    parser.add_argument("--banks", nargs="+", help="Only these banks (info)")
+    parser.add_argument("--years", nargs=2, type=int, metavar=("FIRST", "LAST"), help="Inclusive year range (info)")
+    parser.add_argument("--store", default=STORE_PATH, help="Path of the Parquet file")
+    args = parser.parse_args()
+
+    if args.command == "build":
+        num_docs = build_store(store_path=args.store)
+        print(f"Stored {num_docs} documents in {args.store}")
+        return
+
+    table = read_corpus(columns=["doc_id", "bank", "year", "presentation_tokens", "qna_tokens"],
+                        banks=args.banks, years=args.years, store_path=args.store)
+    summary = table.group_by("bank").aggregate([
+        ("doc_id", "count"), ("year", "min"), ("year", "max"), ("presentation_tokens", "sum"), ("qna_tokens", "sum")
+    ]).sort_by("bank")
+    for row in summary.to_pylist():
+        print(
+            f"{row['bank']}: {row['doc_id_count']} documents, {row['year_min']}-{row['year_max']}, "
+            f"{row['presentation_tokens_sum']} presentation tokens, {row['qna_tokens_sum']} Q&A tokens"
+        )
+
+
+if __name__ == '__main__':
+    main()
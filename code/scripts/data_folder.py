@@ -0,0 +1,58 @@
+"""
+Location of the data and plain readers of the transcript folders.
+
+Nothing here imports LangChain or opens a cache, so the offline analysis
+scripts can read the corpus without the side effects of pipeline_config.
+"""
+import os
+from doc_ids import parse_doc_id
+
+# Root folder holding the divided transcripts and every output of the pipeline
+# (PIPELINE_DATA_FOLDER points the scripts at another copy, e.g. the benchmark's synthetic corpus)
+DATA_FOLDER = os.environ.get("PIPELINE_DATA_FOLDER", '/home/arthurblb/mestrado/Divided_text/')
+# The transcript PDFs sit next to the data folder
+TRANSCRIPT_FOLDER = os.path.join(os.path.dirname(os.path.normpath(DATA_FOLDER)), 'Transcripts/')
+
+
+def load_corpus(folder, banks=None, years=None, use_store=False, store_path=None):
+    """
+    Read every transcript once and return {filename: text}, optionally only
+    for some banks and an inclusive (first, last) year range. With use_store
+    the Q&A texts come from the corpus store (store_path, the one of the data
+    folder by default) instead of the folder.
+    """
+    if use_store:
+        from corpus_store import STORE_PATH, iter_documents  # Needs pyarrow, only imported when used
+        return {
+            f"{doc['doc_id']}.txt": doc["qna"]
+            for doc in iter_documents(["doc_id", "qna"], banks=banks, years=years, store_path=store_path or STORE_PATH)
+            if doc["qna"] is not None
+        }
+
+    corpus = {}
+    for filename in sorted(os.listdir(folder)):
+        if filename.endswith('.txt'):
+            _, bank, year, _ = parse_doc_id(filename)
+            if banks and bank not in banks:
+                continue
+            if years and not years[0] <= year <= years[1]:
+                continue
+            with open(os.path.join(folder, filename), 'r') as file:
+                corpus[filename] = file.read()
+    return corpus
+
+
+def load_documents(part=None, pdfs=None, texts=None, pdf_cache=None):
+    """
+    Texts of the corpus: the presentation or Q&A files of the data folder, or
+    the raw transcripts (PDFs or .txt) cleaned as in notebook 1. The PDFs are
+    read through the extraction cache in pdf_cache (the data folder's by default).
+    """
+    if part:
+        return load_corpus(os.path.join(DATA_FOLDER, f"{part}/"))
+
+    from pdf_extraction import CACHE_FOLDER, load_texts
+    from text_cleaning import clean
+
+    raw = load_texts(pdfs or TRANSCRIPT_FOLDER, texts, pdf_cache or CACHE_FOLDER)
+    return {name: clean(text) for name, text in raw.items()}
@@ -0,0 +1,11 @@
+import os
+
+
+def parse_doc_id(filename):
+    """
+    Split a transcript file name ("itub-2019-3.txt", "itub-2019-3.txt_output.txt",
+    "itub-2019-3_evaluation.json") into (doc_id, bank, year, quarter).
+    """
+    doc_id = os.path.basename(filename).split(".")[0].split("_")[0]
+    bank, year, quarter = doc_id.split("-")[:3]
+    return doc_id, bank.strip(), int(year), int(quarter.strip()[0])
@@ -0,0 +1,162 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from chunking import count_tokens, split_into_windows
+from format_validator import validate_with_fallback
+from pipeline_config import CONTEXT_WINDOW, OUTPUT_TOKENS, get_llm, llm_cache, llm_tracer, token_counts
+from prompt_registry import get_prompt, rag_prompt, transcript_copies
+from run_manifest import RunManifest, atomic_write, hash_text
+from scheduler import run_concurrently
+
+# Chunks of a long transcript sent at the same time by each document
+CHUNK_WORKERS = 4
+
+
+def build_qa_chain(llm):
+    """Define the RAG pipeline for a model."""
+    from langchain_core.output_parsers import StrOutputParser
+    from langchain_core.runnables import RunnablePassthrough
+
+    return (
+        {"context": RunnablePassthrough(), "question": RunnablePassthrough()}  # Direct passthrough
+        | rag_prompt()
+        | llm
+        | StrOutputParser()
+    )
+
+
+def validate_response_with_prompt(qa_chain, response):
+    """
+    Uses an LLM validation prompt to check if the response follows the required format.
+    Only used as a fallback when format_validator cannot decide.
+    Returns True if valid, otherwise False.
+    """
+    validation_inputs = {
+        "context": response,
+        "question": get_prompt("validation").format(response=response)
+    }
+    with llm_tracer.context(step="validation"):
+        validation_result = qa_chain.invoke(validation_inputs)
+    return validation_result.strip().lower() == "sim"
+
+
+def input_hash(llm, text):
+    """Hash of everything that determines the output: model, context window, task prompts and transcript."""
+    return hash_text(llm.model, llm.num_ctx, get_prompt("extraction"), get_prompt("extraction_reduce"), text)
+
+
+def chunk_budget():
+    """
+    Largest transcript window, in tokens, that fits in the context window with
+    the prompt and the answer. The passthrough in the chain sends the inputs
+    to both prompt fields, so the transcript is counted once per field.
+    """
+    question = get_prompt("extraction")
+    overhead = count_tokens(rag_prompt().format(context={"context": "", "question": question},
+                                                question={"context": "", "question": question}))
+    return (CONTEXT_WINDOW - OUTPUT_TOKENS - overhead) // transcript_copies("extraction")
+
+
+def map_chunks(qa_chain, chunks):
+    """Run the extraction on each chunk in parallel and return the partial answers, in order."""
+    def extract_chunk(chunk):
+        with llm_tracer.context(step="chunk"):
+            return qa_chain.invoke({"context": chunk, "question": get_prompt("extraction")})
+
+    with ThreadPoolExecutor(max_workers=min(CHUNK_WORKERS, len(chunks))) as executor:
+        return list(executor.map(llm_tracer.bind(extract_chunk), chunks))
+
+
+def build_inputs(filename, text, qa_chain, max_tokens):
+    """
+    Chain inputs for a transcript: the transcript itself if it fits in the
+    context window, otherwise the partial answers of its chunks to be reduced.
+    """
+    chunks = split_into_windows(text, max_tokens)
+    if len(chunks) == 1:
+        return {"context": text, "question": get_prompt("extraction")}
+
+    print(f"{filename}: {token_counts.count(text)} tokens, split into {len(chunks)} chunks")
+    partial_answers = map_chunks(qa_chain, chunks)
+    context = "\n\n".join(
+        f"Trecho {i}:\n{answer.strip()}" for i, answer in enumerate(partial_answers, start=1)
+    )
+    return {"context": context, "question": get_prompt("extraction_reduce")}
+
+
+def process_document(filename, text, qa_chain, text_hash, output_path, manifest, max_tokens):
+    """
+    Runs the extraction for a single transcript, retrying on invalid format,
+    and saves the result as soon as it is available. Transcripts longer than
+    max_tokens are split into chunks whose answers are reduced into one.
+    Returns the path of the output file.
+    """
+    output_file = os.path.join(output_path, f"{filename}_output.txt")
+    llm_validator = partial(validate_response_with_prompt, qa_chain)
+    manifest.start(filename, text_hash)
+
+    valid = False
+    try:
+        with llm_tracer.context(doc=filename):
+            inputs = build_inputs(filename, text, qa_chain, max_tokens)
+            for attempt in range(3):  # Retry up to 3 times if the response is invalid
+                step = "extraction" if inputs["question"] == get_prompt("extraction") else "reduce"
+                with llm_tracer.context(step=step, attempt=attempt):
+                    with llm_cache.refresh(attempt > 0):  # Retries must reach the model, not the cache
+                        result = qa_chain.invoke(inputs)
+                    # Checked by the local parser; the LLM validator is only asked on ambiguous answers
+                    valid = validate_with_fallback(result, llm_validator)
+                    llm_tracer.outcome("valid" if valid else "invalid")
+                if valid:
+                    break  # Stop retrying if the response is valid
+                print(f"Invalid response format for {filename}. Retrying... ({attempt + 1}/3)")
+    except Exception as e:
+        manifest.fail(filename, text_hash, e)
+        raise
+
+    if not valid:
+        print(f"Failed to get a valid response for {filename} after 3 attempts.")
+        result = "Erro: Formato inválido após 3 tentativas."
+
+    # Save the result to a file; failed documents are re-queued on the next run
+    atomic_write(output_file, result)
+    if valid:
+        manifest.complete(filename, text_hash, output_file)
+    else:
+        manifest.fail(filename, text_hash, "invalid format after 3 attempts", output_file)
+    return output_file
+
+
+def run_extraction(model, corpus, output_path, manifest_path, max_workers=4):
+    """
+    Extract topics and sentiment with one model for every transcript in the
+    corpus ({filename: text}), keeping max_workers requests in flight.
+    Documents are dispatched in corpus order, largest first when the corpus
+    comes from the pipeline.
+    """
+    llm = get_llm(model)
+    qa_chain = build_qa_chain(llm)
+    max_tokens = chunk_budget()
+    os.makedirs(output_path, exist_ok=True)  # Ensure the output folder exists
+
+    # Skip transcripts already processed with the same model, prompt and text
+    manifest = RunManifest(manifest_path)
+    hashes = {filename: input_hash(llm, text) for filename, text in corpus.items()}
+    files = [f for f in corpus if not manifest.is_done(f, hashes[f])]
+    print(f"[{model}] {len(corpus) - len(files)} of {len(corpus)} files already processed, skipping them")
+
+    def worker(filename):
+        with llm_tracer.context(stage="extract", model=llm.model):
+            return process_document(filename, corpus[filename], qa_chain, hashes[filename], output_path, manifest, max_tokens)
+
+    cont = 0
+    num_files = len(files)
+    for filename, output_file, error in run_concurrently(files, worker, max_workers=max_workers):
+        cont += 1
+        if error is not None:
+            print(f"Processing {filename} failed: {error}")
+        else:
+            print(f"Result for {filename} saved to {output_file}")
+        print(f"File {cont} of {num_files} processed")
+
+    print(f"[{model}] Run manifest: {manifest.summary()}")
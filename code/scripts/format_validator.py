@@ -0,0 +1,126 @@
+import re
+import threading
+
+# Headers as requested in the prompt: "Tarefa 1:" at the start of a line
+STRICT_HEADER = re.compile(r"^[ \t]*Tarefa[ \t]+([12]):", re.MULTILINE)
+# Headers with markdown or other punctuation ("**Tarefa 1:**", "Tarefa 1)", "### Tarefa 2 -")
+LOOSE_HEADER = re.compile(r"^[ \t#*]*Tarefa[ \t]*(\d+)[ \t]*[:).\-]?[ \t*]*", re.MULTILINE | re.IGNORECASE)
+BULLET = re.compile(r"^[ \t]*-[ \t]*(.+?)[ \t]*$")
+SENTIMENT_WORD = re.compile(r"\b(positiv[oa]|negativ[oa])\b", re.IGNORECASE)
+EXACT_SENTIMENT = re.compile(r"^[ \t]*(?:-[ \t]*)?(positivo|negativo)[ \t]*\.?[ \t]*$", re.IGNORECASE)
+
+MAX_TOPICS = 10
+
+_stats = {"valid": 0, "invalid": 0, "ambiguous": 0}
+_stats_lock = threading.Lock()
+
+
+def parse_tarefas(text):
+    """
+    Parse a model answer in the "Tarefa 1:" / "Tarefa 2:" format.
+
+    Returns a dictionary with:
+    - status: "valid", "invalid" or "ambiguous" (the parser cannot decide and
+      the LLM validator should be asked)
+    - topics: list of topics found in "Tarefa 1"
+    - sentiment: "positivo", "negativo" or None
+    - reason: short description of the problem, if any
+    """
+    result = {"status": "valid", "topics": [], "sentiment": None, "reason": None}
+    text = text or ""
+
+    strict = {m.group(1): m for m in STRICT_HEADER.finditer(text)}
+    loose = list(LOOSE_HEADER.finditer(text))
+    loose_ids = [m.group(1) for m in loose]
+
+    if "1" not in loose_ids or "2" not in loose_ids:
+        return _finish(result, "invalid", "missing 'Tarefa 1:' or 'Tarefa 2:' section")
+
+    # Use the strict headers when both are present, otherwise fall back to the loose ones
+    if "1" in strict and "2" in strict and len(loose) == 2:
+        headers = [strict["1"], strict["2"]]
+    else:
+        headers = loose
+        reason = "extra sections" if len(loose) > 2 else "non-standard section headers"
+        result["status"] = "ambiguous"
+        result["reason"] = reason
+
+    sections = {}
+    for i, header in enumerate(headers):
+        end = headers[i + 1].start() if i + 1 < len(headers) else len(text)
+        sections.setdefault(header.group(1), text[header.end():end])
+
+    # Tarefa 1: one topic per '-' bullet, no prose in between
+    prose = False
+    for line in sections["1"].splitlines():
+        if not line.strip():
+            continue
+        bullet = BULLET.match(line)
+        if bullet:
+            result["topics"].append(bullet.group(1))
+        else:
+            prose = True
+
+    if not result["topics"]:
+        return _finish(result, "invalid", "no '-' topics in 'Tarefa 1:'")
+    if len(result["topics"]) > MAX_TOPICS:
+        return _finish(result, "invalid", f"{len(result['topics'])} topics in 'Tarefa 1:'")
+
+    # Tarefa 2: a single word, positivo or negativo
+    answer = sections["2"].strip()
+    exact = EXACT_SENTIMENT.match(answer)
+    if exact:
+        result["sentiment"] = exact.group(1).lower()
+    else:
+        words = {
+            "positivo" if word.lower().startswith("positiv") else "negativo"
+            for word in SENTIMENT_WORD.findall(answer)
+        }
+        if not words:
+            return _finish(result, "invalid", "no 'positivo' or 'negativo' in 'Tarefa 2:'")
+        if len(words) == 1:
+            result["sentiment"] = words.pop()
+        return _finish(result, "ambiguous", "'Tarefa 2:' is not a single word")
+
+    if prose:
+        return _finish(result, "ambiguous", "text mixed with the topics in 'Tarefa 1:'")
+
+    return _finish(result, result["status"], result["reason"])
+
+
+def validate_with_fallback(text, llm_validator):
+    """
+    Validate the format locally and only call llm_validator(text) when the
+    parser returns "ambiguous". Returns True if the response is valid.
+    """
+    status = parse_tarefas(text)["status"]
+    with _stats_lock:
+        _stats[status] += 1
+
+    if status == "ambiguous":
+        return llm_validator(text)
+    return status == "valid"
+
+
+def validation_stats():
+    """Return how many responses were decided locally and how many went to the LLM."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["llm_calls"] = stats["ambiguous"]
+    stats["llm_calls_saved"] = stats["valid"] + stats["invalid"]
+    return stats
+
+
+def report_validation_stats():
+    """Print the number of LLM validation calls saved in the current run."""
+    stats = validation_stats()
+    print(
+        f"Format validator: {stats['valid']} valid, {stats['invalid']} invalid, "
+        f"{stats['ambiguous']} sent to the LLM ({stats['llm_calls_saved']} LLM calls saved)"
+    )
+
+
+def _finish(result, status, reason):
+    result["status"] = status
+    result["reason"] = reason
+    return result
@@ -0,0 +1,129 @@
+import re
+import ast
+import json
+import threading
+
+# ```json ... ``` blocks around the answer
+CODE_FENCE = re.compile(r"```(?:json|JSON)?\s*(.*?)```", re.DOTALL)
+# A comma right before a closing brace or bracket
+TRAILING_COMMA = re.compile(r",\s*([}\]])")
+
+_stats = {"parsed": 0, "repaired": 0, "failed": 0, "retries": 0}
+_stats_lock = threading.Lock()
+
+
+def _first_object(text):
+    """Return the first balanced {...} in the text, skipping braces inside strings, or None."""
+    start = text.find("{")
+    while start != -1:
+        depth = 0
+        in_string = False
+        escaped = False
+        for i in range(start, len(text)):
+            char = text[i]
+            if in_string:
+                if escaped:
+                    escaped = False
+                elif char == "\\":
+                    escaped = True
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return text[start:i + 1]
+        # Unbalanced: the answer was cut; try closing what is open
+        if depth > 0:
+            return text[start:] + ('"' if in_string else "") + "}" * depth
+        start = text.find("{", start + 1)
+    return None
+
+
+def _repairs(text):
+    """Candidate fixes for a near-miss JSON answer, from the least to the most invasive."""
+    fenced = CODE_FENCE.search(text)
+    if fenced:
+        text = fenced.group(1)
+    obj = _first_object(text)
+    if obj is None:
+        return
+    yield obj
+    obj = TRAILING_COMMA.sub(r"\1", obj)
+    yield obj
+    # Curly quotes used as JSON quotes
+    yield obj.replace("“", '"').replace("”", '"')
+
+
+def _loads(text):
+    try:
+        # strict=False accepts line breaks inside the explanation strings
+        return json.loads(text, strict=False)
+    except json.JSONDecodeError:
+        pass
+    try:
+        # Python-style dictionaries ({'score': 8, ...})
+        value = ast.literal_eval(text)
+        return value if isinstance(value, dict) else None
+    except (ValueError, SyntaxError, MemoryError, RecursionError):
+        return None
+
+
+def parse_json_object(text):
+    """
+    Return the JSON object in a model answer, or None if none can be recovered.
+
+    Answers that are valid JSON are returned as they are. Otherwise code
+    fences, text before and after the object, trailing commas, curly quotes,
+    line breaks inside strings, Python-style dictionaries and unclosed braces
+    are repaired locally, so a near-miss answer does not cost a new generation.
+    """
+    text = (text or "").strip()
+    try:
+        value = json.loads(text)
+        if isinstance(value, dict):
+            _count("parsed")
+            return value
+    except json.JSONDecodeError:
+        pass
+
+    for candidate in _repairs(text):
+        value = _loads(candidate)
+        if isinstance(value, dict):
+            _count("repaired")
+            return value
+
+    _count("failed")
+    return None
+
+
+def record_retry():
+    """Count a new generation requested because the answer could not be used."""
+    _count("retries")
+
+
+def json_stats():
+    """Return how many answers were parsed directly, repaired, lost, and how many retries were made."""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats["generations_saved"] = stats["repaired"]
+    return stats
+
+
+def report_json_stats():
+    """Print the JSON parsing statistics of the current run."""
+    stats = json_stats()
+    if not any(stats.values()):
+        return
+    print(
+        f"JSON answers: {stats['parsed']} valid, {stats['repaired']} repaired locally, {stats['failed']} unusable; "
+        f"{stats['retries']} retries ({stats['generations_saved']} generations saved by the repairs)"
+    )
+
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
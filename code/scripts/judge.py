@@ -0,0 +1,194 @@
+import os
+import threading
+from chunking import count_tokens
+from doc_ids import parse_doc_id
+from json_output import parse_json_object, record_retry
+from pipeline_config import (
+    JSON_MODE, OUTPUT_TOKENS, candidate_output_file, get_llm, judge_candidates, judge_results, llm_cache, llm_tracer,
+)
+from prompt_registry import get_prompt
+from run_manifest import RunManifest, atomic_write_json, hash_text
+from scheduler import run_concurrently
+
+JUDGE_MODES = ["single", "shared"]
+
+_error_lock = threading.Lock()
+
+
+def read_file(file_path):
+    """Read and return the contents of a file."""
+    with open(file_path, 'r') as file:
+        return file.read()
+
+
+def evaluate_response(llm_evaluator, original_prompt, context, response):
+    """Evaluate a single response using the judge model and ensure the output is correctly formatted."""
+    for attempt in range(3):  # Retry up to 3 times
+        evaluation_question = get_prompt("judge_evaluation").format(
+            original_prompt=original_prompt,
+            context=context,
+            response=response
+        )
+        if attempt > 0:
+            record_retry()
+        with llm_tracer.context(step="evaluation", attempt=attempt):
+            with llm_cache.refresh(attempt > 0):  # Retries must reach the model, not the cache
+                evaluation_result = llm_evaluator.invoke(evaluation_question).strip()
+
+            # Parse the result as JSON to validate the format, repairing near-miss answers
+            result = parse_json_object(evaluation_result)
+            valid = result is not None and "score" in result and "explanation" in result
+            llm_tracer.outcome("valid" if valid else "invalid")
+        if valid:
+            return result  # Return the parsed dictionary if valid
+        if result is None:
+            print(f"Attempt {attempt + 1}: Invalid format, retrying...")
+
+    raise ValueError("Failed to get a valid response after 3 attempts.")
+
+
+def evaluate_responses_shared(llm_evaluator, original_prompt, context, responses):
+    """
+    Evaluate every candidate's response ({candidate: response}) in a single call,
+    so the transcript is processed once per document instead of once per candidate.
+    Answers are labelled A, B, ... in the prompt to hide the model names.
+    Returns {candidate: {"score", "explanation"}}; candidates still missing after
+    3 attempts are evaluated one by one with evaluate_response.
+    """
+    labels = {chr(ord("A") + i): candidate for i, candidate in enumerate(responses)}
+    evaluation_question = get_prompt("judge_evaluation_shared").format(
+        num_responses=len(responses),
+        original_prompt=original_prompt,
+        context=context,
+        responses="\n\n".join(
+            f"Resposta do Modelo {label}:\n{responses[candidate]}" for label, candidate in labels.items()
+        ),
+        output_format="{" + ", ".join(
+            f'"{label}": {{"score": <pontuação>, "explanation": "<explicação>"}}' for label in labels
+        ) + "}"
+    )
+
+    results = {}
+    for attempt in range(3):  # Retry up to 3 times
+        if attempt > 0:
+            record_retry()
+        with llm_tracer.context(step="shared_evaluation", attempt=attempt):
+            with llm_cache.refresh(attempt > 0):  # Retries must reach the model, not the cache
+                evaluation_result = llm_evaluator.invoke(evaluation_question).strip()
+
+            # Keep every well-formed evaluation, even if others in the same answer are not
+            parsed = parse_json_object(evaluation_result) or {}
+            scored = len(results)
+            for label, candidate in labels.items():
+                result = parsed.get(label)
+                if candidate not in results and isinstance(result, dict) and "score" in result and "explanation" in result:
+                    results[candidate] = {"score": result["score"], "explanation": result["explanation"]}
+            llm_tracer.outcome("valid" if len(results) == len(labels) else "partial" if len(results) > scored else "invalid")
+        if len(results) == len(labels):
+            return results
+        print(f"Attempt {attempt + 1}: Invalid format, retrying...")
+
+    # Fall back to one call per response for the ones the judge did not score
+    for candidate, response in responses.items():
+        if candidate not in results:
+            results[candidate] = evaluate_response(llm_evaluator, original_prompt, context, response)
+    return results
+
+
+def evaluate_document(llm_evaluator, context, responses, mode="single"):
+    """Evaluate all candidate responses for a transcript in the given judge mode."""
+    if mode == "shared":
+        results = evaluate_responses_shared(llm_evaluator, get_prompt("judge_task"), context, responses)
+        return {candidate: results[candidate] for candidate in responses}
+    return {
+        candidate: evaluate_response(llm_evaluator, get_prompt("judge_task"), context, response)
+        for candidate, response in responses.items()
+    }
+
+
+def judge_document(filename, original_text, llm_evaluator, candidates, output_folder, manifest, error_file, mode="single",
+                   judge=None):
+    """
+    Evaluate every candidate's answer for one transcript and save them in a
+    single JSON file (and in the results store when the judge name is given).
+    Returns the output path, or None if it was already judged.
+    """
+    name_file = filename.split(".")[0]
+    input_hash = None
+    try:
+        # Read the model responses
+        responses = {
+            candidate: read_file(candidate_output_file(candidate, name_file))
+            for candidate in candidates
+        }
+
+        # Skip documents already judged with the same model, prompts and responses
+        prompt = get_prompt("judge_evaluation_shared" if mode == "shared" else "judge_evaluation")
+        input_hash = hash_text(llm_evaluator.model, prompt, original_text, *responses.values())
+        if manifest.is_done(filename, input_hash):
+            return None
+        manifest.start(filename, input_hash)
+
+        # The judge needs the whole transcript; make truncation by the model visible
+        prompt_tokens = count_tokens(prompt) + count_tokens(original_text) + max(count_tokens(r) for r in responses.values())
+        if prompt_tokens + OUTPUT_TOKENS > llm_evaluator.num_ctx:
+            print(f"Warning: {filename} needs about {prompt_tokens} prompt tokens, "
+                  f"more than the {llm_evaluator.num_ctx}-token context window; the judge may see it truncated.")
+
+        # Evaluate each response
+        evaluation_data = evaluate_document(llm_evaluator, original_text, responses, mode)
+
+        # Save the evaluation result as JSON
+        output_file = os.path.join(output_folder, f"{name_file}_evaluation.json")
+        atomic_write_json(output_file, evaluation_data)
+        if judge is not None:
+            judge_results.record(parse_doc_id(filename)[0], judge, evaluation_data, output_file)
+        manifest.complete(filename, input_hash, output_file)
+        return output_file
+
+    except Exception as e:
+        # Log the filename to the error file if evaluation fails
+        manifest.fail(filename, input_hash, e)
+        with _error_lock:
+            with open(error_file, 'a') as ef:
+                ef.write(f"{filename}\n")
+        raise
+
+
+def run_judge(judge, corpus, output_folder, manifest_path, max_workers=4, mode="single"):
+    """
+    Use one local model to judge the answers of the external models and of
+    every other local model for each transcript in the corpus ({filename: text}).
+    In "single" mode each answer is scored in its own call; in "shared" mode all
+    the answers for a transcript are scored together in one call.
+    """
+    llm_evaluator = get_llm(judge, json_mode=JSON_MODE)
+    candidates = judge_candidates(judge)
+    error_file = os.path.join(output_folder, "error.txt")  # File to save errors
+
+    os.makedirs(output_folder, exist_ok=True)  # Ensure the output folder exists
+    manifest = RunManifest(manifest_path)
+    # Documents judged before the results store existed are imported from their JSON files
+    judge_results.import_folder(judge, output_folder)
+
+    def worker(filename):
+        with llm_tracer.context(stage="judge", model=llm_evaluator.model, doc=filename):
+            return judge_document(filename, corpus[filename], llm_evaluator, candidates, output_folder, manifest, error_file,
+                                  mode, judge)
+
+    print(f"[{judge}] Judging {', '.join(candidates)} ({mode} mode)")
+    cont = 0
+    skipped = 0
+    num_files = len(corpus)
+    for filename, output_file, error in run_concurrently(list(corpus), worker, max_workers=max_workers):
+        cont += 1
+        if error is not None:
+            print(f"Evaluation for {filename} failed. Error logged.")
+        elif output_file is None:
+            skipped += 1
+            print(f"Evaluation for {filename} already completed. Skipping.")
+        else:
+            print(f"Evaluation for {filename} completed. Results saved.")
+        print(f"File {cont} of {num_files} processed")
+
+    print(f"[{judge}] {skipped} files skipped. Run manifest: {manifest.summary()}")
@@ -0,0 +1,220 @@
+"""
+Indexed store of the judge results.
+
+Every score and explanation given by a judge to a candidate model for a
+transcript is one row of a SQLite table keyed by (doc, judge, candidate).
+The judge stage writes each document as soon as it is evaluated, and the
+JSON files already on disk (including the ChatGPT judge ones from notebook 7)
+are imported incrementally, so the whole doc x judge x candidate score
+tensor is read with a single query instead of parsing one file at a time.
+
+    python judge_store.py import
+    python judge_store.py scores --output judge_scores.csv
+"""
+import os
+import json
+import time
+import sqlite3
+import argparse
+import threading
+from doc_ids import parse_doc_id
+from data_folder import DATA_FOLDER
+
+RESULTS_FOLDER = os.path.join(DATA_FOLDER, 'output/results/')
+STORE_PATH = os.path.join(RESULTS_FOLDER, 'judge_results.sqlite')
+
+
+def parse_score(score):
+    """Scores come as numbers or numeric strings; anything else is stored as missing."""
+    try:
+        return float(score)
+    except (TypeError, ValueError):
+        return None
+
+
+class JudgeResultsStore:
+
+    def __init__(self, database_path=STORE_PATH):
+        os.makedirs(os.path.dirname(os.path.abspath(database_path)), exist_ok=True)
+        self.database_path = database_path
+        self._lock = threading.Lock()
+
+        # The judge stage records documents from several worker threads
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS evaluations (
+                doc TEXT,
+                judge TEXT,
+                candidate TEXT,
+                score REAL,
+                explanation TEXT,
+                updated REAL,
+                PRIMARY KEY (doc, judge, candidate)
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS evaluations_judge ON evaluations (judge, candidate)")
+        # Evaluation files already imported, so a new import only reads the changed ones
+        self._conn.execute("CREATE TABLE IF NOT EXISTS imported_files (path TEXT PRIMARY KEY, mtime REAL)")
+        self._conn.commit()
+
+    def record(self, doc, judge, evaluations, path=None):
+        """
+        Insert or replace the evaluations ({candidate: {"score", "explanation"}}) of one document.
+        path is the evaluation file they were saved to, registered so the next import skips it.
+        """
+        now = time.time()
+        rows = [
+            (doc, judge, candidate, parse_score(result.get("score")), result.get("explanation"), now)
+            for candidate, result in evaluations.items()
+            if isinstance(result, dict)
+        ]
+        with self._lock:
+            self._conn.executemany("INSERT OR REPLACE INTO evaluations VALUES (?, ?, ?, ?, ?, ?)", rows)
+            if path is not None:
+                self._conn.execute("INSERT OR REPLACE INTO imported_files VALUES (?, ?)", (path, os.path.getmtime(path)))
+            self._conn.commit()
+
+    def import_folder(self, judge, folder):
+        """Import the *_evaluation.json files of a judge that are new or changed. Returns the number read."""
+        if not os.path.isdir(folder):
+            return 0
+        with self._lock:
+            imported = dict(self._conn.execute("SELECT path, mtime FROM imported_files"))
+
+        num_files = 0
+        for filename in sorted(os.listdir(folder)):
+            if not filename.endswith('.json'):
+                continue
+            path = os.path.join(folder, filename)
+            mtime = os.path.getmtime(path)
+            if imported.get(path) == mtime:
+                continue
+            try:
+                with open(path, 'r') as f:
+                    evaluations = json.load(f)
+            except json.JSONDecodeError:
+                print(f"Skipping {path}: invalid JSON")
+                continue
+            self.record(parse_doc_id(filename)[0], judge, evaluations, path)
+            num_files += 1
+        return num_files
+
+    def import_all(self, results_folder=RESULTS_FOLDER):
+        """Import every judge_*/contextualized/ folder under the results folder."""
+        num_files = 0
+        if os.path.isdir(results_folder):
+            for name in sorted(os.listdir(results_folder)):
+                if name.startswith('judge_'):
+                    num_files += self.import_folder(name[len('judge_'):], os.path.join(results_folder, name, 'contextualized/'))
+        return num_files
+
+    def load(self, judges=None, candidates=None):
+        """Return every stored evaluation as a long DataFrame (doc, judge, candidate, score, explanation)."""
+        import pandas as pd  # Only needed to read the results; importing it slows down the pipeline startup
+
+        query = "SELECT doc, judge, candidate, score, explanation FROM evaluations"
+        conditions, params = [], []
+        if judges:
+            conditions.append(f"judge IN ({', '.join('?' * len(judges))})")
+            params.extend(judges)
+        if candidates:
+            conditions.append(f"candidate IN ({', '.join('?' * len(candidates))})")
+            params.extend(candidates)
+        if conditions:
+            query += " WHERE " + " AND ".join(conditions)
+        with self._lock:
+            return pd.read_sql_query(query + " ORDER BY doc, judge, candidate", self._conn, params=params)
+
+    def score_tensor(self, judges=None, candidates=None):
+        """
+        Return (docs, judges, candidates, scores), where scores[d, j, c] is the
+        score given by judge j to candidate c for doc d, NaN when missing.
+        """
+        import numpy as np
+        import pandas as pd
+
+        frame = self.load(judges, candidates)
+        doc_codes, docs = pd.factorize(frame["doc"], sort=True)
+        judge_codes, judge_labels = pd.factorize(frame["judge"], sort=True)
+        candidate_codes, candidate_labels = pd.factorize(frame["candidate"], sort=True)
+
+        scores = np.full((len(docs), len(judge_labels), len(candidate_labels)), np.nan)
+        scores[doc_codes, judge_codes, candidate_codes] = frame["score"].to_numpy(dtype=float)
+        return list(docs), list(judge_labels), list(candidate_labels), scores
+
+    def score_matrix(self, judges=None, candidates=None):
+        """
+        Return the scores as one row per doc with a "{candidate}_judge_{judge}"
+        column per pair, plus a "{candidate}_score" column with the mean of the
+        judges that evaluated it (the df_judges table of notebook 8).
+        """
+        import numpy as np
+        import pandas as pd
+
+        docs, judge_labels, candidate_labels, scores = self.score_tensor(judges, candidates)
+        num_docs = len(docs)
+        # [doc, candidate, judge] so each candidate's judges are adjacent columns
+        by_candidate = scores.transpose(0, 2, 1)
+        columns = [f"{candidate}_judge_{judge}" for candidate in candidate_labels for judge in judge_labels]
+        matrix = pd.DataFrame(by_candidate.reshape(num_docs, -1), index=pd.Index(docs, name="doc"), columns=columns)
+        matrix = matrix.dropna(axis=1, how="all")  # a model never judges itself
+
+        counts = np.sum(~np.isnan(by_candidate), axis=2)
+        sums = np.nansum(by_candidate, axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            means = np.where(counts > 0, sums / counts, np.nan)
+        for i, candidate in enumerate(candidate_labels):
+            matrix[f"{candidate}_score"] = means[:, i]
+        return matrix
+
+    def aggregate(self, judge, candidates):
+        """Scores, explanations and doc ids of each candidate for one judge, as {candidate: [...]}, in doc order."""
+        frame = self.load([judge], candidates)
+        frame = frame[frame["score"].notna()]
+        scores = {model: [] for model in candidates}
+        explanations = {model: [] for model in candidates}
+        docs = {model: [] for model in candidates}
+        for model, group in frame.groupby("candidate", sort=False):
+            scores[model] = group["score"].tolist()
+            explanations[model] = group["explanation"].fillna("").tolist()
+            docs[model] = group["doc"].tolist()
+        return scores, explanations, docs
+
+    def summary(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT judge, candidate, COUNT(*), AVG(score) FROM evaluations GROUP BY judge, candidate ORDER BY judge, candidate"
+            ).fetchall()
+        return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import and read the judge results store.")
+    parser.add_argument("command", choices=["import", "scores"])
+    parser.add_argument("--results", default=RESULTS_FOLDER, help="Folder with the judge_*/contextualized/ folders")
+    parser.add_argument("--store", default=STORE_PATH, help="Path of the SQLite file")
+    parser.add_argument("--output", help="Save the score matrix to this CSV file (scores)")
+    args = parser.parse_args()
+
+    store = JudgeResultsStore(args.store)
+    if args.command == "import":
+        num_files = store.import_all(args.results)
+        print(f"Imported {num_files} new or changed evaluation files into {args.store}")
+        for judge, candidate, count, average in store.summary():
+            mean = f"{average:.2f}" if average is not None else "n/a"
+            print(f"judge {judge}, candidate {candidate}: {count} documents, mean score {mean}")
+        return
+
+    matrix = store.score_matrix()
+    for column in matrix.columns:
+        print(column, round(matrix[column].mean(), 2))
+    if args.output:
+        matrix.to_csv(args.output)
+        print(f"Score matrix saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,167 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+from contextlib import contextmanager
+from langchain_core.caches import BaseCache
+from langchain_core.globals import set_llm_cache
+from langchain_core.outputs import Generation
+
+
+class SQLiteLLMCache(BaseCache):
+    """
+    Persistent LLM response cache stored in a single SQLite file.
+
+    Entries are keyed by a SHA-256 hash of the LLM string (model name and
+    generation parameters, as built by LangChain) and the rendered prompt, so
+    any change in the model, the prompt template or the transcript produces a
+    new key. Entries older than max_age_days are dropped, and the least recently
+    used ones are evicted once the stored responses exceed max_size_mb.
+    """
+
+    def __init__(self, database_path, max_size_mb=500, max_age_days=90):
+        os.makedirs(os.path.dirname(os.path.abspath(database_path)), exist_ok=True)
+        self.database_path = database_path
+        self.max_size_bytes = max_size_mb * 1024 * 1024 if max_size_mb else None
+        self.max_age_seconds = max_age_days * 24 * 3600 if max_age_days else None
+        self.hits = 0
+        self.misses = 0
+        self._updates = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        # The scripts call the LLM from several worker threads
+        self._conn = sqlite3.connect(database_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS responses (
+                key TEXT PRIMARY KEY,
+                llm_string TEXT,
+                generations TEXT,
+                size INTEGER,
+                created REAL,
+                last_used REAL
+            )
+            """
+        )
+        self._conn.commit()
+        self.evict()
+
+    @staticmethod
+    def make_key(prompt, llm_string):
+        """Return the content hash used as the cache key."""
+        return hashlib.sha256(f"{llm_string}\x00{prompt}".encode("utf-8")).hexdigest()
+
+    def lookup(self, prompt, llm_string):
+        """Return the cached generations for the prompt, or None on a miss."""
+        if getattr(self._local, "refresh", False):
+            with self._lock:
+                self.misses += 1
+            return None
+
+        key = self.make_key(prompt, llm_string)
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT generations, created FROM responses WHERE key = ?", (key,)
+            ).fetchone()
+            if row is None or self._is_expired(row[1]):
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._conn.execute("UPDATE responses SET last_used = ? WHERE key = ?", (time.time(), key))
+            self._conn.commit()
+
+        return [Generation(**generation) for generation in json.loads(row[0])]
+
+    def update(self, prompt, llm_string, return_val):
+        """Store the generations returned by the model for the prompt."""
+        key = self.make_key(prompt, llm_string)
+        generations = json.dumps(
+            [{"text": g.text, "generation_info": g.generation_info} for g in return_val],
+            ensure_ascii=False,
+            default=str,
+        )
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?, ?)",
+                (key, llm_string, generations, len(generations.encode("utf-8")), now, now),
+            )
+            self._conn.commit()
+            self._updates += 1
+            run_eviction = self._updates % 100 == 0
+
+        if run_eviction:
+            self.evict()
+
+    def clear(self, **kwargs):
+        """Remove every cached response."""
+        with self._lock:
+            self._conn.execute("DELETE FROM responses")
+            self._conn.commit()
+
+    def evict(self):
+        """Drop expired entries and the least recently used ones above the size limit."""
+        with self._lock:
+            if self.max_age_seconds:
+                self._conn.execute(
+                    "DELETE FROM responses WHERE created < ?", (time.time() - self.max_age_seconds,)
+                )
+            if self.max_size_bytes:
+                total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                if total > self.max_size_bytes:
+                    rows = self._conn.execute("SELECT key, size FROM responses ORDER BY last_used").fetchall()
+                    stale = []
+                    for key, size in rows:
+                        if total <= self.max_size_bytes:
+                            break
+                        stale.append((key,))
+                        total -= size
+                    self._conn.executemany("DELETE FROM responses WHERE key = ?", stale)
+            self._conn.commit()
+
+    @contextmanager
+    def refresh(self, enabled=True):
+        """
+        Skip cache lookups in the current thread while the block runs.
+        Used by the retry loops: a retry must reach the model instead of
+        returning the same cached (invalid) response, and its result replaces
+        the stored one.
+        """
+        previous = getattr(self._local, "refresh", False)
+        self._local.refresh = enabled or previous
+        try:
+            yield
+        finally:
+            self._local.refresh = previous
+
+    def stats(self):
+        """Return hit/miss counters and the number of stored entries."""
+        with self._lock:
+            entries, size = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses"
+            ).fetchone()
+            return {"hits": self.hits, "misses": self.misses, "entries": entries, "size_bytes": size}
+
+    def report(self):
+        """Print the cache counters for the current run."""
+        stats = self.stats()
+        lookups = stats["hits"] + stats["misses"]
+        hit_rate = stats["hits"] / lookups * 100 if lookups else 0.0
+        print(
+            f"LLM cache: {stats['hits']} hits, {stats['misses']} misses ({hit_rate:.1f}% hit rate), "
+            f"{stats['entries']} entries ({stats['size_bytes'] / 1024 / 1024:.1f} MB)"
+        )
+
+    def _is_expired(self, created):
+        return bool(self.max_age_seconds) and created < time.time() - self.max_age_seconds
+
+
+def enable_cache(database_path, max_size_mb=500, max_age_days=90):
+    """Create the SQLite cache and register it as LangChain's global LLM cache."""
+    cache = SQLiteLLMCache(database_path, max_size_mb=max_size_mb, max_age_days=max_age_days)
+    set_llm_cache(cache)
+    return cache
@@ -0,0 +1,331 @@
+"""
+Per-call tracing of the LLM requests.
+
+CallTracer is a LangChain callback handler attached by get_llm to every
+Ollama client, so each request sent by the scripts is timed without touching
+the invoke calls: latency, time to the first streamed token, and the prompt
+and response token counts and durations reported by Ollama (prompt
+processing and generation are timed separately by the server). The stage,
+document, step and attempt of a call come from the context set by the
+scripts around their retry loops, and the result of the format checks is
+recorded as an outcome event. When the router fails a request over to
+another server, the time to the first token is measured again on the new
+stream.
+
+Every call and outcome is appended to a JSONL trace. Responses served by the
+LLM cache never reach the model and are not traced.
+
+    python llm_trace.py report                   # slowest stages and documents of the last run
+    python llm_trace.py report --run all --top 20
+    python llm_trace.py metrics --output /tmp/llm.prom   # Prometheus text format
+"""
+import os
+import json
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+from langchain_core.callbacks import BaseCallbackHandler
+from chunking import count_tokens
+from run_manifest import atomic_write
+from data_folder import DATA_FOLDER
+
+TRACE_PATH = os.path.join(DATA_FOLDER, 'traces/llm_calls.jsonl')
+
+# Upper bounds, in seconds, of the latency and time-to-first-token histograms
+LATENCY_BUCKETS = [0.5, 1, 2, 5, 10, 30, 60, 120, 300, 600]
+
+
+class CallTracer(BaseCallbackHandler):
+    """
+    Record every LLM call in a JSONL trace. The context of a call (stage, doc,
+    step, attempt) is kept per thread by context(); bind() carries it to the
+    threads of a pool.
+    """
+
+    def __init__(self, path=TRACE_PATH):
+        self.path = path
+        self.run = time.strftime("%Y%m%d-%H%M%S") + f"-{os.getpid()}"
+        self.records = []
+        self._calls = {}
+        self._file = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @contextmanager
+    def context(self, **fields):
+        """Attach the fields to the calls and outcomes recorded in the current thread while the block runs."""
+        previous = getattr(self._local, "fields", {})
+        self._local.fields = {**previous, **fields}
+        try:
+            yield
+        finally:
+            self._local.fields = previous
+
+    def current(self):
+        return dict(getattr(self._local, "fields", {}))
+
+    def bind(self, function):
+        """Wrap function so it runs with the current context, e.g. in a ThreadPoolExecutor."""
+        fields = self.current()
+
+        def bound(*args, **kwargs):
+            with self.context(**fields):
+                return function(*args, **kwargs)
+        return bound
+
+    def outcome(self, outcome, **fields):
+        """Record the result of checking an answer (valid, invalid, partial) in the current context."""
+        self._write({"event": "outcome", "time": time.time(), **self.current(), **fields, "outcome": outcome})
+
+    # LangChain callbacks: called in the thread that invoked the model
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        params = kwargs.get("invocation_params") or {}
+        self._calls[run_id] = {
+            "fields": self.current(),
+            "model": params.get("model") or (serialized or {}).get("kwargs", {}).get("model"),
+            "prompt": prompts[0] if prompts else "",
+            "start": time.time(),
+            "start_clock": time.perf_counter(),
+            "first_token": None,
+            "failovers": 0,
+        }
+
+    def on_llm_new_token(self, token, *, run_id, **kwargs):
+        call = self._calls.get(run_id)
+        if call is not None and call["first_token"] is None and token:
+            call["first_token"] = time.perf_counter()
+
+    def on_retry(self, retry_state, *, run_id, **kwargs):
+        # The router sends the request again to another server: the partial stream of the failed one does not count
+        call = self._calls.get(run_id)
+        if call is not None:
+            call["first_token"] = None
+            call["failovers"] += 1
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        call = self._calls.pop(run_id, None)
+        if call is None:
+            return
+        generation = response.generations[0][0] if response.generations and response.generations[0] else None
+        self._finish(call, "ok", generation.text if generation else "",
+                     (generation.generation_info or {}) if generation else {})
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        call = self._calls.pop(run_id, None)
+        if call is not None:
+            self._finish(call, "error", "", {}, error=f"{type(error).__name__}: {error}")
+
+    def _finish(self, call, status, text, info, error=None):
+        end = time.perf_counter()
+        record = {
+            "event": "call",
+            "time": call["start"],
+            **call["fields"],
+            "model": call["model"],
+            "status": status,
+            "latency": round(end - call["start_clock"], 4),
+            "ttft": round(call["first_token"] - call["start_clock"], 4) if call["first_token"] else None,
+            "failovers": call["failovers"],
+            # Ollama omits the prompt count when the whole prompt was already in its cache
+            "prompt_tokens": info.get("prompt_eval_count", count_tokens(call["prompt"])),
+            "response_tokens": info.get("eval_count", count_tokens(text)),
+            # Server-side durations, in ns in the Ollama answer
+            "prompt_seconds": _seconds(info.get("prompt_eval_duration")),
+            "generation_seconds": _seconds(info.get("eval_duration")),
+            "load_seconds": _seconds(info.get("load_duration")),
+        }
+        if error is not None:
+            record["error"] = error
+        self._write(record)
+
+    def _write(self, record):
+        record = {"run": self.run, **record}
+        with self._lock:
+            self.records.append(record)
+            if not self.path:
+                return
+            if self._file is None:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                self._file = open(self.path, "a", encoding="utf-8")
+            self._file.write(json.dumps(record, ensure_ascii=False, default=str) + "\n")
+            self._file.flush()
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.records)
+
+    def report(self, top=5, metrics_path=None):
+        """Print the summary of the calls of this run and save its metrics in Prometheus format."""
+        records = self.snapshot()
+        if not any(r["event"] == "call" for r in records):
+            return
+        print(summary(records, top))
+        if metrics_path:
+            atomic_write(metrics_path, prometheus_text(records))
+            print(f"LLM metrics saved to {metrics_path}")
+
+
+def _seconds(nanoseconds):
+    return round(nanoseconds / 1e9, 4) if nanoseconds is not None else None
+
+
+def read_trace(path=TRACE_PATH, run="last"):
+    """Records of a trace file: those of one run id, of the last run ("last") or every run ("all")."""
+    records = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                try:
+                    records.append(json.loads(line))
+                except json.JSONDecodeError:
+                    continue  # Line cut by an interrupted run
+    if run == "all" or not records:
+        return records
+    if run == "last":
+        run = records[-1]["run"]
+    return [r for r in records if r["run"] == run]
+
+
+def _percentile(values, q):
+    values = sorted(values)
+    if not values:
+        return None
+    return values[min(len(values) - 1, int(round(q * (len(values) - 1))))]
+
+
+def _group(records, keys):
+    groups = {}
+    for record in records:
+        groups.setdefault(tuple(record.get(key) for key in keys), []).append(record)
+    return groups
+
+
+def summary(records, top=10):
+    """Text report: calls per stage and step, and the documents that took the most model time."""
+    calls = [r for r in records if r["event"] == "call"]
+    outcomes = [r for r in records if r["event"] == "outcome"]
+    lines = [f"LLM calls: {len(calls)} in {len({r['run'] for r in calls})} run(s)", ""]
+
+    header = f"{'stage':<10} {'step':<12} {'calls':>6} {'retries':>7} {'errors':>6} {'total s':>9} " \
+             f"{'mean s':>7} {'p95 s':>7} {'ttft s':>7} {'prompt %':>8} {'tok in':>8} {'tok out':>8}"
+    lines.append(header)
+    for (stage, step), group in sorted(_group(calls, ["stage", "step"]).items(),
+                                       key=lambda item: -sum(r["latency"] for r in item[1])):
+        latencies = [r["latency"] for r in group]
+        ttfts = [r["ttft"] for r in group if r["ttft"] is not None]
+        prompt_time = sum(r["prompt_seconds"] or 0 for r in group)
+        server_time = prompt_time + sum(r["generation_seconds"] or 0 for r in group)
+        lines.append(
+            f"{stage or '-':<10} {step or '-':<12} {len(group):>6} "
+            f"{sum(1 for r in group if r.get('attempt')):>7} {sum(r['status'] != 'ok' for r in group):>6} "
+            f"{sum(latencies):>9.1f} {sum(latencies) / len(group):>7.2f} {_percentile(latencies, 0.95):>7.2f} "
+            f"{(sum(ttfts) / len(ttfts) if ttfts else float('nan')):>7.2f} "
+            f"{(prompt_time / server_time * 100 if server_time else float('nan')):>8.1f} "
+            f"{sum(r['prompt_tokens'] or 0 for r in group):>8} {sum(r['response_tokens'] or 0 for r in group):>8}"
+        )
+
+    if outcomes:
+        lines.append("")
+        for (stage, outcome), group in sorted(_group(outcomes, ["stage", "outcome"]).items(), key=str):
+            lines.append(f"Outcomes {stage or '-'}: {outcome} {len(group)}")
+
+    invalid = {}
+    for record in outcomes:
+        if record["outcome"] != "valid":
+            key = (record.get("stage"), record.get("doc"))
+            invalid[key] = invalid.get(key, 0) + 1
+    documents = sorted(_group(calls, ["stage", "doc"]).items(), key=lambda item: -sum(r["latency"] for r in item[1]))
+    lines += ["", f"Slowest documents (top {top}):",
+              f"{'stage':<10} {'document':<40} {'calls':>6} {'retries':>7} {'invalid':>7} {'total s':>9} {'tok in':>8}"]
+    for (stage, doc), group in documents[:top]:
+        lines.append(
+            f"{stage or '-':<10} {str(doc or '-')[:40]:<40} {len(group):>6} {sum(1 for r in group if r.get('attempt')):>7} "
+            f"{invalid.get((stage, doc), 0):>7} {sum(r['latency'] for r in group):>9.1f} "
+            f"{sum(r['prompt_tokens'] or 0 for r in group):>8}"
+        )
+    return "\n".join(lines)
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value if value is not None else "").replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return "{" + ",".join(f'{key}="{escape(value)}"' for key, value in labels.items()) + "}"
+
+
+def _label_groups(records, keys):
+    """Records grouped by the values of keys, as tuples of (label, value) pairs."""
+    return {tuple(zip(keys, values)): group for values, group in _group(records, keys).items()}
+
+
+def prometheus_text(records):
+    """The calls and outcomes as counters and histograms in the Prometheus text exposition format."""
+    calls = [r for r in records if r["event"] == "call"]
+    outcomes = [r for r in records if r["event"] == "outcome"]
+    by_step = _label_groups(calls, ["model", "stage", "step", "status"])
+    by_stage = _label_groups(calls, ["model", "stage"])
+    by_outcome = _label_groups(outcomes, ["model", "stage", "outcome"])
+    lines = []
+
+    def counter(name, help_text, groups, value):
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} counter"])
+        for labels, group in sorted(groups.items(), key=str):
+            lines.append(f"{name}{_labels(**dict(labels))} {value(group)}")
+
+    counter("llm_calls_total", "LLM calls by model, stage, step and status.", by_step, len)
+    counter("llm_retries_total", "LLM calls made by a retry of the same step.", by_stage,
+            lambda group: sum(1 for r in group if r.get("attempt")))
+    counter("llm_failovers_total", "Requests sent again to another Ollama server.", by_stage,
+            lambda group: sum(r.get("failovers") or 0 for r in group))
+    counter("llm_prompt_tokens_total", "Prompt tokens processed.", by_stage,
+            lambda group: sum(r["prompt_tokens"] or 0 for r in group))
+    counter("llm_response_tokens_total", "Response tokens generated.", by_stage,
+            lambda group: sum(r["response_tokens"] or 0 for r in group))
+    counter("llm_prompt_seconds_total", "Server time spent processing prompts.", by_stage,
+            lambda group: round(sum(r["prompt_seconds"] or 0 for r in group), 4))
+    counter("llm_generation_seconds_total", "Server time spent generating responses.", by_stage,
+            lambda group: round(sum(r["generation_seconds"] or 0 for r in group), 4))
+
+    for name, field, help_text in [("llm_call_latency_seconds", "latency", "Latency of the LLM calls."),
+                                   ("llm_time_to_first_token_seconds", "ttft", "Time to the first streamed token.")]:
+        lines.extend([f"# HELP {name} {help_text}", f"# TYPE {name} histogram"])
+        for labels, group in sorted(by_stage.items(), key=str):
+            labels = dict(labels)
+            values = [r[field] for r in group if r[field] is not None]
+            for bound in LATENCY_BUCKETS + ["+Inf"]:
+                count = len(values) if bound == "+Inf" else sum(v <= bound for v in values)
+                lines.append(f"{name}_bucket{_labels(**labels, le=bound)} {count}")
+            lines.append(f"{name}_sum{_labels(**labels)} {round(sum(values), 4)}")
+            lines.append(f"{name}_count{_labels(**labels)} {len(values)}")
+
+    counter("llm_validation_outcomes_total", "Answers checked by the scripts, by outcome.", by_outcome, len)
+    return "\n".join(lines) + "\n"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize the trace of the LLM calls.")
+    parser.add_argument("command", choices=["report", "metrics"],
+                        help="report: slowest stages and documents; metrics: Prometheus text format")
+    parser.add_argument("--trace", default=TRACE_PATH, help="Trace file (JSONL)")
+    parser.add_argument("--run", default="last", help="Run id, 'last' (default) or 'all'")
+    parser.add_argument("--top", type=int, default=10, help="Number of documents in the report")
+    parser.add_argument("--output", help="Save the metrics to this file instead of printing them")
+    args = parser.parse_args()
+
+    records = read_trace(args.trace, args.run)
+    if not records:
+        print(f"No records in {args.trace}")
+        return
+    if args.command == "report":
+        print(summary(records, args.top))
+    elif args.output:
+        atomic_write(args.output, prometheus_text(records))
+        print(f"Metrics saved to {args.output}")
+    else:
+        print(prometheus_text(records), end="")
+
+
+if __name__ == '__main__':
+    main()
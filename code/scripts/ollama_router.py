@@ -0,0 +1,224 @@
+"""
+Model calls spread over several Ollama servers.
+
+EndpointPool keeps the requests in flight and the health of each server.
+Each request goes to the healthy server with the fewest requests in flight,
+so faster servers, which finish sooner, receive more of them. A server that
+times out, refuses the connection or answers with a server error (5xx) is
+left out for cooldown seconds. A server that has not pulled the model
+(404) is left out for that model only. The request is then sent again to
+the next server, so the document is not lost; the call only fails when every
+server failed it. Each new attempt is an on_retry event for the callbacks of
+the run, so the tracer drops the first-token time of the failed stream. The
+other errors of the request itself (4xx: invalid options, prompt too large)
+would fail on every server, so they are raised at once and leave the
+server's health unchanged.
+
+RoutedOllama is the langchain_community Ollama client with the server chosen
+per request by the pool. Everything else (model, options, cache keys,
+callbacks) is unchanged, so it is a drop-in replacement in the chains.
+get_llm builds one for every model on the servers listed in OLLAMA_HOSTS.
+"""
+import re
+import time
+import threading
+from typing import Any, List, Optional
+import requests
+from langchain_community.llms import Ollama
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+from langchain_core.outputs import LLMResult
+from tenacity import RetryCallState
+
+# Network failures and timeouts (a stream cut or stalled midway is a ChunkedEncodingError or a ConnectionError)
+NETWORK_ERRORS = (requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+                  requests.exceptions.ChunkedEncodingError)
+# The Ollama client raises a ValueError with the status of the answers other than 200 and 404,
+# and OllamaEndpointNotFoundError (not a ValueError) when the server does not have the model
+STATUS = re.compile(r"status code (\d{3})")
+
+
+def fails_over(error):
+    """Whether the request should be sent to another server: the server failed, not the request."""
+    if isinstance(error, NETWORK_ERRORS + (OllamaEndpointNotFoundError,)):
+        return True
+    match = STATUS.search(str(error)) if isinstance(error, ValueError) else None
+    return match is not None and int(match.group(1)) >= 500
+
+
+class Endpoint:
+    """One Ollama server and its counters."""
+
+    def __init__(self, url):
+        self.url = url.rstrip("/")
+        self.in_flight = 0
+        self.calls = 0
+        self.failures = 0
+        self.seconds = 0.0
+        self.down_until = 0.0
+        self.missing = {}
+        self.last_error = None
+
+    def is_up(self, now=None, model=None):
+        now = now or time.time()
+        return now >= self.down_until and now >= self.missing.get(model, 0.0)
+
+
+class EndpointPool:
+    """The Ollama servers shared by every client, dispatched least-loaded first."""
+
+    def __init__(self, urls, cooldown=30.0):
+        if not urls:
+            raise ValueError("At least one Ollama endpoint is required.")
+        self.endpoints = [Endpoint(url) for url in urls]
+        self.cooldown = cooldown
+        self.failovers = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.endpoints)
+
+    def acquire(self, exclude=(), model=None):
+        """
+        Reserve the server for a request: the healthy one with the fewest
+        requests in flight, skipping those in exclude and those missing the
+        model. If every remaining server is cooling down, the one that failed
+        longest ago is tried anyway. Returns None when no server is left.
+        """
+        with self._lock:
+            candidates = [e for e in self.endpoints if e.url not in exclude]
+            if not candidates:
+                return None
+            now = time.time()
+            healthy = [e for e in candidates if e.is_up(now, model)]
+            if healthy:
+                endpoint = min(healthy, key=lambda e: (e.in_flight, e.calls))
+            else:
+                endpoint = min(candidates, key=lambda e: max(e.down_until, e.missing.get(model, 0.0)))
+            endpoint.in_flight += 1
+            endpoint.calls += 1
+            return endpoint
+
+    def release(self, endpoint, seconds, error=None, model=None):
+        """
+        Record the end of a request; a failed one takes the server out for the
+        cooldown, or only for the model when the server does not have it.
+        """
+        with self._lock:
+            endpoint.in_flight -= 1
+            endpoint.seconds += seconds
+            if error is None:
+                endpoint.down_until = 0.0
+                endpoint.missing.pop(model, None)
+            else:
+                endpoint.failures += 1
+                if isinstance(error, OllamaEndpointNotFoundError):
+                    endpoint.missing[model] = time.time() + self.cooldown
+                else:
+                    endpoint.down_until = time.time() + self.cooldown
+                endpoint.last_error = f"{type(error).__name__}: {error}"
+
+    def call(self, request, model=None, on_failover=None):
+        """
+        Run request(url) for the model on the least-loaded server, failing over
+        to the next one on the errors of fails_over(). on_failover(error,
+        attempt) is called before each new attempt. Raises the last error if
+        every server failed, and any other error at once.
+        """
+        tried = set()
+        while True:
+            endpoint = self.acquire(exclude=tried, model=model)
+            if endpoint is None:
+                raise last_error
+            tried.add(endpoint.url)
+            start = time.perf_counter()
+            try:
+                result = request(endpoint.url)
+            except Exception as e:
+                if not fails_over(e):
+                    self.release(endpoint, time.perf_counter() - start)
+                    raise
+                self.release(endpoint, time.perf_counter() - start, e, model)
+                last_error = e
+                if len(tried) < len(self.endpoints):
+                    with self._lock:
+                        self.failovers += 1
+                    print(f"Ollama endpoint {endpoint.url} failed ({type(e).__name__}), retrying on another one")
+                    if on_failover is not None:
+                        on_failover(e, len(tried))
+                continue
+            self.release(endpoint, time.perf_counter() - start, model=model)
+            return result
+
+    def check(self, timeout=2.0):
+        """Probe every server (/api/version) and take the unreachable ones out. Returns the number up."""
+        for endpoint in self.endpoints:
+            try:
+                requests.get(f"{endpoint.url}/api/version", timeout=timeout).raise_for_status()
+                endpoint.down_until = 0.0
+            except requests.exceptions.RequestException as e:
+                with self._lock:
+                    endpoint.down_until = time.time() + self.cooldown
+                    endpoint.last_error = f"{type(e).__name__}: {e}"
+        return sum(e.is_up() for e in self.endpoints)
+
+    def stats(self):
+        with self._lock:
+            now = time.time()
+            return [{"url": e.url, "calls": e.calls, "failures": e.failures, "in_flight": e.in_flight,
+                     "seconds": e.seconds, "up": e.is_up(now), "last_error": e.last_error,
+                     "missing": sorted(model for model, until in e.missing.items() if until > now)} for e in self.endpoints]
+
+    def report(self):
+        """Print the calls and failures of each server."""
+        stats = self.stats()
+        if len(stats) < 2 and not any(e["failures"] for e in stats):
+            return
+        print(f"Ollama endpoints: {sum(e['up'] for e in stats)} of {len(stats)} up, {self.failovers} failovers")
+        for e in stats:
+            mean = e["seconds"] / e["calls"] if e["calls"] else 0.0
+            print(f"  {e['url']:<32} {e['calls']:6d} calls {e['failures']:4d} failures {mean:8.2f}s per call"
+                  + ("" if e["up"] else f"  down ({e['last_error']})")
+                  + (f"  missing {', '.join(e['missing'])}" if e["missing"] else ""))
+
+
+def _retry_state(error, attempt):
+    """The failed attempt as the retry state of LangChain's on_retry callbacks."""
+    state = RetryCallState(None, None, (), {})
+    state.attempt_number = attempt
+    state.set_exception((type(error), error, error.__traceback__))
+    return state
+
+
+class RoutedOllama(Ollama):
+    """Ollama client sending each request to the server chosen by an EndpointPool."""
+
+    pool: Any = None
+    """EndpointPool shared by the clients."""
+
+    def _generate(
+        self,
+        prompts: List[str],
+        stop: Optional[List[str]] = None,
+        images: Optional[List[str]] = None,
+        run_manager: Any = None,
+        **kwargs: Any,
+    ) -> LLMResult:
+        generations = []
+        on_failover = (lambda error, attempt: run_manager.on_retry(_retry_state(error, attempt))) if run_manager else None
+        for prompt in prompts:
+            # A failed attempt is dropped whole, its partial stream is not part of the answer
+            final_chunk = self.pool.call(lambda url: self._stream_with_aggregation(
+                prompt, stop=stop, images=images, run_manager=run_manager, verbose=self.verbose,
+                endpoint=url, **kwargs,
+            ), self.model, on_failover)
+            generations.append([final_chunk])
+        return LLMResult(generations=generations)
+
+    def _create_generate_stream(self, prompt, stop=None, images=None, endpoint=None, **kwargs):
+        payload = {"prompt": prompt, "images": images}
+        yield from self._create_stream(
+            payload=payload,
+            stop=stop,
+            api_url=f"{endpoint or self.base_url}/api/generate",
+            **kwargs,
+        )
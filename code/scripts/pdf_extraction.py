@@ -0,0 +1,224 @@
+"""
+Text extraction from the transcript PDFs, shared by the notebooks.
+
+raw_text_extract keeps the behaviour of the version used in notebooks 1, 3
+and 4: text inside tables and images is dropped, duplicated characters are
+removed and single line breaks are joined. extract_folder runs it on a
+folder of PDFs in parallel (across files, or across pages for a few large
+files) and caches the pages of each PDF by the hash of its content, so
+unchanged PDFs are never parsed again.
+
+    python pdf_extraction.py --workers 8                  # the Transcripts/ folder next to DATA_FOLDER
+"""
+import os
+import re
+import json
+import time
+import hashlib
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import pdfplumber
+from run_manifest import atomic_write, atomic_write_json
+from data_folder import DATA_FOLDER, TRANSCRIPT_FOLDER
+
+CACHE_FOLDER = os.path.join(DATA_FOLDER, 'cache/pdf_text/')
+
+# Tickers whose tables are dropped from the text; the others keep them
+TICKERS_WITHOUT_TABLES = ['bbas', 'bbdc']
+
+# Bump when the extraction changes, so cached pages are parsed again
+EXTRACTION_VERSION = 1
+
+
+# As funções abaixo foram adaptadas de: https://github.com/jsvine/pdfplumber/issues/356#issuecomment-1471361607
+
+# Retorna se um objeto não está contido em outro
+# Por exemplo: se um texto está contido em uma tabela ou figura
+def not_within_bboxes(obj, bboxes):
+
+    def obj_in_bbox(_bbox):
+        v_mid = (obj["top"] + obj["bottom"]) / 2
+        h_mid = (obj["x0"] + obj["x1"]) / 21  # As in the notebooks, so the extracted texts do not change
+        x0, top, x1, bottom = _bbox
+        return (h_mid >= x0) and (h_mid < x1) and (v_mid >= top) and (v_mid < bottom)
+
+    return not any(obj_in_bbox(__bbox) for __bbox in bboxes)
+
+
+def curves_to_edges(cs):
+    edges = []
+    for c in cs:
+        edges += pdfplumber.utils.rect_to_edges(c)
+    return edges
+
+
+def extract_page(page, include_tables=False, include_images=False):
+    """Return the text of a pdfplumber page outside its tables and images."""
+    bboxes = []
+    if not include_tables:
+        edges = curves_to_edges(page.curves) + page.edges
+        bboxes = [
+            table.bbox
+            for table in page.find_tables(
+                table_settings={
+                    "vertical_strategy": "lines",
+                    "horizontal_strategy": "lines",
+                    "explicit_vertical_lines": edges,
+                    "explicit_horizontal_lines": edges,
+                }
+            )
+        ]
+
+    if not include_images:
+        for image in page.images:
+            image_bbox = (image['x0'], image['top'], image['x1'], image['bottom'])
+            bboxes.append(image_bbox)
+
+    # Filter out text within tables or images
+    page = page.filter(lambda obj: not_within_bboxes(obj, bboxes))
+    text = page.dedupe_chars().extract_text()
+
+    # Join single line breaks inside paragraphs
+    return re.sub(r'(?<!\n)\n(?!\n)', ' ', text)
+
+
+def raw_text_extract(pdf_file, include_tables=False, include_images=False, show_page_number=False):
+    """Extract the text of every page of a PDF, returning one string per page."""
+    page_data = []
+    with pdfplumber.open(pdf_file) as pdf:
+        for page in pdf.pages:
+            if show_page_number:
+                print(f"Pagina: {page.page_number}")
+            page_data.append(extract_page(page, include_tables, include_images))
+    return page_data
+
+
+def include_tables_for(filename):
+    """Table text is kept for every bank except the ones in TICKERS_WITHOUT_TABLES."""
+    ticker = os.path.basename(filename).split("-")[0].strip()
+    return ticker not in TICKERS_WITHOUT_TABLES
+
+
+def pdf_hash(pdf_file, include_tables, include_images):
+    """Hash of the PDF content and of the extraction options."""
+    digest = hashlib.sha256(f"{EXTRACTION_VERSION}-{include_tables}-{include_images}".encode("utf-8"))
+    with open(pdf_file, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def count_pages(pdf_file):
+    with pdfplumber.open(pdf_file) as pdf:
+        return len(pdf.pages)
+
+
+def _extract_pages(pdf_file, page_numbers, include_tables, include_images):
+    """Worker: extract some pages of a PDF (all of them if page_numbers is None)."""
+    with pdfplumber.open(pdf_file) as pdf:
+        pages = pdf.pages if page_numbers is None else [pdf.pages[i] for i in page_numbers]
+        return [extract_page(page, include_tables, include_images) for page in pages]
+
+
+def extract_folder(folder=TRANSCRIPT_FOLDER, cache_folder=CACHE_FOLDER, max_workers=None, split_pages=False):
+    """
+    Extract every PDF in a folder.
+
+    Files whose content did not change since the last run are read from the
+    cache. The others are parsed in a process pool, one task per file, or
+    one task per page when split_pages is True (useful for a few long PDFs).
+    Returns {filename: page_data} and a dictionary with the run statistics.
+    """
+    files = sorted(f for f in os.listdir(folder) if f.lower().endswith('.pdf'))
+    results = {}
+    pending = {}
+    for filename in files:
+        pdf_file = os.path.join(folder, filename)
+        include_tables = include_tables_for(filename)
+        key = pdf_hash(pdf_file, include_tables, False)
+        cache_file = os.path.join(cache_folder, f"{key}.json") if cache_folder else None
+        if cache_file and os.path.exists(cache_file):
+            with open(cache_file, "r") as f:
+                results[filename] = json.load(f)
+        else:
+            pending[filename] = (pdf_file, include_tables, cache_file)
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            if split_pages:
+                # One task per page; the pages are put back in order per file
+                page_counts = dict(zip(pending, executor.map(count_pages, [p[0] for p in pending.values()])))
+                tasks = [(filename, i) for filename in pending for i in range(page_counts[filename])]
+                futures = [
+                    executor.submit(_extract_pages, pending[filename][0], [i], pending[filename][1], False)
+                    for filename, i in tasks
+                ]
+                for filename in pending:
+                    results[filename] = []
+                for (filename, _), future in zip(tasks, futures):
+                    results[filename].extend(future.result())
+            else:
+                futures = {
+                    filename: executor.submit(_extract_pages, pdf_file, None, include_tables, False)
+                    for filename, (pdf_file, include_tables, _) in pending.items()
+                }
+                for filename, future in futures.items():
+                    results[filename] = future.result()
+
+        for filename, (_, _, cache_file) in pending.items():
+            if cache_file:
+                atomic_write_json(cache_file, results[filename])
+
+    stats = {
+        "files": len(files),
+        "cached": len(files) - len(pending),
+        "parsed": len(pending),
+        "pages_parsed": sum(len(results[f]) for f in pending),
+    }
+    return {f: results[f] for f in files}, stats
+
+
+def load_texts(pdf_folder=TRANSCRIPT_FOLDER, text_folder=None, cache_folder=CACHE_FOLDER):
+    """
+    Raw transcripts as {name: text}, from a folder of .txt files or from the
+    PDFs (through the cache in cache_folder, None to parse them all again).
+    """
+    if text_folder:
+        texts = {}
+        for filename in sorted(os.listdir(text_folder)):
+            if filename.endswith('.txt'):
+                with open(os.path.join(text_folder, filename), 'r') as f:
+                    texts[filename] = f.read()
+        return texts
+
+    pages, _ = extract_folder(pdf_folder, cache_folder)
+    return {filename: " ".join(page_data) for filename, page_data in pages.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Extract the text of the transcript PDFs in parallel.")
+    parser.add_argument("folder", nargs="?", default=TRANSCRIPT_FOLDER, help="Folder with the PDFs")
+    parser.add_argument("--output", help="Save the text of each PDF (pages joined by a space) to this folder")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: number of CPUs)")
+    parser.add_argument("--pages", action="store_true", help="Parallelize across pages instead of files")
+    parser.add_argument("--cache", default=CACHE_FOLDER, help="Folder of the extracted text cache")
+    parser.add_argument("--no-cache", action="store_true", help="Parse every PDF again")
+    args = parser.parse_args()
+
+    start = time.time()
+    texts, stats = extract_folder(args.folder, None if args.no_cache else args.cache, args.workers, args.pages)
+    elapsed = time.time() - start
+
+    if args.output:
+        for filename, page_data in texts.items():
+            atomic_write(os.path.join(args.output, os.path.splitext(filename)[0] + ".txt"), " ".join(page_data))
+
+    pages_per_sec = stats["pages_parsed"] / elapsed if elapsed > 0 else 0.0
+    print(
+        f"Extracted {stats['files']} PDFs ({stats['cached']} from cache, {stats['parsed']} parsed) in {elapsed:.1f}s: "
+        f"{stats['pages_parsed']} pages parsed, {pages_per_sec:.1f} pages/sec"
+    )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+import os
+import argparse
+from assessment import run_assessment
+from chunking import largest_first
+from data_folder import load_corpus
+from extraction import run_extraction
+from format_validator import report_validation_stats
+from judge import JUDGE_MODES, run_judge
+from json_output import report_json_stats
+from pipeline_config import (
+    JUDGE_MODE, MODELS, OLLAMA_HOSTS, assessment_folder, boilerplate_index_path, corpus_store_path, endpoint_pool,
+    extraction_folder, judge_folder, llm_cache, llm_tracer, manifest_path, metrics_path, qna_folder, token_counts
+)
+
+STAGES = ["extract", "judge", "assess"]
+
+
+def run_pipeline(models, stages, max_workers=None, judge_mode=JUDGE_MODE, banks=None, years=None, use_store=False,
+                 strip_boilerplate=False):
+    """
+    Run the requested stages, in pipeline order, for each model.
+
+    The transcripts are read once, sorted from the largest to the smallest, and
+    shared by every model and stage. Within a stage all the documents of a model
+    are sent before moving to the next one, and the model order is reversed
+    between stages, so the model that finished a stage is still loaded in Ollama
+    when the next stage starts. banks and years restrict the transcripts
+    sent to the extraction and judge stages. With strip_boilerplate the
+    repeated operator scripts and disclaimers are removed from the
+    transcripts first (boilerplate.py); the index is learned from every Q&A
+    file on the first run.
+    """
+    if max_workers is None:
+        # Requests kept in flight on each Ollama server
+        max_workers = int(os.environ.get("LLM_CONCURRENCY", 4)) * len(OLLAMA_HOSTS)
+
+    corpus = None
+    if "extract" in stages or "judge" in stages:
+        # Longest transcripts first, so they do not end up alone at the tail of the run
+        corpus = load_corpus(qna_folder(), banks, years, use_store, corpus_store_path())
+        if strip_boilerplate:
+            from boilerplate import load_or_build, strip_corpus
+            index = load_or_build(boilerplate_index_path(),
+                                  lambda: load_corpus(qna_folder(), use_store=use_store, store_path=corpus_store_path()))
+            corpus, _ = strip_corpus(corpus, index)
+        corpus = largest_first(corpus, token_counts)
+        token_counts.save()
+        print(f"Loaded {len(corpus)} transcripts ({sum(token_counts.count(t) for t in corpus.values())} tokens)")
+
+    order = list(models)
+    for stage in STAGES:
+        if stage not in stages:
+            continue
+        for model in order:
+            print(f"=== {stage}: {model} ===")
+            if stage == "extract":
+                run_extraction(model, corpus, extraction_folder(model),
+                               manifest_path(f"{model}_unsupervised"), max_workers=max_workers)
+            elif stage == "judge":
+                run_judge(model, corpus, judge_folder(model),
+                          manifest_path(f"judge_{model}_contextualized"), max_workers=max_workers, mode=judge_mode)
+            else:
+                run_assessment(model, judge_folder(model), assessment_folder(model),
+                               manifest_path(f"judge_{model}_model_assessments"), max_workers=max_workers)
+        order.reverse()
+
+    if "extract" in stages:
+        report_validation_stats()
+    if "judge" in stages or "assess" in stages:
+        report_json_stats()
+    llm_cache.report()
+    if endpoint_pool() is not None:
+        endpoint_pool().report()
+    llm_tracer.report(metrics_path=metrics_path())
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the extraction, judge and assessment stages with local models.")
+    parser.add_argument("--models", nargs="+", choices=list(MODELS), default=list(MODELS),
+                        help="Local models to run (default: all)")
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=STAGES,
+                        help="Stages to run, always executed in pipeline order (default: all)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Concurrent requests per model (default: LLM_CONCURRENCY or 4, per server in OLLAMA_HOSTS)")
+    parser.add_argument("--judge-mode", choices=JUDGE_MODES, default=JUDGE_MODE,
+                        help="Score each answer separately or all answers of a transcript in one call")
+    parser.add_argument("--banks", nargs="+", help="Only the transcripts of these banks (default: all)")
+    parser.add_argument("--years", nargs=2, type=int, metavar=("FIRST", "LAST"),
+                        help="Only the transcripts of this inclusive year range")
+    parser.add_argument("--store", action="store_true",
+                        help="Read the transcripts from the corpus store (corpus_store.py) instead of the qna folder")
+    parser.add_argument("--strip-boilerplate", action="store_true",
+                        help="Remove the operator scripts and disclaimers repeated across a bank's calls (boilerplate.py)")
+    args = parser.parse_args()
+
+    run_pipeline(args.models, args.stages, max_workers=args.workers, judge_mode=args.judge_mode,
+                 banks=args.banks, years=args.years, use_store=args.store, strip_boilerplate=args.strip_boilerplate)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,170 @@
+import os
+import threading
+from data_folder import DATA_FOLDER
+
+# Local models served by Ollama, keyed by the name used in the output folders
+MODELS = {
+    "llama": "llama3.1",
+    "qwen": "qwen2",
+}
+
+# Responses produced outside this pipeline (notebook 4) that are judged alongside the local models
+EXTERNAL_CANDIDATES = ["chatgpt"]
+
+# "single": one judge call per candidate answer; "shared": all answers for a transcript in one call
+JUDGE_MODE = "single"
+
+# Context window requested from Ollama (its default is much smaller and silently truncates long calls)
+CONTEXT_WINDOW = 8192
+# Tokens kept free in the context window for the model's answer
+OUTPUT_TOKENS = 1024
+
+# Ask Ollama for JSON output (format="json") in the judge and assessment calls, so the answers are valid JSON
+JSON_MODE = True
+
+# How long Ollama keeps a model loaded after its last request, so it stays warm between stages
+KEEP_ALIVE = "30m"
+
+# Ollama server, as in the Ollama CLI ("host:port" or a URL)
+OLLAMA_HOST = os.environ.get("OLLAMA_HOST", "http://localhost:11434")
+# Several servers, comma separated, to spread the calls over (each request goes to the least loaded one)
+OLLAMA_HOSTS = [host.strip() for host in os.environ.get("OLLAMA_HOSTS", OLLAMA_HOST).split(",") if host.strip()]
+# Seconds without data from a server before its request is sent to another one (0: wait forever). It must
+# cover the prompt processing of the longest transcripts and the time a request waits in the server's queue
+REQUEST_TIMEOUT = int(os.environ.get("OLLAMA_TIMEOUT", 600)) or None
+# Seconds a failed server is left out before it is tried again
+ENDPOINT_COOLDOWN = 30
+
+
+# Cache every response on disk so reruns only pay for the prompts that changed
+def _llm_cache():
+    from llm_cache import enable_cache
+    return enable_cache(os.path.join(DATA_FOLDER, 'cache/llm_cache.sqlite'))
+
+
+# Every model call (latency, tokens, stage, document, attempt) appended to a JSONL trace, see llm_trace.py
+def _llm_tracer():
+    from llm_trace import CallTracer
+    return CallTracer(os.path.join(DATA_FOLDER, 'traces/llm_calls.jsonl'))
+
+
+# Estimated token counts per transcript, used to split long ones and to schedule the largest first
+def _token_counts():
+    from chunking import TokenCountCache
+    return TokenCountCache(os.path.join(DATA_FOLDER, 'cache/token_counts.json'))
+
+
+# Every judge score and explanation, indexed by (doc, judge, candidate)
+def _judge_results():
+    from judge_store import JudgeResultsStore
+    return JudgeResultsStore(os.path.join(DATA_FOLDER, 'output/results/judge_results.sqlite'))
+
+
+# Objects shared by the scripts, created on first use, so that importing the
+# configuration loads no LangChain and creates no database under DATA_FOLDER
+SHARED = {"llm_cache": _llm_cache, "llm_tracer": _llm_tracer, "token_counts": _token_counts,
+          "judge_results": _judge_results}
+_shared = {}
+_shared_lock = threading.Lock()
+
+
+def shared(name):
+    """The object of SHARED called name, created on its first use."""
+    with _shared_lock:
+        if name not in _shared:
+            _shared[name] = SHARED[name]()
+        return _shared[name]
+
+
+def __getattr__(name):
+    # from pipeline_config import llm_cache, ... gives the shared objects
+    if name in SHARED:
+        return shared(name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+_llms = {}
+_llms_lock = threading.Lock()
+_pool = None
+
+
+def get_llm(model, json_mode=False):
+    """
+    Return the shared Ollama client for a model name from MODELS. With
+    json_mode the server constrains the output to a JSON value. Each request
+    goes to one of the OLLAMA_HOSTS servers, see ollama_router.py.
+    """
+    from ollama_router import RoutedOllama  # Imported on first use, LangChain is slow to load
+
+    with _llms_lock:
+        key = (model, json_mode)
+        if key not in _llms:
+            shared("llm_cache")  # The responses are cached from the first client on
+            _llms[key] = RoutedOllama(model=MODELS[model], base_url=ollama_url(), keep_alive=KEEP_ALIVE,
+                                      num_ctx=CONTEXT_WINDOW, format="json" if json_mode else None,
+                                      timeout=REQUEST_TIMEOUT, callbacks=[shared("llm_tracer")],
+                                      pool=_endpoint_pool())
+        return _llms[key]
+
+
+def _endpoint_pool():
+    global _pool
+    if _pool is None:
+        from ollama_router import EndpointPool
+        _pool = EndpointPool([ollama_url(host) for host in OLLAMA_HOSTS], cooldown=ENDPOINT_COOLDOWN)
+        if len(_pool) > 1:
+            print(f"Ollama endpoints: {_pool.check()} of {len(_pool)} up")
+    return _pool
+
+
+def endpoint_pool():
+    """The pool of Ollama servers shared by the clients, or None before the first client."""
+    return _pool
+
+
+def ollama_url(host=OLLAMA_HOST):
+    return host if "://" in host else f"http://{host}"
+
+
+def judge_candidates(judge):
+    """Models whose answers are evaluated by the judge: the external ones and every other local model."""
+    return EXTERNAL_CANDIDATES + [model for model in MODELS if model != judge]
+
+
+def qna_folder():
+    return os.path.join(DATA_FOLDER, 'qna/')
+
+
+def extraction_folder(model):
+    return os.path.join(DATA_FOLDER, 'output', model, 'unsupervised/')
+
+
+def candidate_output_file(model, name_file):
+    """Path of a model's extraction output for a document (the ChatGPT files have no dot before 'txt')."""
+    if model in EXTERNAL_CANDIDATES:
+        return os.path.join(extraction_folder(model), name_file + "txt_output.txt")
+    return os.path.join(extraction_folder(model), name_file + ".txt_output.txt")
+
+
+def judge_folder(judge):
+    return os.path.join(DATA_FOLDER, 'output/results', f'judge_{judge}', 'contextualized/')
+
+
+def assessment_folder(judge):
+    return os.path.join(DATA_FOLDER, 'output/results', f'judge_{judge}', 'model_assessments/')
+
+
+def corpus_store_path():
+    return os.path.join(DATA_FOLDER, 'corpus.parquet')
+
+
+def boilerplate_index_path():
+    return os.path.join(DATA_FOLDER, 'cache/boilerplate_index.json')
+
+
+def metrics_path():
+    return os.path.join(DATA_FOLDER, 'traces/llm_metrics.prom')
+
+
+def manifest_path(name):
+    return os.path.join(DATA_FOLDER, 'manifests', f'{name}.jsonl')
@@ -0,0 +1,141 @@
+"""
+Local registry of the prompt templates.
+
+Every prompt lives in prompts/{name}.txt and is listed in prompts/registry.json
+with a version and the SHA-256 of its text. Templates are read on first use
+and checked against their hash, so an edited prompt is noticed instead of
+silently changing the results; after editing one, run
+
+    python prompt_registry.py update
+
+to bump its version and store the new hash. The RAG prompt used to come from
+hub.pull("rlm/rag-prompt"), which needs network access at import time; it is
+now the "rag" template, and LangChain is only imported when it is built.
+"""
+import os
+import json
+import string
+import hashlib
+import argparse
+import threading
+from functools import lru_cache
+
+PROMPT_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'prompts')
+REGISTRY_FILE = os.path.join(PROMPT_FOLDER, 'registry.json')
+
+_lock = threading.Lock()
+
+# Template sent by each traced step that carries the transcript (the step of llm_trace), and its fields
+# filled with the transcript. The extraction chain passes its inputs to both fields of the RAG prompt.
+TRANSCRIPT_STEPS = {
+    "extraction": ("rag", ["context", "question"]),
+    "chunk": ("rag", ["context", "question"]),
+    "evaluation": ("judge_evaluation", ["context"]),
+    "shared_evaluation": ("judge_evaluation_shared", ["context"]),
+}
+
+
+def _read_template(name):
+    # newline='' keeps the text exactly as stored, trailing spaces and line endings included
+    with open(os.path.join(PROMPT_FOLDER, f"{name}.txt"), 'r', encoding='utf-8', newline='') as f:
+        return f.read()
+
+
+def _text_hash(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+@lru_cache(maxsize=None)
+def load_registry():
+    """Return {name: {"version", "sha256", "description"}}."""
+    with open(REGISTRY_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+@lru_cache(maxsize=None)
+def get_prompt(name):
+    """Return the text of a template, reading and checking it on the first call."""
+    entry = load_registry().get(name)
+    if entry is None:
+        raise KeyError(f"Unknown prompt '{name}'. Available: {', '.join(sorted(load_registry()))}")
+    text = _read_template(name)
+    if _text_hash(text) != entry["sha256"]:
+        raise ValueError(
+            f"prompts/{name}.txt does not match version {entry['version']} in the registry. "
+            "Run 'python prompt_registry.py update' if the change is intended."
+        )
+    return text
+
+
+def prompt_version(name):
+    """Short identifier of a template version, e.g. 'judge_evaluation@v1'."""
+    return f"{name}@v{load_registry()[name]['version']}"
+
+
+@lru_cache(maxsize=None)
+def transcript_copies(step):
+    """Copies of the transcript in the prompt of a traced step (0 for the steps that do not send it)."""
+    if step not in TRANSCRIPT_STEPS:
+        return 0
+    name, fields = TRANSCRIPT_STEPS[step]
+    return sum(1 for _, field, _, _ in string.Formatter().parse(get_prompt(name)) if field in fields)
+
+
+def rag_prompt():
+    """The chat prompt of the extraction chain, built once on first use."""
+    with _lock:
+        return _rag_prompt()
+
+
+@lru_cache(maxsize=None)
+def _rag_prompt():
+    from langchain_core.prompts import ChatPromptTemplate
+    return ChatPromptTemplate.from_messages([("human", get_prompt("rag"))])
+
+
+def update_registry():
+    """Bump the version and store the new hash of every template whose text changed. Returns their names."""
+    registry = dict(load_registry())
+    changed = []
+    for name, entry in registry.items():
+        text_hash = _text_hash(_read_template(name))
+        if text_hash != entry["sha256"]:
+            registry[name] = dict(entry, version=entry["version"] + 1, sha256=text_hash)
+            changed.append(name)
+    if changed:
+        with open(REGISTRY_FILE, 'w', encoding='utf-8') as f:
+            json.dump(registry, f, indent=4, ensure_ascii=False)
+            f.write("\n")
+        load_registry.cache_clear()
+        get_prompt.cache_clear()
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="List, check or update the prompt templates.")
+    parser.add_argument("command", choices=["list", "check", "update"])
+    args = parser.parse_args()
+
+    if args.command == "update":
+        changed = update_registry()
+        print(f"Updated: {', '.join(prompt_version(name) for name in changed)}" if changed else "No template changed")
+        return
+
+    failed = False
+    for name, entry in load_registry().items():
+        status = "ok"
+        try:
+            get_prompt(name)
+        except (OSError, ValueError) as e:
+            status = f"ERROR: {e}"
+            failed = True
+        if args.command == "list" or status != "ok":
+            print(f"{prompt_version(name):<32} {entry['sha256'][:12]}  {entry['description']}  [{status}]")
+    if failed:
+        raise SystemExit(1)
+    if args.command == "check":
+        print("All templates match the registry")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,337 @@
+"""
+Rule-based split of a transcript into presentation and Q&A.
+
+Notebook 3 asked gpt-4-turbo for the cutoff sentence of every transcript,
+because split_text only knows three opening phrases. segment() looks for
+the cues that open the Q&A session in every bank's transcripts: the operator
+announcing the questions or giving the instructions to ask one, the speaker
+handing over to the analysts ("estamos à disposição para perguntas"),
+"Perguntas e Respostas" / "Q&A" titles and the first question. Cues close to
+each other are grouped, and the split is placed at the sentence of the first
+cue of the best group. The confidence of the split combines the strength of
+the cues, where they fall in the transcript, whether questions follow them
+and whether an earlier group competes with them; only the transcripts below
+CONFIDENCE_THRESHOLD need to be sent to a model.
+
+    python qna_segmenter.py agreement
+    python qna_segmenter.py split --texts "/home/arthurblb/mestrado/Generated Text 2/" --output /tmp/divided/
+    python qna_segmenter.py split --output /tmp/divided/ --llm llama
+"""
+import os
+import re
+import time
+import argparse
+from chunking import count_tokens
+from doc_ids import parse_doc_id
+from text_cleaning import QNA_START_PATTERNS, clean
+from data_folder import DATA_FOLDER, TRANSCRIPT_FOLDER
+
+
+# Splits below this confidence are sent to the model (with --llm) or listed for review; checked on the
+# cleaned PDF transcripts, where the correct splits mostly score above it and the wrong ones below
+CONFIDENCE_THRESHOLD = 0.7
+
+# Cues that open the Q&A session, with how strongly each one indicates it
+CUES = [
+    ("notebook_pattern", re.compile("|".join(QNA_START_PATTERNS), re.IGNORECASE), 0.95),
+    ("qna_session", re.compile(
+        r"\b(?:sess[ãa]o|se[çc][ãa]o|parte|etapa|per[íi]odo)(?:,?\s+agora,?)?\s+de\s+(?:perguntas(?:\s+(?:e|&)\s+respostas)?|q\s?&\s?a)\b",
+        re.IGNORECASE), 0.85),
+    ("qna_title", re.compile(r"\bPERGUNTAS\s*(?:E|&)\s*RESPOSTAS\b|\bQ\s?&\s?A\b"), 0.75),
+    ("open_questions", re.compile(
+        r"\b(?:abrir|abrimos|abriremos|abertos?|passar|passamos|passaremos|passarmos|seguir|seguimos|seguirmos|iniciar|"
+        r"iniciaremos|iniciamos|iniciarmos|come[çc]ar|come[çc]aremos|vamos)\s+(?:agora\s+|ent[ãa]o\s+|j[áa]\s+)?(?:para\s+|a\s+|[àa]s\s+|as\s+|os\s+)?"
+        r"(?:nossas?\s+|suas?\s+)?(?:perguntas|questionamentos|quest[õo]es)\b",
+        re.IGNORECASE), 0.85),
+    ("at_disposal", re.compile(
+        r"\b(?:estamos|ficamos|fico|estou|seguimos|permanecemos|continuamos)\s+(?:ent[ãa]o\s+|agora\s+)?(?:[àa]\s+disposi[çc][ãa]o|abertos?|dispon[íi]veis)"
+        r"[\w\s,]{0,40}?\b(?:perguntas|questionamentos|quest[õo]es|d[úu]vidas)\b|\baguard[oa]\w*\s+(?:os\s+|as\s+|seus\s+|suas\s+)?(?:perguntas|questionamentos)\b",
+        re.IGNORECASE), 0.8),
+    ("operator_instructions", re.compile(
+        r"\bpara\s+(?:fazer|formular|enviar)\s+(?:uma\s+)?pergunta|\b(?:digite|pressione|tecle)\s+asterisco|\blevantar\s+a\s+m[ãa]o",
+        re.IGNORECASE), 0.8),
+    ("first_question", re.compile(
+        r"\bnossa\s+primeira\s+pergunta\b|\bprimeira\s+pergunta\s+(?:vem|[ée])\s+d[aeo]s?\b", re.IGNORECASE), 0.8),
+    ("next_question", re.compile(r"\b(?:nossa|a)\s+pr[óo]xima\s+pergunta\b", re.IGNORECASE), 0.4),
+    ("operator_turn", re.compile(r"\bOPERADORA?\s*[:–-]|\bOperadora?\s*[:–-]"), 0.3),
+]
+
+# Every cue contains one of these words; the cue patterns only run around them
+# (matched on the lowercased text, several times faster than re.IGNORECASE)
+KEYWORD = re.compile(r"pergunt|questionament|quest[õo]es|d[úu]vida|q\s?&\s?a\b|asterisco|m[ãa]o\b|operador")
+# Characters around a keyword searched for cues (the longest cues start well before their keyword)
+KEYWORD_WINDOW = (200, 100)
+
+# Cue mentions that point to a later part of the call ("ao final teremos a sessão de perguntas")
+DEFERRED = re.compile(
+    r"(?:\bantes\s+(?:d[aeo]s?|que)|\bao\s+final|\bno\s+final|\bap[óo]s\s+(?:a|esta|essa)\s+apresenta[çc][ãa]o|\bdepois\s+d[aeo]\s+apresenta[çc][ãa]o|\bmais\s+tarde|\bem\s+breve"
+    r"|\blogo\s+ap[óo]s|\bposteriormente|\bdurante\s+[ao]s?|\bdepois\s+(?:retorno|volto|retornamos|voltamos|voltarmos)|\bsobre\s+isso|\bin\s+(?:our|the))\W+(?:\w+\W+){0,6}$",
+    re.IGNORECASE)
+# Cue mentions that close the session ("encerramos neste momento a sessão de perguntas e respostas")
+CLOSING = re.compile(
+    r"\b(?:encerr|conclu|finaliz)\w*(?:,?\s+(?:neste|nesse)\s+momento,?|\s+por\s+aqui|\s+agora)?\s+(?:a|nossa)\s+$", re.IGNORECASE)
+CLOSED = re.compile(r"\s+(?:est[áa]|foi)\s+(?:encerrad|conclu[íi]d|finalizad)", re.IGNORECASE)
+# Signs that the text after a split is a Q&A session
+QUESTION_SIGN = re.compile(r"\?|\bpergunta\b|\bOperadora?\s*[:–-]", re.IGNORECASE)
+SENTENCE_END = re.compile(r"[.!?]\s+")
+
+# Cues farther apart than this (in characters) belong to different groups
+GROUP_GAP = 1500
+# How far back to look for the start of the sentence of a cue
+SENTENCE_LOOKBACK = 300
+# Share of the text at the start of the call where the cues only announce the session
+OPENING_SHARE = 0.03
+
+
+def _keyword_windows(text):
+    """Merged (start, end) spans around the keywords, the only places where a cue can be."""
+    before, after = KEYWORD_WINDOW
+    lowered = text.lower()
+    # A few characters change length when lowercased; the positions must match the text
+    matches = KEYWORD.finditer(lowered) if len(lowered) == len(text) else re.finditer(KEYWORD.pattern, text, re.IGNORECASE)
+    windows = []
+    for match in matches:
+        start, end = max(0, match.start() - before), match.end() + after
+        if windows and start <= windows[-1][1]:
+            windows[-1][1] = end
+        else:
+            windows.append([start, end])
+    return windows
+
+
+def find_cues(text):
+    """Return the cues found in the text as (position, name, weight), in order."""
+    cues = []
+    for window_start, window_end in _keyword_windows(text):
+        for name, pattern, weight in CUES:
+            for match in pattern.finditer(text, window_start, window_end):
+                before = text[max(0, match.start() - 80):match.start()]
+                if DEFERRED.search(before) or CLOSING.search(before) or CLOSED.match(text, match.end()):
+                    continue
+                cues.append((match.start(), name, weight))
+    cues.sort()
+    return cues
+
+
+def _group(cues):
+    groups = []
+    for cue in cues:
+        if groups and cue[0] - groups[-1][-1][0] <= GROUP_GAP:
+            groups[-1].append(cue)
+        else:
+            groups.append([cue])
+    return groups
+
+
+def _group_score(group, text):
+    # Noisy-or of the cues: several weak cues together are as good as a strong one
+    missing = 1.0
+    for name in {name for _, name, _ in group}:
+        missing *= 1 - max(weight for _, cue_name, weight in group if cue_name == name)
+    score = 1 - missing
+
+    # The Q&A rarely starts in the first tenth of the call, and never at its very end; cues in the
+    # opening lines are the operator announcing the session for later ("Depois da gravação, iniciaremos...")
+    position = group[0][0] / max(len(text), 1)
+    if position < OPENING_SHARE:
+        score *= 0.2
+    elif position < 0.1 or position > 0.95:
+        score *= 0.5
+
+    # Questions must follow the cue
+    after = text[group[0][0]:group[0][0] + 10000]
+    if len(QUESTION_SIGN.findall(after)) < 2:
+        score *= 0.6
+    return score
+
+
+def sentence_start(text, position):
+    """Start of the sentence containing position (looking back at most SENTENCE_LOOKBACK characters)."""
+    window_start = max(0, position - SENTENCE_LOOKBACK)
+    start = window_start if window_start == 0 else position
+    for match in SENTENCE_END.finditer(text, window_start, position):
+        start = match.end()
+    return start
+
+
+def segment(text):
+    """
+    Split a transcript. Returns a dictionary with the split index (None when
+    no cue was found), the presentation and qna texts (qna is None without a
+    split, as in split_text), the confidence between 0 and 1 and the cue used.
+    """
+    groups = _group(find_cues(text))
+    if not groups:
+        return {"split": None, "presentation": text.strip(), "qna": None, "confidence": 0.0, "cue": None}
+
+    scores = [_group_score(group, text) for group in groups]
+    chosen = max(range(len(groups)), key=scores.__getitem__)
+    best = groups[chosen]
+    # A strong group before the chosen one makes the split doubtful; the groups after it are
+    # the Q&A itself (the next questions, the operator's turns)
+    confidence = scores[chosen]
+    if chosen > 0:
+        confidence *= 1 - 0.5 * max(scores[:chosen])
+
+    # Split at the sentence of the first cue of the group
+    position, cue, _ = best[0]
+    split = sentence_start(text, position)
+    return {
+        "split": split,
+        "presentation": text[:split].strip(),
+        "qna": text[split:].strip(),
+        "confidence": round(confidence, 3),
+        "cue": cue,
+    }
+
+
+def llm_cutoff(text, llm, window_tokens, hint=None):
+    """
+    Ask a model for the sentence where the Q&A starts (the notebook 3 prompt) and
+    return its index in the text, or None if the answer is not found in it.
+    Long transcripts are cut to a window of window_tokens around the hint.
+    """
+    from prompt_registry import get_prompt
+
+    tokens = count_tokens(text)
+    start = 0
+    excerpt = text
+    if tokens > window_tokens:
+        chars = int(len(text) * window_tokens / tokens)
+        center = hint if hint is not None else int(len(text) * 0.4)
+        start = max(0, min(center - chars // 2, len(text) - chars))
+        excerpt = text[start:start + chars]
+
+    answer = llm.invoke(get_prompt("qna_cutoff").format(text=excerpt)).strip().strip('"“”')
+    if not answer:
+        return None
+    match = re.search(re.escape(answer), excerpt, re.IGNORECASE)
+    return start + match.start() if match else None
+
+
+def read_divided(data_folder=DATA_FOLDER):
+    """Presentation and Q&A texts already split (GPT cutoffs), as {doc: (presentation, qna)}."""
+    divided = {}
+    presentation_folder = os.path.join(data_folder, 'presentation')
+    qna_folder = os.path.join(data_folder, 'qna')
+    if not os.path.isdir(presentation_folder) or not os.path.isdir(qna_folder):
+        return divided
+    for filename in sorted(os.listdir(presentation_folder)):
+        qna_file = os.path.join(qna_folder, filename)
+        if filename.endswith('.txt') and os.path.exists(qna_file):
+            with open(os.path.join(presentation_folder, filename), 'r') as f:
+                presentation = f.read()
+            with open(qna_file, 'r') as f:
+                qna = f.read()
+            divided[filename] = (presentation, qna)
+    return divided
+
+
+def agreement(divided, tolerance=300):
+    """
+    Segment the joined texts of the existing splits and compare the split points.
+    A split agrees when it is within tolerance characters of the reference one.
+    """
+    rows = []
+    for doc, (presentation, qna) in divided.items():
+        text = presentation.strip() + " " + qna.strip()
+        reference = len(presentation.strip()) + 1
+        result = segment(text)
+        offset = None if result["split"] is None else result["split"] - reference
+        rows.append({
+            "doc": doc,
+            "offset": offset,
+            "agrees": offset is not None and abs(offset) <= tolerance,
+            "confidence": result["confidence"],
+            "cue": result["cue"],
+        })
+    return rows
+
+
+def save_split(output_folder, doc, presentation, qna):
+    from run_manifest import atomic_write
+
+    atomic_write(os.path.join(output_folder, 'presentation', f"{doc}.txt"), presentation)
+    if qna is not None:
+        atomic_write(os.path.join(output_folder, 'qna', f"{doc}.txt"), qna)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Split transcripts into presentation and Q&A without an API call.")
+    parser.add_argument("command", choices=["split", "agreement"])
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument("--pdfs", default=TRANSCRIPT_FOLDER, help="Folder with the transcript PDFs (split)")
+    source.add_argument("--texts", help="Folder with raw .txt transcripts (split)")
+    parser.add_argument("--pdf-cache", help="Folder of the PDF extraction cache (split; the data folder's by default)")
+    parser.add_argument("--output", help="Folder where presentation/ and qna/ are written (split)")
+    parser.add_argument("--divided", default=DATA_FOLDER, help="Folder with the reference presentation/ and qna/ (agreement)")
+    parser.add_argument("--threshold", type=float, default=CONFIDENCE_THRESHOLD, help="Minimum confidence to accept a split")
+    parser.add_argument("--tolerance", type=int, default=300, help="Characters between two splits that still agree")
+    parser.add_argument("--llm", help="Local model (from MODELS) asked for the cutoff of low-confidence transcripts (split)")
+    args = parser.parse_args()
+
+    if args.command == "agreement":
+        start = time.time()
+        rows = agreement(read_divided(args.divided), args.tolerance)
+        elapsed = time.time() - start
+        if not rows:
+            print(f"No documents with both presentation/ and qna/ in {args.divided}")
+            return
+        agreeing = [row for row in rows if row["agrees"]]
+        print(f"{len(rows)} documents segmented in {elapsed:.2f}s")
+        print(f"Agreement with the existing splits: {len(agreeing)}/{len(rows)} ({len(agreeing) / len(rows):.1%}) "
+              f"within {args.tolerance} characters")
+        # Agreement of the accepted splits at a few thresholds, to choose CONFIDENCE_THRESHOLD
+        print(f"{'confidence':>10} {'accepted':>8} {'agreement':>9} {'to the LLM':>10}")
+        for threshold in sorted({0.5, 0.6, 0.7, 0.8, 0.9, args.threshold}):
+            confident = [row for row in rows if row["confidence"] >= threshold]
+            share = sum(row["agrees"] for row in confident) / len(confident) if confident else 0.0
+            print(f"{'>= ' + str(threshold):>10} {len(confident):8d} {share:9.1%} {len(rows) - len(confident):10d}")
+        for row in rows:
+            if not row["agrees"]:
+                print(f"  {row['doc']}: offset {row['offset']}, confidence {row['confidence']}, cue {row['cue']}")
+        return
+
+    from pdf_extraction import CACHE_FOLDER, load_texts
+
+    start = time.time()
+    texts = load_texts(args.pdfs, args.texts, args.pdf_cache or CACHE_FOLDER)
+    results = {}
+    for filename, text in texts.items():
+        # The cues and the saved texts are those of notebook 3, which cleaned the text before splitting it
+        text = clean(text)
+        try:
+            _, bank, year, quarter = parse_doc_id(filename)
+            doc = f"{bank}-{year}-{quarter}"
+        except ValueError:
+            doc = os.path.splitext(filename)[0]
+        results[doc] = (text, segment(text))
+    elapsed = time.time() - start
+    low = [doc for doc, (_, result) in results.items() if result["confidence"] < args.threshold]
+    print(f"{len(results)} transcripts segmented in {elapsed:.2f}s, {len(low)} below confidence {args.threshold}")
+
+    if args.llm and low:
+        from pipeline_config import CONTEXT_WINDOW, OUTPUT_TOKENS, get_llm
+
+        llm = get_llm(args.llm)
+        for doc in low:
+            text, result = results[doc]
+            split = llm_cutoff(text, llm, CONTEXT_WINDOW - OUTPUT_TOKENS - 300, result["split"])
+            if split is None:
+                print(f"  {doc}: cutoff from {args.llm} not found in the text, keeping the rule-based split")
+                continue
+            results[doc] = (text, {"split": split, "presentation": text[:split].strip(), "qna": text[split:].strip(),
+                                   "confidence": 1.0, "cue": args.llm})
+            print(f"  {doc}: split by {args.llm}")
+    else:
+        for doc in low:
+            print(f"  {doc}: confidence {results[doc][1]['confidence']}, cue {results[doc][1]['cue']}")
+
+    if args.output:
+        for doc, (_, result) in results.items():
+            save_split(args.output, doc, result["presentation"], result["qna"])
+        print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
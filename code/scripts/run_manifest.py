@@ -0,0 +1,130 @@
+import os
+import json
+import time
+import hashlib
+import threading
+
+
+def hash_text(*parts):
+    """Return a SHA-256 hash of the given strings, used to detect stale inputs."""
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(str(part).encode("utf-8"))
+        digest.update(b"\x00")
+    return digest.hexdigest()
+
+
+def atomic_write(path, text):
+    """
+    Write text to path through a temporary file in the same folder and an
+    os.replace, so a killed process never leaves a half-written output.
+    """
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp_path, "w") as f:
+            f.write(text)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def atomic_write_json(path, data):
+    """Atomically save data as indented JSON, keeping the accents readable."""
+    atomic_write(path, json.dumps(data, indent=4, ensure_ascii=False))
+
+
+class RunManifest:
+    """
+    Append-only JSONL journal with the status of every document in a run.
+
+    Each line records the document, its status ("running", "done" or "failed"),
+    the hash of its inputs, the number of attempts and the output path. The
+    latest line for a document wins, so a restart can skip finished work and
+    re-queue only failed, interrupted or stale (input hash changed) documents.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.records = {}
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+
+        num_lines = 0
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                for line in f:
+                    num_lines += 1
+                    try:
+                        record = json.loads(line)
+                    except json.JSONDecodeError:
+                        continue  # Line cut short by a killed process
+                    self.records[record["doc"]] = record
+
+        # Keep the journal small across many restarts
+        if num_lines > 2 * len(self.records):
+            self.compact()
+
+    def is_done(self, doc, input_hash):
+        """True if the document finished with the same inputs and its output still exists."""
+        record = self.records.get(doc)
+        return (
+            record is not None
+            and record["status"] == "done"
+            and record["input_hash"] == input_hash
+            and bool(record.get("output_path"))
+            and os.path.exists(record["output_path"])
+        )
+
+    def start(self, doc, input_hash):
+        """Mark the document as running and return its attempt number."""
+        record = self.records.get(doc)
+        attempts = 1
+        if record is not None and record["input_hash"] == input_hash:
+            attempts = record.get("attempts", 0) + 1
+        self._append(doc, "running", input_hash, attempts=attempts)
+        return attempts
+
+    def complete(self, doc, input_hash, output_path):
+        """Mark the document as done."""
+        self._append(doc, "done", input_hash, output_path=output_path)
+
+    def fail(self, doc, input_hash, error, output_path=None):
+        """Mark the document as failed so the next run re-queues it."""
+        self._append(doc, "failed", input_hash, output_path=output_path, error=str(error))
+
+    def summary(self):
+        """Return the number of documents per status."""
+        with self._lock:
+            counts = {}
+            for record in self.records.values():
+                counts[record["status"]] = counts.get(record["status"], 0) + 1
+            return counts
+
+    def compact(self):
+        """Rewrite the journal with only the latest record of each document."""
+        with self._lock:
+            lines = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in self.records.values())
+            atomic_write(self.path, lines)
+
+    def _append(self, doc, status, input_hash, **fields):
+        with self._lock:
+            previous = self.records.get(doc, {})
+            record = {
+                "doc": doc,
+                "status": status,
+                "input_hash": input_hash,
+                "attempts": fields.pop("attempts", previous.get("attempts", 0)),
+                "output_path": fields.pop("output_path", None),
+                "updated": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                **fields,
+            }
+            self.records[doc] = record
+            with open(self.path, "a") as f:
+                f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
@@ -0,0 +1,30 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+
+def run_concurrently(items, worker, max_workers=4):
+    """
+    Run worker(item) for every item keeping up to max_workers calls in flight.
+    Yields (item, result, error) as soon as each call finishes, so callers can
+    report progress while the remaining requests are still running.
+    """
+    items = list(items)
+    start = time.perf_counter()
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(worker, item): item for item in items}
+        for future in as_completed(futures):
+            item = futures[future]
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+    report_throughput(len(items), time.perf_counter() - start)
+
+
+def report_throughput(num_docs, elapsed):
+    """Print and return the wall-clock throughput in documents per minute."""
+    docs_per_min = num_docs / (elapsed / 60) if elapsed > 0 else 0.0
+    print(f"Processed {num_docs} documents in {elapsed:.1f}s ({docs_per_min:.2f} docs/min)")
+    return docs_per_min
@@ -0,0 +1,361 @@
+"""
+Parser and metrics of the structured topic/sentiment results (notebook 9).
+
+The notebook read every model output with iterrows, stripped the ```json
+fences with a chain of replaces, ran ast.literal_eval and appended the rows
+one at a time to df_gpt / df_llama / df_qwen; it then fixed the labels with
+several category_mapping dictionaries and computed F1 and accuracy per model
+and topic in Python loops.
+
+Here all the outputs are parsed in bulk into one typed array
+
+    results[model, doc, topic, field]    field 0: present, 1: sentiment
+
+(int8, -1 where a model has no answer), every label goes through one lookup
+built once from the notebook mappings, and the F1, accuracy, precision and
+recall of every model x topic against the ground truth come out of a single
+pass of numpy reductions over that array.
+
+    python structured_results.py --sources chatgpt=/tmp/df_topicos_qna_sentiment.csv llama qwen
+"""
+import os
+import re
+import time
+import argparse
+from doc_ids import parse_doc_id
+from json_output import parse_json_object
+from data_folder import DATA_FOLDER
+
+GROUND_TRUTH_PATH = os.path.join(DATA_FOLDER, 'structured', 'Ground Truth.csv')
+
+# Documents whose Q&A is empty (null_list in the notebook)
+EXCLUDED_DOCS = {'prbc-2012-1', 'bpan-2017-4', 'bpan-2018-1', 'bpan-2017-2', 'brsr-2015-4',
+                 'itub-2019-1', 'bpan-2016-1', 'bpan-2017-1', 'bpan-2016-2', 'brsr-2014-1',
+                 'bpan-2016-3', 'bpan-2017-3', 'brsr-2008-1', 'brsr-2014-2'}
+
+FIELDS = ["present", "sentiment"]
+METRICS = ["accuracy", "f1", "precision", "recall", "support"]
+
+# Codes of the labels in the results array
+NO, YES, NEUTRAL, MISSING = 0, 1, 2, -1
+
+# Topic names written differently by the models (category_mapping of notebook 9), by their
+# stripped lowercase form; other differences of case or surrounding spaces are merged as well
+TOPIC_LABELS = {
+    'measures do governo': 'Medidas do governo',
+    'meidas do governo': 'Medidas do governo',
+    'segmento de veiculos': 'Segmento de veículos',
+    'segimento de veículos': 'Segmento de veículos',
+    'segmente de veículo': 'Segmento de veículos',
+    'segmente de veículos': 'Segmento de veículos',
+    'segmento imobiliario': 'Segmento imobiliário',
+    'veículos': 'Segmento de veículos',
+    'inadimplencia': 'Inadimplência',
+}
+
+# Answers of the models, from the present and sentiment mappings of the notebook.
+# For the sentiment, "Sim" stands for positive and "Não" for negative.
+ANSWER_LABELS = {
+    'sim': YES, 'não': NO, 'nao': NO, 'nãp': NO, 'nega': NO,
+    'true': YES, 'false': NO, '1': YES, '0': NO, '-1': NO,
+    'positivo': YES, 'positiva': YES, 'negativo': NO, 'negativa': NO, 'neutro/negativo': NO,
+    'neutro': NEUTRAL, 'neutral': NEUTRAL, 'indiferente': NEUTRAL, 'positivo/negativo': NEUTRAL,
+    'n/a': MISSING, 'n/i': MISSING, 'indisponível': MISSING, 'nulo': MISSING, 'none': MISSING, '-': MISSING, '': MISSING,
+    'custo de captação está diminuindo, especialmente em relação ao segmento imobiliário': YES,
+    'impacto positivo na rentabilidade dos produtos de crédito e no nível de inadimplência': YES,
+}
+# Free-text answers ("Não comentário positivo ou negativo sobre ...", "Sim, ...")
+ANSWER_PREFIX = re.compile(r"^\W*(sim|não|nao|nenhum|positiv|negativ)", re.IGNORECASE)
+PREFIX_LABELS = {'sim': YES, 'não': NO, 'nao': NO, 'nenhum': NO, 'positiv': YES, 'negativ': NO}
+
+# Fixes of the notebook for answers that are not a Python/JSON dictionary, in its order
+NOTEBOOK_REPAIRS = [
+    ('False', 'Não'), ('True', 'Sim'), ('Nenhum dos dois', 'Não'),
+    ("'Não'", 'Não'), ("'Sim'", 'Sim'), ('Não', "'Não'"), ('Sim', "'Sim'"),
+    ('Nenhum', 'Não'), ('Nem', ''), ('nem', ''),
+    ("[' 'Sim'  'Não'']", "['Sim', 'Não']"),
+    ("'Não desses palavras foi mencionado na transcrição'", "'Não','Não'"),
+    ("'Não menção'", "'Não','Não'"),
+    ("'Não,", "'Não',"),
+]
+FIRST_DICT = re.compile(r"\{.*?\}", re.DOTALL)
+# Unquoted values inside the lists ("[Sim, Positivo]")
+BARE_VALUE = re.compile(r"(?<=[\[,])\s*([^'\"\[\],{}:]+?)\s*(?=[\],])")
+
+
+def parse_answer(text):
+    """Return {topic: (present, sentiment)} from a model answer, or None if it cannot be read."""
+    value = parse_json_object(text)
+    if value is None:
+        # The first {...} of the answer without line breaks, with its unquoted values quoted
+        text = (text or "").replace('\\n', '').replace('\r', '').replace('\n', '')
+        match = FIRST_DICT.search(text)
+        text = match.group(0) if match else text
+        value = parse_json_object(BARE_VALUE.sub(r"'\1'", text))
+    if value is None:
+        # Then the repairs of the notebook
+        for old, new in NOTEBOOK_REPAIRS:
+            text = text.replace(old, new)
+        value = parse_json_object(text)
+    if value is None:
+        return None
+
+    answers = {}
+    for topic, answer in value.items():
+        if isinstance(answer, (list, tuple)):
+            answers[topic] = (answer[0] if answer else None, answer[1] if len(answer) > 1 else None)
+        elif isinstance(answer, dict):
+            answers[topic] = (answer.get("present"), answer.get("sentiment"))
+        else:
+            answers[topic] = (answer, None)
+    return answers
+
+
+def read_outputs(source):
+    """
+    Raw answers of a model as {doc: text}: from a folder of *_output.txt
+    files, or from a CSV with 'doc' and 'response' columns (the ChatGPT file).
+    """
+    if os.path.isdir(source):
+        outputs = {}
+        for filename in sorted(os.listdir(source)):
+            if filename.endswith('output.txt'):
+                with open(os.path.join(source, filename), 'r') as f:
+                    outputs[parse_doc_id(filename)[0]] = f.read()
+        return outputs
+
+    import pandas as pd
+
+    frame = pd.read_csv(source)
+    return dict(zip(frame['doc'], frame['response'].astype(str)))
+
+
+def parse_outputs(outputs, excluded=EXCLUDED_DOCS):
+    """
+    Parse the answers of a model ({doc: text}) into a DataFrame with one row
+    per document and topic (doc, topic, present, sentiment), the labels still
+    raw. Returns (frame, unreadable documents).
+    """
+    import pandas as pd
+
+    docs, topics, present, sentiment = [], [], [], []
+    failed = []
+    for doc, text in outputs.items():
+        if doc in excluded:
+            continue
+        answers = parse_answer(text)
+        if answers is None:
+            failed.append(doc)
+            continue
+        for topic, (is_present, positive) in answers.items():
+            docs.append(doc)
+            topics.append(topic)
+            present.append(is_present)
+            sentiment.append(positive)
+    frame = pd.DataFrame({"doc": docs, "topic": topics, "present": present, "sentiment": sentiment})
+    return frame, failed
+
+
+def _answer_code(value):
+    key = str(value).strip().strip("'\"").strip().lower()
+    if key in ANSWER_LABELS:
+        return ANSWER_LABELS[key]
+    match = ANSWER_PREFIX.match(key)
+    return PREFIX_LABELS[match.group(1).lower()] if match else MISSING
+
+
+def encode_labels(values):
+    """Codes (int8) of a Series of raw answers, looking up each distinct value once."""
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(values.astype(object).where(values.notna(), None), use_na_sentinel=True)
+    lookup = np.array([_answer_code(value) for value in uniques] + [MISSING], dtype=np.int8)
+    return lookup[codes]
+
+
+def normalize_topics(topics):
+    """
+    Topic names with the notebook corrections, looking up each distinct value
+    once. Names differing only in case or spaces take their most frequent spelling.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(pd.Series(topics, dtype=object).astype(str))
+    counts = np.bincount(codes, minlength=len(uniques))
+    spelling = {}
+    for i in np.argsort(-counts, kind="stable"):
+        spelling.setdefault(uniques[i].strip().lower(), uniques[i].strip())
+    lookup = np.array([TOPIC_LABELS.get(key, spelling[key]) for key in (topic.strip().lower() for topic in uniques)],
+                      dtype=object)
+    return lookup[codes]
+
+
+def build_results(frames):
+    """
+    Stack the parsed outputs of every model ({model: frame}) into
+    (models, docs, topics, results), results being an int8 array of shape
+    (models, docs, topics, 2) with MISSING where a model gave no answer.
+    A sentiment missing for a topic that is not present counts as "Não", as
+    in the notebook; any other answer than "Sim" for present counts as "Não".
+    """
+    import numpy as np
+    import pandas as pd
+
+    models = list(frames)
+    # The topics of all the models are normalized together, so they get the same spellings
+    all_topics = normalize_topics(np.concatenate([frame["topic"].to_numpy(dtype=object) for frame in frames.values()]))
+    ends = np.cumsum([len(frame) for frame in frames.values()])
+    normalized = {}
+    for model, frame, topic in zip(models, frames.values(), np.split(all_topics, ends[:-1])):
+        present = encode_labels(frame["present"])
+        present[present != YES] = NO
+        sentiment = encode_labels(frame["sentiment"])
+        sentiment[(sentiment == MISSING) & (present == NO)] = NO
+        normalized[model] = (frame["doc"].to_numpy(), topic, present, sentiment)
+
+    docs = pd.Index(sorted(set(np.concatenate([values[0] for values in normalized.values()]))))
+    topics = pd.Index(sorted(set(np.concatenate([values[1] for values in normalized.values()]))))
+    results = np.full((len(models), len(docs), len(topics), len(FIELDS)), MISSING, dtype=np.int8)
+    for m, model in enumerate(models):
+        doc, topic, present, sentiment = normalized[model]
+        rows = docs.get_indexer(doc)
+        columns = topics.get_indexer(topic)
+        results[m, rows, columns, 0] = present
+        results[m, rows, columns, 1] = sentiment
+    return models, list(docs), list(topics), results
+
+
+def load_ground_truth(path=GROUND_TRUTH_PATH):
+    """The labelled sample of notebook 9 as a DataFrame (doc, topic, present)."""
+    import pandas as pd
+
+    frame = pd.read_csv(path, sep=';')
+    frame = frame.iloc[:480, 1:7]
+    frame = frame.rename(columns={'Nº': 'n', 'Document': 'doc', 'Bank': 'bank', 'Year': 'year',
+                                  'Trimester': 'trimester', 'Topic': 'topic', 'Present': 'present'})
+    frame['present'] = frame['present'].astype(int)
+    frame['doc'] = frame['doc'].str[2:-2].str.replace('T', '')
+    return frame[['doc', 'topic', 'present']]
+
+
+def ground_truth_matrix(ground_truth, docs, topics):
+    """Ground truth of present as an int8 (docs, topics) matrix aligned with the results, MISSING where unlabelled."""
+    import numpy as np
+    import pandas as pd
+
+    matrix = np.full((len(docs), len(topics)), MISSING, dtype=np.int8)
+    rows = pd.Index(docs).get_indexer(ground_truth['doc'])
+    # Topics are matched regardless of case and spaces, after the notebook corrections
+    keys = [topic.strip().lower() for topic in ground_truth['topic'].astype(str)]
+    columns = pd.Index([topic.lower() for topic in topics]).get_indexer(
+        [TOPIC_LABELS.get(key, key).lower() for key in keys])
+    known = (rows >= 0) & (columns >= 0)
+    matrix[rows[known], columns[known]] = ground_truth['present'].to_numpy()[known]
+    return matrix
+
+
+def present_metrics(results, truth, models, topics, common=True):
+    """
+    Accuracy, F1, precision, recall and support of present for every model
+    and topic (plus "all"), as a DataFrame indexed by (model, topic).
+
+    Only labelled pairs answered by the model are scored; with common=True
+    only the pairs answered by every model, like the inner merges of the
+    notebook. F1, precision and recall are 0 when undefined, as in sklearn.
+    """
+    import numpy as np
+    import pandas as pd
+
+    predicted = results[..., 0]
+    mask = (truth >= 0)[None] & (predicted >= 0)
+    if common:
+        mask &= mask.all(axis=0)[None]
+    positive = predicted == YES
+    actual = truth[None] == YES
+
+    # Confusion counts per (model, topic), then the totals of every model as the extra "all" topic
+    counts = np.stack([
+        (positive & actual & mask).sum(axis=1),
+        (positive & ~actual & mask).sum(axis=1),
+        (~positive & actual & mask).sum(axis=1),
+        (~positive & ~actual & mask).sum(axis=1),
+    ], axis=-1).astype(np.float64)
+    counts = np.concatenate([counts, counts.sum(axis=1, keepdims=True)], axis=1)
+    tp, fp, fn, tn = np.moveaxis(counts, -1, 0)
+
+    support = tp + fp + fn + tn
+    with np.errstate(divide='ignore', invalid='ignore'):
+        values = np.stack([
+            (tp + tn) / support,
+            np.where(2 * tp + fp + fn > 0, 2 * tp / (2 * tp + fp + fn), 0.0),
+            np.where(tp + fp > 0, tp / (tp + fp), 0.0),
+            np.where(tp + fn > 0, tp / (tp + fn), 0.0),
+            support,
+        ], axis=-1)
+
+    index = pd.MultiIndex.from_product([models, list(topics) + ["all"]], names=["model", "topic"])
+    metrics = pd.DataFrame(values.reshape(-1, len(METRICS)), index=index, columns=METRICS)
+    metrics["support"] = metrics["support"].astype(int)
+    return metrics[metrics["support"] > 0]
+
+
+def agreement(results, models, field=0):
+    """Share of the (doc, topic) pairs answered by both models where they agree, for every pair of models."""
+    import numpy as np
+    import pandas as pd
+
+    values = results[..., field]
+    answered = values >= 0
+    both = answered[:, None] & answered[None, :]
+    same = (values[:, None] == values[None, :]) & both
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rate = same.sum(axis=(2, 3)) / both.sum(axis=(2, 3))
+    return pd.DataFrame(rate, index=models, columns=models)
+
+
+def structured_source(model):
+    return os.path.join(DATA_FOLDER, 'output', model, 'structured/')
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Parse the structured results and score them against the ground truth.")
+    parser.add_argument("--sources", nargs="+", default=["chatgpt", "llama", "qwen"],
+                        help="Models as name or name=path (folder of outputs or CSV with doc and response)")
+    parser.add_argument("--ground-truth", default=GROUND_TRUTH_PATH, help="CSV with the labelled sample")
+    parser.add_argument("--all-pairs", action="store_true",
+                        help="Score each model on every pair it answered, not only the pairs answered by all models")
+    parser.add_argument("--output", help="Save the metrics to this CSV file")
+    args = parser.parse_args()
+
+    start = time.time()
+    frames = {}
+    for source in args.sources:
+        model, _, path = source.partition("=")
+        frame, failed = parse_outputs(read_outputs(path or structured_source(model)))
+        frames[model] = frame
+        print(f"{model}: {frame['doc'].nunique()} documents, {len(frame)} answers, {len(failed)} unreadable")
+    models, docs, topics, results = build_results(frames)
+    print(f"Parsed into {results.shape} in {time.time() - start:.2f}s")
+
+    print("\nAgreement on present:")
+    print(agreement(results, models).round(2).to_string())
+
+    if not os.path.exists(args.ground_truth):
+        print(f"\nNo ground truth at {args.ground_truth}")
+        return
+    start = time.time()
+    truth = ground_truth_matrix(load_ground_truth(args.ground_truth), docs, topics)
+    metrics = present_metrics(results, truth, models, topics, common=not args.all_pairs)
+    print(f"\nMetrics computed in {(time.time() - start) * 1000:.1f}ms")
+    print(metrics.xs("all", level="topic").round(2).to_string())
+    print()
+    print(metrics["accuracy"].unstack("model").round(2).to_string())
+    if args.output:
+        metrics.to_csv(args.output)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
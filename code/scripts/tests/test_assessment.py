@@ -0,0 +1,87 @@
+import threading
+import pytest
+import assessment
+from assessment import MAX_SUMMARY_LEVELS, make_batches, reduce_explanations
+
+PROMPTS = {"assessment": "final", "assessment_batch_summary": "{model_name}|{explanations}"}
+
+
+class FakeLLM:
+    """Summarizes a batch into one word, or repeats it when verbose (a summary that never shrinks)."""
+
+    def __init__(self, verbose=False):
+        self.verbose = verbose
+        self.batches = []
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt):
+        batch = prompt.split("|", 1)[1].split("\n\n")
+        with self._lock:
+            self.batches.append(batch)
+            number = len(self.batches)
+        return " ".join(batch) if self.verbose else f"resumo{number}"
+
+
+@pytest.fixture
+def budgets(monkeypatch):
+    """One token per word; the budgets of the final and batch prompts are set by each test."""
+    budgets = {}
+    monkeypatch.setattr(assessment, "count_tokens", lambda text: len(text.split()))
+    monkeypatch.setattr(assessment, "get_prompt", PROMPTS.get)
+    monkeypatch.setattr(assessment, "prompt_budget",
+                        lambda prompt: budgets["final" if prompt == "final" else "batch"])
+    return budgets
+
+
+def test_batches_never_mix_groups_and_keep_the_leftover(budgets):
+    texts = ["a b", "c d", "e f", "g", "h i j k l", "m"]
+    groups = ["abcb", "abcb", "abcb", "itub", "itub", "sanb"]
+    assert make_batches(texts, groups, 4) == [["a b", "c d"], ["e f"], ["g"], ["h i j k l"], ["m"]]
+
+
+def test_explanations_that_fit_are_not_summarized(budgets):
+    budgets.update(final=10, batch=10)
+    llm = FakeLLM()
+    assert reduce_explanations(llm, "llama", ["boa", "fraca"], ["abcb", "itub"]) == ["boa", "fraca"]
+    assert llm.batches == []
+
+
+def test_first_level_is_batched_per_bank(budgets, capsys):
+    budgets.update(final=2, batch=10)
+    explanations = [f"e{i}" for i in range(6)]
+    banks = ["abcb", "abcb", "abcb", "itub", "itub", "sanb"]
+    llm = FakeLLM()
+
+    summaries = reduce_explanations(llm, "llama", explanations, banks)
+
+    first_level, second_level = llm.batches[:3], llm.batches[3:]
+    assert sorted(first_level) == [["e0", "e1", "e2"], ["e3", "e4"], ["e5"]]
+    # Every explanation reaches the reduction exactly once
+    assert sorted(e for batch in first_level for e in batch) == explanations
+    # The three bank summaries do not fit and are summarized together
+    assert len(second_level) == 1 and len(second_level[0]) == 3
+    assert summaries == ["resumo4"]
+    assert capsys.readouterr().out.count("level") == 2
+
+
+def test_single_leftover_batch_is_summarized_at_the_next_level(budgets, capsys):
+    budgets.update(final=1, batch=3)
+    llm = FakeLLM()
+    summaries = reduce_explanations(llm, "llama", ["a", "b", "c", "d"], [None] * 4)
+    # Level 1: [a b c] [d]; level 2: one batch with both summaries
+    assert sorted(len(batch) for batch in llm.batches[:2]) == [1, 3]
+    assert len(llm.batches[2]) == 2
+    assert len(summaries) == 1
+    assert capsys.readouterr().out.count("level") == 2
+
+
+def test_levels_are_capped(budgets, capsys):
+    budgets.update(final=1, batch=100)
+    llm = FakeLLM(verbose=True)
+    summaries = reduce_explanations(llm, "llama", ["a b", "c d"], ["abcb", "abcb"])
+
+    out = capsys.readouterr().out
+    assert out.count("level") == MAX_SUMMARY_LEVELS
+    assert len(llm.batches) == MAX_SUMMARY_LEVELS
+    assert "still exceed the context window" in out
+    assert summaries == ["a b c d"]
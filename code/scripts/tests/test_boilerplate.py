@@ -0,0 +1,75 @@
+from boilerplate import MIN_DOCS, BoilerplateIndex
+
+OPENING = "Bom dia a todos e obrigado por aguardarem."
+CLOSING = "A teleconferência está encerrada, agradecemos a participação."
+
+
+def _corpus(bank, bodies, opening=OPENING, closing=CLOSING):
+    return {f"{bank}-{2010 + i}-1.txt": f"{opening} {body} {closing}" for i, body in enumerate(bodies)}
+
+
+BODIES = [
+    "A carteira de crédito cresceu no trimestre.",
+    "O índice de inadimplência caiu para dois por cento.",
+    "As despesas administrativas ficaram estáveis.",
+    "O lucro líquido subiu com a margem financeira.",
+]
+
+
+def _index(documents, **kwargs):
+    return BoilerplateIndex.learn(documents, shingle=3, **kwargs)
+
+
+def test_boilerplate_at_both_ends_is_removed():
+    index = _index(_corpus("itub", BODIES))
+    text = f"{OPENING} O banco anunciou recompra de ações. {CLOSING}"
+    assert index.strip(text, "itub") == "O banco anunciou recompra de ações."
+
+
+def test_overlapping_spans_are_removed_once_and_the_rest_is_kept():
+    index = _index(_corpus("itub", BODIES))
+    # The opening repeated back to back: its shingles overlap and cover one run of words
+    text = f"Início. {OPENING} {OPENING} Pergunta sobre a Selic. {CLOSING}"
+    assert index.strip(text, "itub") == "Início. Pergunta sobre a Selic."
+
+
+def test_digits_and_punctuation_do_not_hide_a_span():
+    documents = _corpus("bbas", BODIES, opening="Resultados do 1T22 do Banco do Brasil.")
+    index = _index(documents)
+    assert index.strip("“Resultados do 4T23 do Banco do Brasil” Nova pergunta.", "bbas") == "Nova pergunta."
+
+
+def test_bank_missing_from_the_index_is_unchanged():
+    index = _index(_corpus("itub", BODIES))
+    text = f"{OPENING} O banco anunciou recompra de ações. {CLOSING}"
+    assert index.strip(text, "sanb") == text
+    assert index.strip(text, None) == text
+
+
+def test_span_in_fewer_than_min_docs_documents_is_kept():
+    documents = _corpus("itub", BODIES[:MIN_DOCS], opening="", closing="")
+    # In every document but one: above the share, below MIN_DOCS
+    rare = "Nossa estratégia digital avança bem"
+    documents.update({f"itub-2020-{i}.txt": f"{rare} {body}" for i, body in enumerate(BODIES[:MIN_DOCS - 1], 1)})
+    index = _index(documents, min_share=0.1)
+    text = f"{rare} e os juros sobem."
+    assert index.strip(text, "itub") == text
+
+
+def test_span_below_the_share_is_kept():
+    bodies = [f"Documento número {word} sem repetição alguma." for word in "abcdefghij"]
+    documents = _corpus("itub", bodies, opening="", closing="")
+    shared = "Frase repetida em poucos documentos"
+    for name in list(documents)[:MIN_DOCS]:
+        documents[name] = f"{shared} {documents[name]}"
+    index = _index(documents, min_share=0.5)
+    assert index.strip(f"{shared} aqui.", "itub") == f"{shared} aqui."
+    assert _index(documents, min_share=0.3).strip(f"{shared} aqui.", "itub") == "aqui."
+
+
+def test_saved_index_strips_the_same(tmp_path):
+    index = _index(_corpus("itub", BODIES))
+    path = str(tmp_path / "boilerplate.json")
+    index.save(path)
+    text = f"{OPENING} Pergunta. {CLOSING}"
+    assert BoilerplateIndex.load(path).strip(text, "itub") == index.strip(text, "itub") == "Pergunta."
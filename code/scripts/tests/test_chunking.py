@@ -0,0 +1,49 @@
+from chunking import TokenCountCache, count_tokens, largest_first, split_into_windows
+
+
+def _transcript(questions=6, sentences=12):
+    parts = ["Bom dia a todos e obrigado por participarem da teleconferência."]
+    for i in range(questions):
+        answer = " ".join(f"A carteira de crédito cresceu {j} por cento no trimestre." for j in range(sentences))
+        parts.append(f"Operadora: Nossa próxima pergunta vem de Analista {i}. Qual a expectativa para o crédito? "
+                     f"Diretor: {answer}")
+    return " ".join(parts)
+
+
+def test_short_text_is_one_window():
+    text = "Tarefa curta."
+    assert split_into_windows(text, 100) == [text]
+
+
+def test_windows_fit_and_keep_every_word_in_order():
+    text = _transcript()
+    max_tokens = count_tokens(text) // 4
+    windows = split_into_windows(text, max_tokens)
+    assert len(windows) > 1
+    assert all(count_tokens(window) <= max_tokens for window in windows)
+    assert " ".join(windows).split() == text.split()
+
+
+def test_windows_start_at_question_boundaries_when_possible():
+    text = _transcript(questions=4, sentences=5)
+    question_tokens = count_tokens(text) // 4
+    windows = split_into_windows(text, question_tokens + 20)
+    assert all(window.startswith("Operadora:") for window in windows[1:])
+
+
+def test_text_without_boundaries_is_cut_by_words():
+    text = " ".join(f"palavra{i}" for i in range(500))
+    windows = split_into_windows(text, 50)
+    assert all(count_tokens(window) <= 50 for window in windows)
+    assert " ".join(windows) == text
+
+
+def test_largest_first_and_cached_counts(tmp_path):
+    path = str(tmp_path / "counts.json")
+    counts = TokenCountCache(path)
+    corpus = {"a.txt": "um", "b.txt": "um dois três quatro", "c.txt": "um dois"}
+    assert list(largest_first(corpus, counts)) == ["b.txt", "c.txt", "a.txt"]
+    counts.save()
+    reloaded = TokenCountCache(path)
+    assert reloaded.counts == counts.counts
+    assert reloaded.count("um dois") == count_tokens("um dois")
@@ -0,0 +1,54 @@
+import os
+import glob
+import pytest
+from corpus_stats import document_stats, compute_stats, StatsCache
+
+TRANSCRIPTIONS = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "..", "..", "Transcriptions")
+
+# df_stats of notebook 1: (sentences, tokens, num_unique_words)
+NOTEBOOK_STATS = {
+    "abcb-2010-2": (137, 3232, 989),
+    "abcb-2022-3": (232, 6638, 1723),
+}
+
+
+def test_abbreviations_and_urls_do_not_end_sentences():
+    text = ("Bom dia, Sr. João. A margem subiu 0,5 p.p. no trimestre. "
+            "Os dados estão em www.bb.com.br. Perguntas?")
+    _, sentences, tokens, words, unique = document_stats(text)
+    assert sentences == 4
+    # "Sr.", "p.p." and "www.bb.com.br" keep their periods
+    assert tokens == 22
+    assert words == 17
+    assert unique == len(set(text.split()))
+
+
+def test_ellipsis_before_lowercase_continues_the_sentence():
+    assert document_stats("Então... vamos lá. Certo... Obrigado.")[1] == 3
+
+
+def test_short_sentences_are_not_counted():
+    assert document_stats("Ok. A. Tudo bem.")[1] == 2
+
+
+def test_cache_reuses_counts(tmp_path):
+    cache = StatsCache(str(tmp_path / "stats.json"))
+    first = compute_stats({"a": "Uma frase. Outra frase."}, workers=1, cache=cache)
+    reloaded = StatsCache(cache.path)
+    assert reloaded.get(reloaded.key("Uma frase. Outra frase.")) == list(first["a"])
+
+
+@pytest.mark.parametrize("doc", sorted(NOTEBOOK_STATS))
+def test_counts_close_to_notebook(doc):
+    pytest.importorskip("pdfplumber")
+    from pdf_extraction import raw_text_extract, include_tables_for
+    from text_cleaning import clean
+
+    pdfs = glob.glob(os.path.join(TRANSCRIPTIONS, doc + "*.pdf"))
+    if not pdfs:
+        pytest.skip("transcript not available")
+    filename = os.path.basename(pdfs[0])
+    text = clean(" ".join(raw_text_extract(pdfs[0], include_tables_for(filename))))
+    _, sentences, tokens, _, unique = document_stats(text)
+    for ours, notebook in zip((sentences, tokens, unique), NOTEBOOK_STATS[doc]):
+        assert abs(ours - notebook) <= 0.02 * notebook
@@ -0,0 +1,30 @@
+import os
+import subprocess
+import sys
+
+SCRIPTS = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _paths(data_folder):
+    code = ("import data_folder, pdf_extraction, qna_segmenter, corpus_stats; "
+            "print(data_folder.TRANSCRIPT_FOLDER); print(pdf_extraction.CACHE_FOLDER); print(corpus_stats.CACHE_PATH)")
+    env = dict(os.environ, PIPELINE_DATA_FOLDER=data_folder)
+    output = subprocess.run([sys.executable, "-c", code], cwd=SCRIPTS, env=env, capture_output=True, text=True, check=True)
+    return output.stdout.split("\n")[:3]
+
+
+def test_paths_follow_the_data_folder(tmp_path):
+    data_folder = str(tmp_path / "Divided_text") + "/"
+    transcripts, pdf_cache, stats_cache = _paths(data_folder)
+    assert transcripts == str(tmp_path / "Transcripts") + "/"
+    assert pdf_cache.startswith(data_folder) and stats_cache.startswith(data_folder)
+
+
+def test_load_texts_uses_the_given_cache(tmp_path, monkeypatch):
+    import pdf_extraction
+
+    calls = []
+    monkeypatch.setattr(pdf_extraction, "extract_folder", lambda folder, cache_folder: calls.append(cache_folder)
+                        or ({"a.pdf": ["página 1", "página 2"]}, {}))
+    assert pdf_extraction.load_texts(str(tmp_path), cache_folder=str(tmp_path / "cache")) == {"a.pdf": "página 1 página 2"}
+    assert calls == [str(tmp_path / "cache")]
@@ -0,0 +1,60 @@
+from format_validator import MAX_TOPICS, parse_tarefas, validate_with_fallback
+
+
+def test_strict_answer_is_valid():
+    result = parse_tarefas("Tarefa 1:\n- Taxa Selic\n- Inadimplência\n\nTarefa 2: positivo")
+    assert result["status"] == "valid"
+    assert result["topics"] == ["Taxa Selic", "Inadimplência"]
+    assert result["sentiment"] == "positivo"
+
+
+def test_missing_section_is_invalid():
+    result = parse_tarefas("Tarefa 1:\n- Taxa Selic")
+    assert result["status"] == "invalid"
+    assert parse_tarefas(None)["status"] == "invalid"
+
+
+def test_no_topics_is_invalid():
+    assert parse_tarefas("Tarefa 1: nada\nTarefa 2: negativo")["status"] == "invalid"
+
+
+def test_too_many_topics_is_invalid():
+    topics = "\n".join(f"- Tópico {i}" for i in range(MAX_TOPICS + 1))
+    assert parse_tarefas(f"Tarefa 1:\n{topics}\nTarefa 2: positivo")["status"] == "invalid"
+
+
+def test_sentiment_missing_is_invalid():
+    assert parse_tarefas("Tarefa 1:\n- Selic\nTarefa 2: neutro")["status"] == "invalid"
+
+
+def test_markdown_headers_are_ambiguous():
+    result = parse_tarefas("**Tarefa 1:**\n- Selic\n**Tarefa 2:** Negativo")
+    assert result["status"] == "ambiguous"
+    assert result["topics"] == ["Selic"]
+    assert result["sentiment"] == "negativo"
+
+
+def test_sentence_in_tarefa_2_is_ambiguous():
+    result = parse_tarefas("Tarefa 1:\n- Selic\nTarefa 2: O público teve uma percepção positiva.")
+    assert result["status"] == "ambiguous"
+    assert result["sentiment"] == "positivo"
+
+
+def test_prose_between_topics_is_ambiguous():
+    result = parse_tarefas("Tarefa 1:\nOs tópicos são:\n- Selic\nTarefa 2: positivo")
+    assert result["status"] == "ambiguous"
+    assert result["topics"] == ["Selic"]
+
+
+def test_llm_validator_only_called_when_ambiguous():
+    calls = []
+
+    def validator(text):
+        calls.append(text)
+        return True
+
+    assert validate_with_fallback("Tarefa 1:\n- Selic\nTarefa 2: positivo", validator)
+    assert not validate_with_fallback("sem formato", validator)
+    assert calls == []
+    assert validate_with_fallback("**Tarefa 1:**\n- Selic\n**Tarefa 2:** positivo", validator)
+    assert len(calls) == 1
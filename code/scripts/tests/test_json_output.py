@@ -0,0 +1,52 @@
+import pytest
+from json_output import json_stats, parse_json_object
+
+EXPECTED = {"score": 8, "explanation": "Bons tópicos"}
+
+
+@pytest.mark.parametrize("answer", [
+    '{"score": 8, "explanation": "Bons tópicos"}',
+    '```json\n{"score": 8, "explanation": "Bons tópicos"}\n```',
+    'Aqui está a avaliação: {"score": 8, "explanation": "Bons tópicos"} Espero ter ajudado.',
+    '{"score": 8, "explanation": "Bons tópicos",}',
+    '{“score”: 8, “explanation”: “Bons tópicos”}',
+    "{'score': 8, 'explanation': 'Bons tópicos'}",
+    '{"score": 8, "explanation": "Bons tópicos"',
+])
+def test_near_miss_answers_are_repaired(answer):
+    assert parse_json_object(answer) == EXPECTED
+
+
+def test_line_break_inside_a_string():
+    assert parse_json_object('Resposta: {"score": 8, "explanation": "linha 1\nlinha 2"}') == \
+        {"score": 8, "explanation": "linha 1\nlinha 2"}
+
+
+def test_cut_inside_a_string_is_closed():
+    assert parse_json_object('{"score": 8, "explanation": "Bons tóp') == {"score": 8, "explanation": "Bons tóp"}
+
+
+def test_braces_inside_strings_are_skipped():
+    assert parse_json_object('x {"score": 8, "explanation": "usa {chaves} e \\"aspas\\""} y') == \
+        {"score": 8, "explanation": 'usa {chaves} e "aspas"'}
+
+
+def test_nested_objects():
+    answer = 'Resultado: {"A": {"score": 7, "explanation": "ok"}, "B": {"score": 3, "explanation": "fraco"}}'
+    assert parse_json_object(answer) == {"A": {"score": 7, "explanation": "ok"}, "B": {"score": 3, "explanation": "fraco"}}
+
+
+@pytest.mark.parametrize("answer", [None, "", "sem objeto", "[1, 2]", "{não é json nem python}"])
+def test_unrecoverable_answers(answer):
+    assert parse_json_object(answer) is None
+
+
+def test_statistics_count_each_outcome():
+    before = json_stats()
+    parse_json_object('{"score": 1}')
+    parse_json_object("{'score': 1}")
+    parse_json_object("nada")
+    after = json_stats()
+    assert after["parsed"] - before["parsed"] == 1
+    assert after["repaired"] - before["repaired"] == 1
+    assert after["failed"] - before["failed"] == 1
@@ -0,0 +1,98 @@
+import os
+import json
+import math
+from judge_store import JudgeResultsStore, parse_score
+
+
+def _write(folder, doc, evaluations, mtime=None):
+    os.makedirs(folder, exist_ok=True)
+    path = os.path.join(folder, f"{doc}_evaluation.json")
+    with open(path, "w") as f:
+        json.dump(evaluations, f)
+    if mtime is not None:
+        os.utime(path, (mtime, mtime))
+    return path
+
+
+def _results(tmp_path):
+    """Two judges: gpt evaluates llama and gemma, llama evaluates gemma only (never itself)."""
+    results = tmp_path / "results"
+    gpt = str(results / "judge_gpt" / "contextualized")
+    llama = str(results / "judge_llama" / "contextualized")
+    _write(gpt, "itub-2019-3", {"llama": {"score": 4, "explanation": "boa"}, "gemma": {"score": "3", "explanation": "ok"}})
+    _write(gpt, "bbas-2020-1", {"llama": {"score": 5, "explanation": "ótima"}, "gemma": {"score": "n/a", "explanation": "?"}})
+    _write(llama, "itub-2019-3", {"gemma": {"score": 2, "explanation": "fraca"}})
+    return str(results)
+
+
+def test_parse_score():
+    assert parse_score("4") == 4.0 and parse_score(3) == 3.0
+    assert parse_score("n/a") is None and parse_score(None) is None
+
+
+def test_import_all_reads_each_file_once(tmp_path):
+    results = _results(tmp_path)
+    store = JudgeResultsStore(str(tmp_path / "store.sqlite"))
+    assert store.import_all(results) == 3
+    assert store.import_all(results) == 0
+    assert JudgeResultsStore(store.database_path).import_all(results) == 0
+    assert len(store.load()) == 5
+
+
+def test_changed_file_is_imported_again(tmp_path):
+    results = _results(tmp_path)
+    store = JudgeResultsStore(str(tmp_path / "store.sqlite"))
+    store.import_all(results)
+
+    folder = os.path.join(results, "judge_llama", "contextualized")
+    path = _write(folder, "itub-2019-3", {"gemma": {"score": 5, "explanation": "revista"}}, mtime=2_000_000_000)
+    assert store.import_folder("llama", folder) == 1
+    frame = store.load(["llama"])
+    assert frame["score"].tolist() == [5.0] and frame["explanation"].tolist() == ["revista"]
+    os.utime(path, (2_000_000_000, 2_000_000_000))
+    assert store.import_folder("llama", folder) == 0
+
+
+def test_recorded_file_is_not_imported_again(tmp_path):
+    folder = str(tmp_path / "judge_gpt" / "contextualized")
+    path = _write(folder, "itub-2019-3", {"llama": {"score": 4, "explanation": "boa"}})
+    store = JudgeResultsStore(str(tmp_path / "store.sqlite"))
+    store.record("itub-2019-3", "gpt", {"llama": {"score": 4, "explanation": "boa"}}, path)
+    assert store.import_folder("gpt", folder) == 0
+
+
+def test_invalid_json_is_skipped(tmp_path):
+    folder = tmp_path / "judge_gpt" / "contextualized"
+    folder.mkdir(parents=True)
+    (folder / "itub-2019-3_evaluation.json").write_text("{not json")
+    store = JudgeResultsStore(str(tmp_path / "store.sqlite"))
+    assert store.import_folder("gpt", str(folder)) == 0
+    assert store.import_folder("gpt", str(tmp_path / "missing")) == 0
+
+
+def test_score_tensor_axes_and_missing_cells(tmp_path):
+    store = JudgeResultsStore(str(tmp_path / "store.sqlite"))
+    store.import_all(_results(tmp_path))
+    docs, judges, candidates, scores = store.score_tensor()
+
+    assert docs == ["bbas-2020-1", "itub-2019-3"]
+    assert judges == ["gpt", "llama"]
+    assert candidates == ["gemma", "llama"]
+    assert scores.shape == (2, 2, 2)
+    assert scores[1, 0, 1] == 4.0 and scores[1, 0, 0] == 3.0 and scores[1, 1, 0] == 2.0
+    # Unparseable score, a judge that did not evaluate the doc, and a model judging itself
+    assert math.isnan(scores[0, 0, 0])
+    assert math.isnan(scores[0, 1, 0])
+    assert math.isnan(scores[1, 1, 1])
+
+
+def test_score_matrix_means_over_available_judges(tmp_path):
+    store = JudgeResultsStore(str(tmp_path / "store.sqlite"))
+    store.import_all(_results(tmp_path))
+    matrix = store.score_matrix()
+
+    assert "llama_judge_llama" not in matrix.columns
+    assert matrix.loc["itub-2019-3", "gemma_judge_gpt"] == 3.0
+    assert matrix.loc["itub-2019-3", "gemma_score"] == 2.5
+    assert matrix.loc["itub-2019-3", "llama_score"] == 4.0
+    assert math.isnan(matrix.loc["bbas-2020-1", "gemma_score"])
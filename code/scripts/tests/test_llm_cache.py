@@ -0,0 +1,111 @@
+import threading
+import pytest
+import llm_cache
+from langchain_core.outputs import Generation
+from llm_cache import SQLiteLLMCache
+
+LLM = "ollama-llama3-temperature-0"
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_cache.time, "time", clock.time)
+    return clock
+
+
+def _cache(tmp_path, **kwargs):
+    return SQLiteLLMCache(str(tmp_path / "llm_cache.sqlite"), **kwargs)
+
+
+def _answer(text):
+    return [Generation(text=text)]
+
+
+def _keys(cache):
+    return {row[0] for row in cache._conn.execute("SELECT key FROM responses")}
+
+
+def test_hit_and_miss_counters(tmp_path, clock):
+    cache = _cache(tmp_path)
+    assert cache.lookup("prompt", LLM) is None
+    cache.update("prompt", LLM, _answer("resposta"))
+    assert cache.lookup("prompt", LLM)[0].text == "resposta"
+    assert cache.lookup("prompt", "other-model") is None
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["entries"]) == (1, 2, 1)
+
+
+def test_entries_survive_reopening(tmp_path, clock):
+    _cache(tmp_path).update("prompt", LLM, _answer("resposta"))
+    assert _cache(tmp_path).lookup("prompt", LLM)[0].text == "resposta"
+
+
+def test_entries_older_than_max_age_are_misses_and_evicted(tmp_path, clock):
+    cache = _cache(tmp_path, max_age_days=1)
+    cache.update("old", LLM, _answer("a"))
+    clock.now += 12 * 3600
+    cache.update("recent", LLM, _answer("b"))
+    clock.now += 13 * 3600
+
+    assert cache.lookup("old", LLM) is None
+    assert cache.lookup("recent", LLM)[0].text == "b"
+    cache.evict()
+    assert _keys(cache) == {cache.make_key("recent", LLM)}
+
+
+def test_least_recently_used_entries_are_evicted_first(tmp_path, clock):
+    size = len('[{"text": "x", "generation_info": null}]')
+    cache = _cache(tmp_path, max_size_mb=2.5 * size / 1024 / 1024, max_age_days=None)
+    for prompt in ["first", "second", "third"]:
+        cache.update(prompt, LLM, _answer("x"))
+        clock.now += 1
+    # Reading "first" makes "second" the least recently used
+    cache.lookup("first", LLM)
+    clock.now += 1
+
+    cache.evict()
+    assert _keys(cache) == {cache.make_key("first", LLM), cache.make_key("third", LLM)}
+    assert cache.stats()["size_bytes"] <= cache.max_size_bytes
+
+
+def test_refresh_skips_stale_entry_and_replaces_it(tmp_path, clock):
+    cache = _cache(tmp_path)
+    cache.update("prompt", LLM, _answer("resposta inválida"))
+    with cache.refresh():
+        assert cache.lookup("prompt", LLM) is None
+        # The retry's answer replaces the stored one
+        cache.update("prompt", LLM, _answer("resposta válida"))
+    assert cache.lookup("prompt", LLM)[0].text == "resposta válida"
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_refresh_only_applies_to_the_current_thread(tmp_path, clock):
+    cache = _cache(tmp_path)
+    cache.update("prompt", LLM, _answer("resposta"))
+    other_thread = []
+    with cache.refresh():
+        worker = threading.Thread(target=lambda: other_thread.append(cache.lookup("prompt", LLM)))
+        worker.start()
+        worker.join()
+        assert cache.lookup("prompt", LLM) is None
+    assert other_thread[0][0].text == "resposta"
+    assert cache.lookup("prompt", LLM)[0].text == "resposta"
+
+
+def test_nested_refresh_restores_previous_state(tmp_path, clock):
+    cache = _cache(tmp_path)
+    cache.update("prompt", LLM, _answer("resposta"))
+    with cache.refresh():
+        with cache.refresh(enabled=False):
+            assert cache.lookup("prompt", LLM) is None
+        assert cache.lookup("prompt", LLM) is None
+    assert cache.lookup("prompt", LLM) is not None
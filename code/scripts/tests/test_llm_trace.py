@@ -0,0 +1,121 @@
+import uuid
+import pytest
+import requests
+import llm_trace
+from langchain_core.outputs import Generation, GenerationChunk, LLMResult
+from llm_trace import CallTracer, prometheus_text, summary
+from ollama_router import EndpointPool, RoutedOllama
+
+
+class Clock:
+    def __init__(self):
+        self.now = 100.0
+
+    def perf_counter(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(llm_trace.time, "perf_counter", clock.perf_counter)
+    return clock
+
+
+def _call(tracer, clock, latency, ttft=None, model="llama3", error=None, **info):
+    """One traced call through the LangChain callbacks."""
+    run_id = uuid.uuid4()
+    tracer.on_llm_start({}, ["prompt"], run_id=run_id, invocation_params={"model": model})
+    start = clock.now
+    if ttft is not None:
+        clock.now = start + ttft
+        tracer.on_llm_new_token("Tarefa", run_id=run_id)
+    clock.now = start + latency
+    if error is not None:
+        tracer.on_llm_error(error, run_id=run_id)
+    else:
+        tracer.on_llm_end(LLMResult(generations=[[Generation(text="Tarefa 1: ok", generation_info=info)]]),
+                          run_id=run_id)
+    return tracer.records[-1]
+
+
+def _metric(text, line_start):
+    return [line for line in text.splitlines() if line.startswith(line_start)]
+
+
+def test_histogram_buckets_are_cumulative(clock):
+    tracer = CallTracer(path=None)
+    with tracer.context(stage="judge", step="evaluation"):
+        for latency in [0.3, 1.5, 1.5, 45]:
+            _call(tracer, clock, latency, ttft=0.2, prompt_eval_count=100, eval_count=10)
+    text = prometheus_text(tracer.records)
+
+    labels = 'model="llama3",stage="judge"'
+    buckets = {line.split("le=")[1].split('"')[1]: int(line.split()[-1])
+               for line in _metric(text, "llm_call_latency_seconds_bucket{" + labels)}
+    assert buckets["0.5"] == 1 and buckets["1"] == 1 and buckets["2"] == 3
+    assert buckets["30"] == 3 and buckets["60"] == 4 and buckets["+Inf"] == 4
+    assert _metric(text, "llm_call_latency_seconds_count{" + labels) == [
+        "llm_call_latency_seconds_count{" + labels + "} 4"]
+    assert _metric(text, "llm_call_latency_seconds_sum{" + labels)[0].endswith(" 48.3")
+    assert _metric(text, "llm_time_to_first_token_seconds_bucket{" + labels + ',le="0.5"}') == [
+        "llm_time_to_first_token_seconds_bucket{" + labels + ',le="0.5"} 4']
+    assert "llm_prompt_tokens_total{" + labels + "} 400" in text
+    assert "# TYPE llm_call_latency_seconds histogram" in text
+
+
+def test_label_values_are_escaped(clock):
+    tracer = CallTracer(path=None)
+    with tracer.context(stage='ju"dge\\x\nnova', step="evaluation"):
+        _call(tracer, clock, 1.0)
+    text = prometheus_text(tracer.records)
+    assert 'stage="ju\\"dge\\\\x\\nnova"' in text
+    # Every sample stays on one line
+    assert all(line.startswith(("#", "llm_")) for line in text.splitlines())
+
+
+def test_retries_errors_and_outcomes_are_counted(clock):
+    tracer = CallTracer(path=None)
+    with tracer.context(stage="extract", step="validation", doc="itub-2019-3"):
+        for attempt in range(3):
+            with tracer.context(attempt=attempt):
+                if attempt == 0:
+                    _call(tracer, clock, 2.0, error=requests.exceptions.ReadTimeout("timeout"))
+                else:
+                    _call(tracer, clock, 2.0)
+                tracer.outcome("valid" if attempt == 2 else "invalid")
+    text = prometheus_text(tracer.records)
+
+    assert 'llm_retries_total{model="llama3",stage="extract"} 2' in text
+    assert 'llm_calls_total{model="llama3",stage="extract",step="validation",status="error"} 1' in text
+    assert 'llm_calls_total{model="llama3",stage="extract",step="validation",status="ok"} 2' in text
+    assert 'llm_validation_outcomes_total{model="",stage="extract",outcome="invalid"} 2' in text
+    assert tracer.records[0]["error"] == "ReadTimeout: timeout"
+    report = summary(tracer.records)
+    assert "Outcomes extract: invalid 2" in report and "itub-2019-3" in report
+
+
+def test_failover_resets_time_to_first_token(monkeypatch, clock):
+    tracer = CallTracer(path=None)
+    pool = EndpointPool(["http://a:11434", "http://b:11434"])
+    attempts = []
+
+    def stream(self, prompt, stop=None, run_manager=None, verbose=False, endpoint=None, **kwargs):
+        # The first server streams a token and then drops the connection
+        attempts.append(endpoint)
+        clock.now += 1.0
+        run_manager.on_llm_new_token("Tar")
+        clock.now += 4.0
+        if len(attempts) == 1:
+            raise requests.exceptions.ChunkedEncodingError("stream cut")
+        return GenerationChunk(text="Tarefa 1: ok")
+
+    monkeypatch.setattr(RoutedOllama, "_stream_with_aggregation", stream)
+    llm = RoutedOllama(model="llama3", pool=pool, callbacks=[tracer], cache=False)
+
+    assert llm.invoke("prompt") == "Tarefa 1: ok"
+    assert len(set(attempts)) == 2
+    record = tracer.records[-1]
+    assert record["status"] == "ok" and record["failovers"] == 1
+    assert record["ttft"] == 6.0 and record["latency"] == 10.0
+    assert 'llm_failovers_total{model="llama3",stage=""} 1' in prometheus_text(tracer.records)
@@ -0,0 +1,135 @@
+import pytest
+import requests
+import ollama_router
+from langchain_community.llms.ollama import OllamaEndpointNotFoundError
+from ollama_router import EndpointPool, fails_over
+
+A, B, C = "http://a:11434", "http://b:11434", "http://c:11434"
+
+
+def _server_error(status):
+    return ValueError(f"Ollama call failed with status code {status}. Details: erro")
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(ollama_router.time, "time", clock.time)
+    return clock
+
+
+def test_least_loaded_endpoint_first():
+    pool = EndpointPool([A, B, C])
+    first = pool.acquire()
+    second = pool.acquire()
+    third = pool.acquire()
+    assert {first.url, second.url, third.url} == {A, B, C}
+    pool.release(second, 1.0)
+    assert pool.acquire().url == second.url
+
+
+@pytest.mark.parametrize("error", [requests.exceptions.ConnectionError(), requests.exceptions.ReadTimeout(),
+                                   requests.exceptions.ChunkedEncodingError(), _server_error(503)])
+def test_failover_to_the_next_endpoint(error, clock):
+    pool = EndpointPool([A, B], cooldown=30)
+    tried = []
+
+    def request(url):
+        tried.append(url)
+        if url == A:
+            raise error
+        return "resposta"
+
+    assert pool.call(request) == "resposta"
+    assert tried == [A, B]
+    stats = {e["url"]: e for e in pool.stats()}
+    assert stats[A]["failures"] == 1 and not stats[A]["up"]
+    assert stats[B]["up"] and stats[B]["in_flight"] == 0
+    assert pool.failovers == 1
+
+
+def test_missing_model_fails_over_for_that_model_only(clock):
+    pool = EndpointPool([A, B], cooldown=30)
+    tried = []
+
+    def request(url):
+        tried.append(url)
+        if url == A:
+            raise OllamaEndpointNotFoundError("Ollama call failed with status code 404.")
+        return "resposta"
+
+    assert pool.call(request, "llama3") == "resposta"
+    assert tried == [A, B]
+    stats = {e["url"]: e for e in pool.stats()}
+    assert stats[A]["up"] and stats[A]["failures"] == 1 and stats[A]["missing"] == ["llama3"]
+    assert pool.failovers == 1
+    # The other models still go to A, this one does not until the cooldown is over
+    assert pool.acquire(exclude={B}, model="mistral").url == A
+    assert all(pool.acquire(model="llama3").url == B for _ in range(3))
+    clock.now += 31
+    assert pool.stats()[0]["missing"] == []
+
+
+@pytest.mark.parametrize("status", [400, 413, 422])
+def test_request_errors_are_raised_at_once(status):
+    pool = EndpointPool([A, B])
+    tried = []
+
+    def request(url):
+        tried.append(url)
+        raise _server_error(status)
+
+    with pytest.raises(ValueError):
+        pool.call(request)
+    assert len(tried) == 1
+    assert all(e["up"] and e["failures"] == 0 and e["in_flight"] == 0 for e in pool.stats())
+
+
+def test_every_endpoint_failing_raises_the_last_error(clock):
+    pool = EndpointPool([A, B])
+
+    def request(url):
+        raise requests.exceptions.ConnectionError(url)
+
+    with pytest.raises(requests.exceptions.ConnectionError):
+        pool.call(request)
+    assert not any(e["up"] for e in pool.stats())
+
+
+def test_cooldown(clock):
+    pool = EndpointPool([A, B], cooldown=30)
+    endpoint = next(e for e in pool.endpoints if e.url == A)
+    pool.release(pool.acquire(exclude={B}), 1.0, requests.exceptions.ConnectTimeout())
+    assert pool.acquire().url == B
+    clock.now += 29
+    assert pool.acquire(exclude={B}).url == A  # Every other endpoint excluded: tried anyway
+    pool.release(endpoint, 1.0)
+    assert endpoint.is_up(clock.now)
+    pool.release(pool.acquire(exclude={B}), 1.0, requests.exceptions.ConnectTimeout())
+    clock.now += 31
+    assert endpoint.is_up(clock.now)
+
+
+def test_down_endpoint_that_failed_first_is_retried_first(clock):
+    pool = EndpointPool([A, B], cooldown=30)
+    for url in [A, B]:
+        pool.release(pool.acquire(exclude={A, B} - {url}), 1.0, requests.exceptions.ConnectionError())
+        clock.now += 1
+    assert pool.acquire().url == A
+
+
+def test_fails_over():
+    assert fails_over(requests.exceptions.ConnectTimeout())
+    assert fails_over(_server_error(500))
+    assert fails_over(OllamaEndpointNotFoundError("Ollama call failed with status code 404."))
+    assert not fails_over(_server_error(400))
+    assert not fails_over(ValueError("`stop` found in both the input and default params."))
+    assert not fails_over(KeyError("model"))
@@ -0,0 +1,65 @@
+import json
+import shutil
+import pytest
+import prompt_registry
+from prompt_registry import get_prompt, load_registry, prompt_version, transcript_copies, update_registry
+
+
+def _clear_caches():
+    for function in [load_registry, get_prompt, transcript_copies]:
+        function.cache_clear()
+
+
+@pytest.fixture
+def prompts(tmp_path, monkeypatch):
+    """A copy of the prompt folder, so the tests can edit the templates."""
+    folder = tmp_path / "prompts"
+    shutil.copytree(prompt_registry.PROMPT_FOLDER, folder)
+    monkeypatch.setattr(prompt_registry, "PROMPT_FOLDER", str(folder))
+    monkeypatch.setattr(prompt_registry, "REGISTRY_FILE", str(folder / "registry.json"))
+    _clear_caches()
+    yield folder
+    _clear_caches()
+
+
+def test_every_template_matches_the_registry(prompts):
+    for name in load_registry():
+        assert get_prompt(name)
+
+
+def test_tampered_template_raises(prompts):
+    path = prompts / "validation.txt"
+    path.write_bytes(path.read_bytes() + b" ")
+    with pytest.raises(ValueError, match="does not match version"):
+        get_prompt("validation")
+
+
+def test_update_bumps_the_version_of_the_changed_template(prompts):
+    version = load_registry()["validation"]["version"]
+    path = prompts / "validation.txt"
+    path.write_bytes(path.read_bytes() + "\nResponda em português.".encode("utf-8"))
+
+    assert update_registry() == ["validation"]
+    assert prompt_version("validation") == f"validation@v{version + 1}"
+    assert get_prompt("validation").endswith("Responda em português.")
+    assert json.loads((prompts / "registry.json").read_text(encoding="utf-8"))["validation"]["version"] == version + 1
+    assert update_registry() == []
+
+
+def test_unknown_prompt(prompts):
+    with pytest.raises(KeyError, match="Unknown prompt"):
+        get_prompt("missing")
+
+
+@pytest.mark.parametrize("step, copies", [("extraction", 2), ("chunk", 2), ("evaluation", 1),
+                                          ("shared_evaluation", 1), ("validation", 0), ("batch_summary", 0),
+                                          (None, 0)])
+def test_transcript_copies(prompts, step, copies):
+    assert transcript_copies(step) == copies
+
+
+def test_transcript_copies_follow_the_template(prompts):
+    path = prompts / "judge_evaluation.txt"
+    path.write_text(path.read_text(encoding="utf-8") + "\nTranscrição, de novo: {context}", encoding="utf-8")
+    update_registry()
+    assert transcript_copies("evaluation") == 2
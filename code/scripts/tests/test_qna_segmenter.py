@@ -0,0 +1,35 @@
+from qna_segmenter import CONFIDENCE_THRESHOLD, segment
+
+OPENING = ("Operadora: Bom dia e obrigada por aguardarem. Sejam bem-vindos à teleconferência de resultados. "
+           "Depois da gravação, iniciaremos a sessão de perguntas e respostas. ")
+PRESENTATION = " ".join(f"A carteira de crédito cresceu {i} por cento no trimestre." for i in range(300))
+HANDOVER = "Com isso encerramos a apresentação e estamos à disposição para as perguntas. "
+QUESTIONS = " ".join(f"Analista {i}: Qual a expectativa para a margem? Diretor: A margem deve seguir estável."
+                     for i in range(20))
+CLOSING = (" Operadora: Encerramos neste momento a sessão de perguntas e respostas. "
+           "Gostaria de passar a palavra ao Diretor para as considerações finais.")
+
+
+def test_split_at_the_handover():
+    text = OPENING + PRESENTATION + " " + HANDOVER + QUESTIONS + CLOSING
+    result = segment(text)
+    assert result["qna"].startswith(HANDOVER.strip())
+    assert result["confidence"] >= CONFIDENCE_THRESHOLD
+
+
+def test_opening_announcement_is_not_the_split():
+    result = segment(OPENING + PRESENTATION + " " + QUESTIONS)
+    assert result["confidence"] < CONFIDENCE_THRESHOLD
+
+
+def test_groups_after_the_split_do_not_lower_the_confidence():
+    text = PRESENTATION + " " + HANDOVER + QUESTIONS
+    later = text + " " + " ".join(f"Operadora: Nossa próxima pergunta vem de Analista {i}. Qual o guidance?"
+                                  for i in range(5))
+    assert segment(later)["split"] == segment(text)["split"]
+    assert segment(later)["confidence"] >= segment(text)["confidence"]
+
+
+def test_closing_of_the_session_is_not_a_cue():
+    result = segment(PRESENTATION + " " + QUESTIONS + CLOSING)
+    assert result["confidence"] < CONFIDENCE_THRESHOLD
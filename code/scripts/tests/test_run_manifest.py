@@ -0,0 +1,75 @@
+import os
+from run_manifest import RunManifest, atomic_write, hash_text
+
+
+def _output(tmp_path, name="doc_output.txt"):
+    path = tmp_path / name
+    path.write_text("answer")
+    return str(path)
+
+
+def test_done_with_same_inputs_is_skipped(tmp_path):
+    manifest = RunManifest(str(tmp_path / "run.jsonl"))
+    output = _output(tmp_path)
+    manifest.start("doc", "h1")
+    manifest.complete("doc", "h1", output)
+    assert manifest.is_done("doc", "h1")
+    assert RunManifest(manifest.path).is_done("doc", "h1")
+
+
+def test_changed_inputs_are_stale(tmp_path):
+    manifest = RunManifest(str(tmp_path / "run.jsonl"))
+    manifest.complete("doc", hash_text("prompt", "text"), _output(tmp_path))
+    assert not manifest.is_done("doc", hash_text("prompt", "edited text"))
+
+
+def test_missing_output_is_not_done(tmp_path):
+    manifest = RunManifest(str(tmp_path / "run.jsonl"))
+    output = _output(tmp_path)
+    manifest.complete("doc", "h1", output)
+    os.remove(output)
+    assert not manifest.is_done("doc", "h1")
+
+
+def test_failed_and_interrupted_documents_are_requeued(tmp_path):
+    manifest = RunManifest(str(tmp_path / "run.jsonl"))
+    manifest.start("running", "h1")
+    manifest.start("failed", "h1")
+    manifest.fail("failed", "h1", ValueError("bad format"))
+    reloaded = RunManifest(manifest.path)
+    assert not reloaded.is_done("running", "h1")
+    assert not reloaded.is_done("failed", "h1")
+    assert reloaded.summary() == {"running": 1, "failed": 1}
+
+
+def test_attempts_restart_when_the_inputs_change(tmp_path):
+    manifest = RunManifest(str(tmp_path / "run.jsonl"))
+    assert manifest.start("doc", "h1") == 1
+    assert manifest.start("doc", "h1") == 2
+    assert manifest.start("doc", "h2") == 1
+
+
+def test_truncated_line_is_ignored_and_journal_compacted(tmp_path):
+    path = tmp_path / "run.jsonl"
+    manifest = RunManifest(str(path))
+    output = _output(tmp_path)
+    for _ in range(3):
+        manifest.start("doc", "h1")
+    manifest.complete("doc", "h1", output)
+    with open(path, "a") as f:
+        f.write('{"doc": "other", "sta')
+    reloaded = RunManifest(str(path))
+    assert reloaded.is_done("doc", "h1")
+    assert len(path.read_text().splitlines()) == 1
+
+
+def test_hash_text_separates_parts():
+    assert hash_text("ab", "c") != hash_text("a", "bc")
+    assert hash_text(1, "x") == hash_text("1", "x")
+
+
+def test_atomic_write_leaves_no_temporary_file(tmp_path):
+    path = tmp_path / "sub" / "out.txt"
+    atomic_write(str(path), "texto")
+    assert path.read_text() == "texto"
+    assert os.listdir(path.parent) == ["out.txt"]
@@ -0,0 +1,54 @@
+import pandas as pd
+import pytest
+from structured_results import MISSING, NEUTRAL, NO, YES, encode_labels, normalize_topics, parse_answer, parse_outputs
+
+
+@pytest.mark.parametrize("answer", [
+    '{"Taxa Selic": ["Sim", "Positivo"]}',
+    '```json\n{"Taxa Selic": ["Sim", "Positivo"]}\n```',
+    "{'Taxa Selic': ['Sim', 'Positivo']}",
+    "{'Taxa Selic': [Sim, Positivo]}",
+    "Resposta:\n{'Taxa Selic': ['Sim',\n 'Positivo']}\nObservação final.",
+    "{'Taxa Selic': {'present': 'Sim', 'sentiment': 'Positivo'}}",
+])
+def test_answer_formats(answer):
+    assert parse_answer(answer) == {"Taxa Selic": ("Sim", "Positivo")}
+
+
+def test_short_and_single_answers():
+    assert parse_answer("{'PIB': 'Não', 'Câmbio': [], 'Selic': ['Sim']}") == \
+        {"PIB": ("Não", None), "Câmbio": (None, None), "Selic": ("Sim", None)}
+
+
+def test_notebook_repairs():
+    assert parse_answer("{'Selic': [True, False]}") == {"Selic": (True, False)}
+    assert parse_answer("{'Selic': [Nenhum, Não]}") == {"Selic": ("Nenhum", "Não")}
+
+
+@pytest.mark.parametrize("answer", [None, "", "Não encontrei os tópicos."])
+def test_unreadable_answers(answer):
+    assert parse_answer(answer) is None
+
+
+def test_parse_outputs_rows_and_failures():
+    frame, failed = parse_outputs({
+        "itub-2019-3": "{'Selic': ['Sim', 'Positivo'], 'PIB': ['Não', 'Não']}",
+        "bbas-2019-3": "sem resposta",
+        "bpan-2017-4": "{'Selic': ['Sim', 'Positivo']}",  # Empty Q&A, excluded as in the notebook
+    })
+    assert failed == ["bbas-2019-3"]
+    assert frame.to_dict("records") == [
+        {"doc": "itub-2019-3", "topic": "Selic", "present": "Sim", "sentiment": "Positivo"},
+        {"doc": "itub-2019-3", "topic": "PIB", "present": "Não", "sentiment": "Não"},
+    ]
+
+
+def test_encode_labels():
+    values = pd.Series(["Sim", "não", "Positivo", "neutro", "N/A", None, "Sim, houve menção", "talvez", True])
+    assert encode_labels(values).tolist() == [YES, NO, YES, NEUTRAL, MISSING, MISSING, YES, MISSING, YES]
+
+
+def test_normalize_topics_merges_spellings():
+    topics = ["Taxa Selic", "taxa selic ", "Taxa Selic", "veículos", "Inadimplencia"]
+    assert normalize_topics(topics).tolist() == \
+        ["Taxa Selic", "Taxa Selic", "Taxa Selic", "Segmento de veículos", "Inadimplência"]
@@ -0,0 +1,40 @@
+import random
+import pytest
+from benchmark_cleaning import clean_reference, split_text_reference
+from text_cleaning import clean, split_text
+
+CASES = [
+    "",
+    "   \n  ",
+    "Linha um\nlinha dois \"citação\" “aspas”  símbolo",
+    "Itens: • um; • dois ; • três.• quatro: ; cinco.; seis",
+    "- Começa com traço; - item. - outro",
+    "Números: 1. um; e 2. dois; e três",
+    "Lista: ● um; ● dois ● três",
+    "Sr. Silva, Sra. Souza, Srs. acionistas, SR. e sra. e srs.",
+    "Subiu 50 b.p. No trimestre, 20 b.p. e 3 p.p. e bxpx",
+    "help! Obrigado. ___________________________________________________________________ fim",
+    "Espaços   múltiplos\t\te\r\nquebras",
+    "Estamos abertos para perguntas que vocês possam ter. Operadora: Nossa primeira pergunta",
+]
+
+# Characters the rules act on, mixed with plain words
+ALPHABET = ["•", ";", ":", ".", " ", "-", "●", "e", "1", "\n", "Sr", "Sra", "b.p.", "p.p.", "A", "\"", "“", "help!", "\t"]
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_clean_matches_notebook(text):
+    assert clean(text) == clean_reference(text)
+
+
+def test_clean_matches_notebook_on_random_texts():
+    generator = random.Random(0)
+    for _ in range(3000):
+        text = "".join(generator.choice(ALPHABET) for _ in range(generator.randint(0, 40)))
+        assert clean(text) == clean_reference(text), repr(text)
+
+
+@pytest.mark.parametrize("text", CASES)
+def test_split_text_matches_notebook(text):
+    cleaned = clean(text)
+    assert split_text(cleaned) == split_text_reference(cleaned)
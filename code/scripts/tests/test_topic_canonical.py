@@ -0,0 +1,81 @@
+import pytest
+from topic_canonical import TOPIC_MAPPING, TopicIndex, canonical_topics, keyword_label
+
+KEYWORD_TOPICS = [
+    "Crédito para o agronegócio",
+    "Inflação e taxa Selic",          # two rules: "selic" comes first in the notebook
+    "Crescimento do PIB e câmbio",
+    "Financiamento de veículos e imóveis",
+    "Taxa de inadimplência NPL",       # mapped first, so "npl" no longer applies
+    "Impacto das políticas do Banco Central",
+    "Carteira Middle e corporate",
+    "Perguntas dos analistas",
+    "Teleconferência de resultados",
+]
+
+
+def notebook_labels(topics):
+    """Cells 12 to 14 of notebook 6, as they were written."""
+    rules = ["agro", "veícu", "npl", "selic", "imob", "pib", "infla", "câmbio", "middle", "corporate", "banco central"]
+    labels = {"veícu": "veículos", "imob": "imobiliário", "infla": "inflação"}
+    result = []
+    for topic in topics:
+        topic = TOPIC_MAPPING.get(topic, topic)
+        if topic == "Sessão de perguntas e respostas":
+            result.append(None)
+            continue
+        topic = str(topic).lower()
+        if "teleconf" in topic or "pergunt" in topic:
+            result.append(None)
+            continue
+        for keyword in rules:
+            topic = labels.get(keyword, keyword) if keyword in topic else topic
+        result.append(topic)
+    return result
+
+
+@pytest.fixture
+def index():
+    index = TopicIndex()
+    index.seed(TOPIC_MAPPING)
+    return index
+
+
+def test_mapping_and_keyword_rules_match_the_notebook(index):
+    topics = list(TOPIC_MAPPING) + KEYWORD_TOPICS
+    assert canonical_topics(topics, index) == notebook_labels(topics)
+
+
+def test_pinned_notebook_labels(index):
+    labels = dict(zip(KEYWORD_TOPICS, canonical_topics(KEYWORD_TOPICS, index)))
+    assert labels["Inflação e taxa Selic"] == "selic"
+    assert labels["Crescimento do PIB e câmbio"] == "pib"
+    assert labels["Financiamento de veículos e imóveis"] == "veículos"
+    assert labels["Taxa de inadimplência NPL"] == "índices de inadimplência"
+    assert labels["Impacto das políticas do Banco Central"] == "impacto de políticas regulatórias"
+    assert labels["Carteira Middle e corporate"] == "middle"
+    assert labels["Perguntas dos analistas"] is None
+    # Repeated keys of the notebook dictionary: the last value wins
+    assert canonical_topics(["Inadimplência na carteira Middle", "Crescimento da margem financeira"], index) == [
+        "inadimplência", "margem financeira"]
+
+
+def test_keyword_label_takes_the_first_rule():
+    assert keyword_label("câmbio e agro") == "agro"
+    assert keyword_label("margem financeira") is None
+
+
+def test_similar_topics_share_a_label(index):
+    first, second, other = index.assign_many(["Margem financeira com clientes", "Margem financeira dos clientes",
+                                              "Programa de recompra de ações"])
+    assert first == second
+    assert other == "Programa de recompra de ações"
+
+
+def test_saved_index_keeps_assignments(tmp_path, index):
+    path = str(tmp_path / "topic_index.json")
+    label = index.assign("Programa de recompra de ações")
+    index.save(path)
+    reloaded = TopicIndex(path=path)
+    assert reloaded.assign("Programa de recompra de ações") == label
+    assert reloaded.assign("Programa de recompra das ações") == label
@@ -0,0 +1,121 @@
+import pathlib
+import numpy as np
+import pytest
+import trend_cube
+from trend_cube import MEASURES, TrendCube
+
+
+def _write(folder, doc, text):
+    folder.mkdir(exist_ok=True)
+    (folder / f"{doc}.txt_output.txt").write_text(text)
+
+
+@pytest.fixture
+def sources(tmp_path):
+    structured = tmp_path / "structured"
+    _write(structured, "itub-2020-1", "{'Taxa Selic': ['Sim', 'Positivo'], 'PIB': ['Não', 'Não']}")
+    _write(structured, "bbas-2019-3", "{'Taxa Selic': ['Sim', 'Negativo']}")
+    return {"llama": {"structured": str(structured)}}
+
+
+def _folder(sources):
+    return pathlib.Path(sources["llama"]["structured"])
+
+
+def _values(cube, **selection):
+    labels, values = cube.query(MEASURES, by=(), **selection)
+    return dict(zip(MEASURES, values.tolist()))
+
+
+def test_counts(sources):
+    cube = TrendCube(None)
+    assert cube.update(sources) == 2
+    assert cube.labels["topic"] == ["Taxa Selic", "PIB"]
+    selic = _values(cube, topics=["Taxa Selic"])
+    assert selic == {"mentions": 0, "answered": 2, "present": 2, "positive": 1, "negative": 1, "neutral": 0}
+    assert _values(cube, banks=["itub"], topics=["PIB"])["present"] == 0
+    labels, values = cube.query(["present"], by=("period",))
+    assert labels == {"period": ["2019-3", "2020-1"]}
+    assert values[:, 0].tolist() == [1, 1]
+
+
+def test_only_changed_outputs_are_parsed(sources, monkeypatch):
+    cube = TrendCube(None)
+    cube.update(sources)
+    parsed = []
+    parse = trend_cube.parse_source
+    monkeypatch.setattr(trend_cube, "parse_source", lambda source, outputs, index=None: parsed.append(sorted(outputs))
+                        or parse(source, outputs, index))
+    assert cube.update(sources) == 0
+    _write(_folder(sources), "itub-2020-1", "{'Taxa Selic': ['Não', 'Não']}")
+    assert cube.update(sources) == 1
+    assert parsed == [[], ["itub-2020-1"]]
+    # The changed document's row is replaced, not added to
+    assert _values(cube, topics=["Taxa Selic"])["answered"] == 2
+    assert _values(cube, topics=["Taxa Selic"])["present"] == 1
+    assert _values(cube, topics=["PIB"])["answered"] == 0
+
+
+def test_removed_output_is_cleared(sources):
+    cube = TrendCube(None)
+    cube.update(sources)
+    (_folder(sources) / "bbas-2019-3.txt_output.txt").unlink()
+    cube.update(sources)
+    assert _values(cube, banks=["bbas"]) == dict.fromkeys(MEASURES, 0)
+    assert _values(cube, banks=["itub"], topics=["Taxa Selic"])["present"] == 1
+
+
+def test_spellings_of_a_document_are_summed(tmp_path):
+    folder = tmp_path / "structured"
+    _write(folder, "itub-2020-1", "{'Taxa Selic': ['Sim', 'Positivo'], ' taxa selic ': ['Sim', 'Negativo']}")
+    cube = TrendCube(None)
+    cube.update({"llama": {"structured": str(folder)}})
+    assert cube.labels["topic"] == ["Taxa Selic"]
+    assert _values(cube)["present"] == 2
+
+
+def test_new_spelling_joins_the_known_topic(sources):
+    cube = TrendCube(None)
+    cube.update(sources)
+    _write(_folder(sources), "sanb-2021-2", "{'taxa selic ': ['Sim', 'Positivo']}")
+    cube.update(sources)
+    assert cube.labels["topic"] == ["Taxa Selic", "PIB"]
+    assert _values(cube, topics=["Taxa Selic"])["present"] == 3
+
+
+def test_totals_follow_the_updates(sources):
+    cube = TrendCube(None)
+    cube.update(sources)
+    assert cube.query(["present"], by=("topic",))[1][:, 0].tolist() == [0, 2]  # PIB, Taxa Selic
+    _write(_folder(sources), "sanb-2021-2", "{'PIB': ['Sim', 'Neutro']}")
+    cube.update(sources)
+    assert cube.query(["present", "neutral"], by=("topic",))[1].tolist() == [[1, 1], [2, 0]]
+
+
+def test_agreement_between_models(tmp_path):
+    first, second = tmp_path / "first", tmp_path / "second"
+    _write(first, "itub-2020-1", "{'Selic': ['Sim', 'Positivo'], 'PIB': ['Sim', 'Positivo']}")
+    _write(second, "itub-2020-1", "{'Selic': ['Sim', 'Negativo'], 'PIB': ['Não', 'Não']}")
+    _write(first, "itub-2019-3", "{'Selic': ['Não', 'Não']}")
+    cube = TrendCube(None)
+    cube.update({"a": {"structured": str(first)}, "b": {"structured": str(second)}})
+    labels, ratios, cells = cube.agreement(by=("period",))
+    assert labels == {"period": ["2019-3", "2020-1"]}
+    assert cells.tolist() == [0, 2]
+    assert ratios[1] == 0.5
+
+
+def test_save_and_load(sources, tmp_path, monkeypatch):
+    path = str(tmp_path / "cube.npz")
+    cube = TrendCube(path)
+    cube.update(sources)
+    cube.save()
+    loaded = TrendCube(path)
+    assert loaded.labels == cube.labels
+    assert np.array_equal(loaded.data, cube.data)
+    assert loaded.update(sources) == 0
+
+    monkeypatch.setattr(trend_cube, "CUBE_VERSION", trend_cube.CUBE_VERSION + 1)
+    rebuilt = TrendCube(path)
+    assert rebuilt.data.size == 0
+    assert rebuilt.update(sources) == 2
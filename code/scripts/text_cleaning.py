@@ -0,0 +1,108 @@
+"""
+Transcript cleaning and presentation / Q&A split from notebook 3.
+
+clean() returns exactly the same text as the notebook version, but with every
+regex compiled once, literal rules done with str.replace instead of re.sub,
+and each rule skipped when its trigger is not in the text, so a typical
+transcript goes through a handful of passes instead of twenty. The rules
+still run in the notebook order, since some of them act on the output of the
+previous ones (e.g. "•-" becomes "; -" and then ". ").
+"""
+import re
+
+# A bullet with the whitespace and semicolons before it; _bullet picks the part
+# the notebook pattern (\s)?(;\s)?(•) replaces. Starting with a character class
+# instead of optional groups makes the scan several times faster.
+BULLET = re.compile(r'[\s;]{0,3}•')
+COLON_DIGIT = re.compile(r'(: \d.)')
+SEMICOLON_E = re.compile(r'(; e (\d+\.)?)')
+ROUND_BULLET = re.compile(r'[:;] ●')
+TITLE = re.compile(r"Sr(a|s)?\.", re.IGNORECASE)
+BASIS_POINTS = re.compile(r'b\.p\.\s([A-Z])')
+ANY_BP = re.compile('b.p.')
+ANY_PP = re.compile('p.p.')
+
+UNDERLINE = "_______________________________________________________________"
+
+# Sentences that open the Q&A session
+QNA_START_PATTERNS = [
+    "Estamos abertos para perguntas que vocês possam ter",
+    'Era basicamente isso que a gente tinha para falar, então a gente pode ir agora para as perguntas',
+    "Encerrando a apresentação, eu gostaria agora de abrir para Perguntas e Respostas"
+]
+QNA_START = re.compile(r"|".join(QNA_START_PATTERNS), re.IGNORECASE)
+
+
+def _bullet(match):
+    # The bullet takes with it a preceding "\s;\s", ";\s" or "\s", longest first
+    before = match.group()[:-1]
+    if len(before) >= 3 and before[-3].isspace() and before[-2] == ";" and before[-1].isspace():
+        before = before[:-3]
+    elif len(before) >= 2 and before[-2] == ";" and before[-1].isspace():
+        before = before[:-2]
+    elif before and before[-1].isspace():
+        before = before[:-1]
+    return before + "; "
+
+
+def _title(match):
+    # "Sr." -> "Senhor ", "Sra." -> "Senhora ", "Srs." -> "Senhores "
+    if match.group(1) is None:
+        return "Senhor "
+    return "Senhora " if match.group(1) in "aA" else "Senhores "
+
+
+def clean(text):
+    # Line breaks become spaces; quotes and the Symbol-font bullet are dropped
+    # (str.replace is much faster than str.translate on non-ASCII text)
+    text = text.replace("\n", ' ').replace("”", '').replace("“", '').replace("\"", '').replace("\uf0b7", '').strip()
+
+    #lista com bolinha
+    if "•" in text:
+        text = BULLET.sub(_bullet, text).strip()
+    if ": ;" in text:
+        text = text.replace(": ;", ": ").strip()
+    if ".;" in text:
+        text = text.replace(".;", ". ").strip()
+
+    # nu-2021-4T21-Script 4T21.pdf
+    if "; -" in text:
+        text = text.replace("; -", ". ").strip()
+    if ". -" in text:
+        text = text.replace(". -", ". ").strip()
+    if text.startswith("-"):
+        text = text[1:].strip()
+    if ": " in text:
+        text = COLON_DIGIT.sub(': .', text).strip()
+    if "; e " in text:
+        text = SEMICOLON_E.sub('.', text).strip()
+    if "●" in text:
+        text = ROUND_BULLET.sub('.', text).strip().replace('●', '').strip()
+
+    text = text.replace(UNDERLINE, "")
+
+    text = TITLE.sub(_title, text)
+    if "b.p." in text:
+        text = BASIS_POINTS.sub('bp. \\1', text)
+    text = text.strip()
+    text = ANY_BP.sub('bp', text).strip()
+    text = ANY_PP.sub('pp', text).strip()
+    text = text.replace('help!', 'help').strip() # bmgb -> tirar a exclamação para evitar quebra de sentenças
+
+    # deixar por ultimo, pois as substituicoes anteriores podem inserir multiplos espaços
+    # (same whitespace as \s+ followed by strip, in a single pass)
+    text = " ".join(text.split())
+
+    return text
+
+
+def split_text(text):
+    """Split a cleaned transcript into (presentation, qna); qna is None if no Q&A start is found."""
+    match = QNA_START.search(text)
+    if match:
+        split_index = match.start()
+        presentation = text[:split_index].strip()
+        qna = text[split_index:].strip()
+        return presentation, qna
+    else:
+        return text, None
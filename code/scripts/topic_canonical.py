@@ -0,0 +1,428 @@
+"""
+Canonical topic labels for the extracted topics, without the GPT mapping prompt.
+
+Notebook 6 joined every unique topic into one string, asked gpt-4-turbo for a
+{'original': 'final'} dictionary, kept the answer by hand in topic_mapping,
+and then ran a dozen .apply(lambda ...) substring passes ('agro', 'npl',
+'selic', ...) over the exploded frame, one full scan per keyword.
+
+Here the keyword rules are compiled into one regex that is run once per
+unique topic string, and the remaining topics are assigned to the nearest
+canonical label: each string becomes a vector of hashed character n-grams,
+which needs no fitting, so new topics are mapped as they arrive and never
+change the vectors of the earlier ones. A topic close enough to an existing
+label (cosine similarity above the threshold) takes it; any other topic
+becomes a new canonical label. Strings already seen are mapped from a
+dictionary.
+
+The nearest label is an exact search: each block of new topics is compared
+with every row by one sparse matrix product, which only touches the rows
+sharing an n-gram with them. There are a few thousand labels at most, so no
+approximate index is needed.
+
+    python topic_canonical.py --model llama --output /tmp/topics.csv
+"""
+import os
+import re
+import json
+import argparse
+from collections import Counter
+from doc_ids import parse_doc_id
+from run_manifest import atomic_write_json
+from data_folder import DATA_FOLDER
+
+INDEX_PATH = os.path.join(DATA_FOLDER, 'cache/topic_index.json')
+
+# Standardization of notebook 6, from the GPT answer, copied as is (for the repeated keys the last value wins)
+TOPIC_MAPPING = {
+    "Impacto da Selic nas Operações": "Impactos de Taxa SELIC",
+    "Impacto da taxa Selic no mercado financeiro": "Impactos de Taxa SELIC",
+    "Efeito da política monetária": "Impactos de Política Monetária",
+    "Impacto das condições macroeconômicas": "Impactos Macroeconômicos",
+    "Cenário Macroeconômico": "Impactos Macroeconômicos",
+    "Condições macroeconômicas e impacto no crédito": "Impactos Macroeconômicos",
+    "Questões operacionais e desenvolvimento": "Desenvolvimento Operacional e Estratégico",
+    "Crescimento das transações de cartões Banricompras": "Desempenho de Segmentos de Cartões",
+    "Cenário econômico desafiador": "Desafios Econômicos",
+    "Provisões relativas à carteira do Banco Cruzeiro": "Provisões de Carteiras de Crédito",
+    "Desempenho da carteira de crédito": "Desempenho de Carteiras de Crédito",
+    "Performance da carteira de crédito": "Desempenho de Carteiras de Crédito",
+    "Crédito consignado e impactos das medidas do Banco Central": "Desempenho de Crédito Consignado",
+    "Análise de desempenho financeiro do Banco": "Desempenho Financeiro",
+    "Crescimento de receita no setor de serviços": "Desempenho de Segmentos de Serviços",
+    "Crescimento da carteira de crédito consignado": "Crescimento de Crédito Consignado",
+    "Desempenho de novas safras de empréstimos": "Desempenho de Créditos",
+    "Taxa de inadimplência NPL": "Índices de Inadimplência",
+    "NPL ratio trends": "Tendências de Inadimplência",
+    "Perspectiva de qualidade de crédito": "Qualidade de Crédito",
+    "Provisões para Devedores Duvidosos (PDD)": "Provisões para Inadimplência",
+    "Melhora da margem financeira": "Melhoria da Margem Financeira",
+    "Rendimento de equalização": "Margens e Rendimentos",
+    "Crescimento da margem financeira": "Crescimento da Margem Financeira",
+    "Desempenho da margem financeira na América Latina": "Desempenho Regional da Margem Financeira",
+    "Operação de crédito consignado": "Operações de Crédito Consignado",
+    "Projeção de crescimento de crédito": "Projeções de Crescimento de Crédito",
+    "Previsão de inadimplência futura": "Previsões de Inadimplência",
+    "Tendência de crescimento da carteira de crédito": "Tendências de Crescimento de Crédito",
+    "Estratégias de crescimento": "Estratégias de Crescimento Organizacional",
+    "Impacto das políticas do Banco Central": "Impacto de Políticas Regulatórias",
+    "Impacto das regras de Basileia 3": "Impactos de Regulamentações de Basileia",
+    "Impacto das pequenas empresas na carteira SME": "Impacto nos Segmentos de Pequenas e Médias Empresas",
+    "Impacto da política macroeconômica": "Impactos Político-Econômicos",
+    "Inovação em modelos de negócios": "Inovações em Modelos de Negócios",
+    "Impacto da reforma da previdência em impostos": "Impactos de Reformas Previdenciárias",
+
+    "Inadimplência na carteira Middle": "Inadimplência de Carteiras",
+    "Temas de inadimplência": "Inadimplência de Carteiras",
+    "Inadimplência corporativa e sazonalidade": "Inadimplência de Carteiras",
+    "Inadimplência e índice de eficiência": "Inadimplência de Carteiras",
+    "Inadimplência e estratégias de melhoria": "Inadimplência de Carteiras",
+    "Margem financeira e reprecificação da carteira": "Margem Financeira",
+    "Margem financeira (NIM)": "Margem Financeira",
+    "Expectativas para a margem financeira (NIM)": "Margem Financeira",
+    "Margens financeiras": "Margem Financeira",
+    "Crescimento da margem financeira": "Margem Financeira",
+    "Resultados Financeiros": "Desempenho Financeiro",
+    "Resultado de tesouraria 1T13": "Desempenho Financeiro",
+    "Resultados financeiros de 2022": "Desempenho Financeiro",
+    "Desempenho trimestral do Banco": "Desempenho Financeiro",
+    "Resultados financeiros Santander Brasil": "Desempenho Financeiro",
+    "Estratégia de crescimento do Banco": "Estratégias de Crescimento",
+    "Estratégia de crescimento orgânico e inorgânico": "Estratégias de Crescimento",
+    "Provisões e cobertura de risco": "Provisões e Gestão de Riscos",
+    "Provisões e gestão de riscos": "Provisões e Gestão de Riscos",
+    "Provisões": "Provisões e Gestão de Riscos",
+    "Provisão de crédito": "Provisões e Gestão de Riscos",
+    "Política de provisão de crédito": "Provisões e Gestão de Riscos",
+
+    "Inadimplência na carteira Middle": "Inadimplência",
+    "Inadimplência e recuperação de créditos": "Inadimplência",
+    "Inadimplência corporativa e sazonalidade": "Inadimplência",
+    "Temas de inadimplência": "Inadimplência",
+    "Qualidade da carteira de crédito": "Qualidade de crédito",
+    "Qualidade de carteira de crédito": "Qualidade de crédito",
+    "Qualidade dos ativos": "Qualidade de crédito",
+    "Qualidade e diversificação do portfólio": "Qualidade de crédito",
+    "Níveis de spread bancário": "Spread bancário",
+    "Impacto do spread financeiro e de risco": "Spread bancário",
+    "Spread por produto": "Spread bancário",
+    "Margem financeira e spreads": "Spread bancário",
+    "Margem financeira (NIM)": "Margem financeira",
+    "Tendência do NIM (Net Interest Margin)": "Margem financeira",
+    "Expectativas para a margem financeira (NIM)": "Margem financeira",
+    "Performance da margem financeira com clientes": "Margem financeira",
+    "Crescimento da carteira": "Crescimento da carteira",
+    "Crescimento da carteira de crédito": "Crescimento da carteira",
+    "Tendência de crescimento da carteira de crédito": "Crescimento da carteira",
+    "Crescimento da carteira PF": "Crescimento da carteira",
+    "Projeção de lucro 2023 e 2024": "Projeção de lucro",
+    "Guidance de lucro líquido": "Projeção de lucro",
+    "Projeções futuras de lucros ajustados": "Projeção de lucro",
+    "Retorno sobre o capital (ROAE)": "Rentabilidade",
+    "ROE (Retorno sobre o Patrimônio)": "Rentabilidade",
+    "Rentabilidade e ROE do banco": "Rentabilidade",
+    "Crescimento de transações de cartão de débito": "Cartões e transações",
+    "Cartão benefício e características": "Cartões e transações",
+    "Performance de cartão de crédito": "Cartões e transações",
+    "Resultados financeiros de 2022": "Resultados financeiros",
+    "Resultados financeiros trimestrais": "Resultados financeiros",
+    "Resultados financeiros e projeções futuras": "Resultados financeiros",
+    "Aumento dos custos administrativos": "Custos administrativos",
+    "Gestão de custos e eficiência operacional": "Custos administrativos",
+    "Manejo de custos e padronização de serviços no seguro saúde": "Custos administrativos",
+    "Estratégias tributárias e alíquota de impostos": "Tributação e impostos",
+    "Impactos fiscais e distribuição de JCP": "Tributação e impostos",
+    "Taxa efetiva de imposto": "Tributação e impostos",
+    "Programa BOMPRATODOS": "Programas governamentais",
+    "Participação no Auxílio Brasil": "Programas governamentais",
+    "Programas governamentais e suas influências": "Programas governamentais",
+    "Captações e margem financeira": "Captação e funding",
+    "Funding e estratégias de captação": "Captação e funding",
+    "Captação e custo de recursos": "Captação e funding",
+    "Tecnologia e transformação digital": "Digitalização",
+    "Transformação digital no banco Itaú": "Digitalização",
+    "Digitalização de serviços bancários": "Digitalização",
+    "Originação de empréstimo para PMEs": "PMEs e crédito",
+    "Créditos para pequenas e médias empresas": "PMEs e crédito",
+    "Crescimento do segmento de PMEs": "PMEs e crédito"
+}
+
+# Keyword rules of notebook 6, in its order: a topic containing the keyword becomes the label.
+# The notebook applied them one after the other, so the first matching rule wins.
+KEYWORD_RULES = [
+    ("agro", "agro"),
+    ("veícu", "veículos"),
+    ("npl", "npl"),
+    ("selic", "selic"),
+    ("imob", "imobiliário"),
+    ("pib", "pib"),
+    ("infla", "inflação"),
+    ("câmbio", "câmbio"),
+    ("middle", "middle"),
+    ("corporate", "corporate"),
+    ("banco central", "banco central"),
+]
+# Topics about the call itself, dropped by the notebook
+EXCLUDED = ["teleconf", "pergunt"]
+
+# The lookahead finds every keyword, even when two of them overlap
+KEYWORDS = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword, _ in KEYWORD_RULES) + "))")
+EXCLUDED_PATTERN = re.compile("|".join(re.escape(keyword) for keyword in EXCLUDED))
+RULE_ORDER = {keyword: i for i, (keyword, _) in enumerate(KEYWORD_RULES)}
+
+# Character n-grams within word boundaries, hashed into a fixed number of columns
+NGRAM_RANGE = (3, 5)
+N_FEATURES = 2 ** 18
+SIMILARITY_THRESHOLD = 0.6
+# New topics vectorized and compared with the index together
+BLOCK_SIZE = 512
+
+
+def keyword_label(topic):
+    """Label of the first keyword rule matching a lowercase topic, or None."""
+    found = KEYWORDS.findall(topic)
+    if not found:
+        return None
+    return KEYWORD_RULES[min(RULE_ORDER[keyword] for keyword in found)][1]
+
+
+def rule_label(topic):
+    """Topic after the exclusions and keyword rules of notebook 6 (None if excluded)."""
+    lowered = topic.lower()
+    if EXCLUDED_PATTERN.search(lowered):
+        return None
+    return keyword_label(lowered) or lowered
+
+
+def map_unique(topics, function):
+    """
+    Map a Series of topics through a function that takes the list of distinct
+    strings and returns their labels, so each string is processed only once.
+    """
+    import numpy as np
+    import pandas as pd
+
+    codes, uniques = pd.factorize(topics.astype("string"))
+    labels = np.array(list(function([str(topic) for topic in uniques])) + [None], dtype=object)  # missing: code -1
+    return pd.Series(labels[codes], index=topics.index, dtype="string")
+
+
+def apply_keyword_rules(topics):
+    """
+    Apply the exclusions and keyword rules of notebook 6 to a Series of topics
+    in one pass: each distinct string is matched once against all the
+    keywords, instead of one scan of the frame per keyword.
+    """
+    return map_unique(topics, lambda uniques: [rule_label(topic) for topic in uniques])
+
+
+def _vectorizer():
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(analyzer="char_wb", ngram_range=NGRAM_RANGE, n_features=N_FEATURES,
+                             alternate_sign=False, norm="l2", lowercase=True)
+
+
+class TopicIndex:
+    """
+    Nearest-neighbour index of canonical topic labels.
+
+    Each row of the index is the vector of a string known to mean a canonical
+    label: the label itself and the synonyms it was seeded with. assign()
+    returns the label of the most similar row, or registers the topic as a new
+    label when no row reaches the threshold.
+    """
+
+    def __init__(self, threshold=SIMILARITY_THRESHOLD, path=None):
+        self.threshold = threshold
+        self.path = path
+        self.labels = []        # canonical label of each row
+        self.strings = []       # string of each row
+        self.mapping = {}       # every topic already assigned -> canonical label
+        self._vectorizer = _vectorizer()
+        self._rows = []
+        self._matrix = None
+        if path and os.path.exists(path):
+            with open(path, "r") as f:
+                data = json.load(f)
+            self.threshold = data.get("threshold", threshold)
+            self._add_rows(data["strings"], data["labels"])
+            self.mapping = data["mapping"]
+
+    def _add_rows(self, strings, labels, vectors=None):
+        if not strings:
+            return
+        self._rows.append(self._vectorizer.transform(strings) if vectors is None else vectors)
+        self.strings.extend(strings)
+        self.labels.extend(labels)
+        self._matrix = None
+
+    def _index(self):
+        from scipy import sparse
+
+        if self._matrix is None:
+            self._matrix = sparse.vstack(self._rows).tocsr() if self._rows else None
+        return self._matrix
+
+    def seed(self, mapping):
+        """
+        Add {topic: canonical label} pairs (e.g. TOPIC_MAPPING) as rows of the
+        index. They override the labels the index had assigned to the same
+        strings, so a saved index follows the mapping when it grows. A topic
+        of the mapping keeps its label when it is also written as a label.
+        """
+        wanted = {}
+        for topic, label in mapping.items():
+            wanted[label.lower()] = (label, label)
+        for topic, label in mapping.items():
+            wanted[topic.lower()] = (topic, label)
+        strings, labels = [], []
+        for lowered, (text, label) in wanted.items():
+            if self.mapping.get(lowered) != label:
+                strings.append(text)
+                labels.append(label)
+                self.mapping[lowered] = label
+        self._add_rows(strings, labels)
+
+    def nearest(self, topic):
+        """Return (label, similarity) of the closest row, or (None, 0.0) if the index is empty."""
+        index = self._index()
+        if index is None:
+            return None, 0.0
+        similarities = (index @ self._vectorizer.transform([topic]).T).toarray().ravel()
+        best = int(similarities.argmax())
+        return self.labels[best], float(similarities[best])
+
+    def assign(self, topic):
+        """Canonical label of a topic, creating a new one if nothing is close enough."""
+        return self.assign_many([topic])[0]
+
+    def assign_many(self, topics):
+        """
+        Canonical labels of a list of topics, the same as assign() one topic
+        at a time. New topics are vectorized and compared with the index in
+        blocks; a topic that becomes a new label is a candidate for the
+        following topics of its block, and is added to the index with the block.
+        """
+        import numpy as np
+
+        new = {}
+        for topic in topics:
+            if topic.lower() not in self.mapping:
+                new.setdefault(topic.lower(), topic)
+        new = list(new.values())
+        for start in range(0, len(new), BLOCK_SIZE):
+            block = new[start:start + BLOCK_SIZE]
+            vectors = self._vectorizer.transform(block)
+            index = self._index()
+            if index is None:
+                best = np.full(len(block), -1)
+                best_similarity = np.zeros(len(block))
+            else:
+                similarities = (vectors @ index.T).toarray()
+                best = similarities.argmax(axis=1)
+                best_similarity = similarities[np.arange(len(block)), best]
+            within = (vectors @ vectors.T).toarray()
+
+            created = []
+            for i, topic in enumerate(block):
+                label = self.labels[best[i]] if best[i] >= 0 else None
+                similarity = best_similarity[i]
+                if created:
+                    j = created[int(within[i, created].argmax())]
+                    if within[i, j] > similarity:
+                        label, similarity = block[j], within[i, j]
+                if label is None or similarity < self.threshold:
+                    label = topic
+                    created.append(i)
+                self.mapping[topic.lower()] = label
+            self._add_rows([block[i] for i in created], [block[i] for i in created], vectors[created])
+        return [self.mapping[topic.lower()] for topic in topics]
+
+    def canonicalize(self, topics):
+        """Map a Series of topics to their canonical labels, assigning each distinct string once."""
+        return map_unique(topics, self.assign_many)
+
+    def save(self, path=None):
+        path = path or self.path
+        atomic_write_json(path, {"threshold": self.threshold, "strings": self.strings,
+                                 "labels": self.labels, "mapping": self.mapping})
+
+
+def canonical_topics(topics, index):
+    """
+    Final labels of a list of topics: excluded topics give None, known topics
+    (the notebook mapping and earlier assignments) their label, topics with a
+    keyword the keyword label, and the others the nearest label of the index.
+    The keyword rules are applied to the result, as the notebook did after
+    its mapping.
+    """
+    labels = [None] * len(topics)
+    to_index = []
+    for i, topic in enumerate(topics):
+        lowered = topic.lower()
+        if EXCLUDED_PATTERN.search(lowered):
+            continue
+        label = None if lowered in index.mapping else keyword_label(lowered)
+        if label:
+            labels[i] = label
+        else:
+            to_index.append(i)
+    assigned = index.assign_many([topics[i] for i in to_index])
+    for i, label in zip(to_index, assigned):
+        labels[i] = rule_label(label)
+    return labels
+
+
+def standardize_topics(exploded, index, column="topicos"):
+    """Canonical topics of an exploded frame (one row per document and topic), without the excluded rows."""
+    exploded = exploded.copy()
+    exploded[column] = map_unique(exploded[column], lambda topics: canonical_topics(topics, index))
+    return exploded[exploded[column].notna()]
+
+
+def load_topics(model):
+    """Exploded frame (doc, bank, year, trimester, topicos) of a model's extraction outputs."""
+    import pandas as pd
+    from format_validator import parse_tarefas
+    from pipeline_config import extraction_folder
+
+    rows = []
+    folder = extraction_folder(model)
+    for filename in sorted(os.listdir(folder)):
+        if not filename.endswith("output.txt"):
+            continue
+        doc, bank, year, quarter = parse_doc_id(filename.replace("txt_output", ".txt_output"))
+        with open(os.path.join(folder, filename), "r") as f:
+            for topic in parse_tarefas(f.read())["topics"]:
+                rows.append({"doc": doc, "bank": bank, "year": year, "trimester": quarter, "topicos": topic})
+    return pd.DataFrame(rows, columns=["doc", "bank", "year", "trimester", "topicos"])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Map the extracted topics to canonical labels.")
+    parser.add_argument("--model", default="chatgpt", help="Model whose extraction outputs are read")
+    parser.add_argument("--threshold", type=float, default=SIMILARITY_THRESHOLD,
+                        help="Minimum cosine similarity to join an existing label")
+    parser.add_argument("--index", default=INDEX_PATH, help="File of the index, reused across runs")
+    parser.add_argument("--output", help="Save the standardized topics to this CSV file")
+    args = parser.parse_args()
+
+    index = TopicIndex(args.threshold, args.index)
+    index.seed(TOPIC_MAPPING)
+    exploded = load_topics(args.model)
+    known = len(set(index.labels))
+    standardized = standardize_topics(exploded, index)
+    index.save()
+
+    print(f"{len(exploded)} topics ({exploded['topicos'].nunique()} distinct) -> "
+          f"{standardized['topicos'].nunique()} canonical topics, {len(set(index.labels)) - known} new labels")
+    for topic, count in Counter(standardized["topicos"]).most_common(20):
+        print(f"{count:>5}  {topic}")
+    if args.output:
+        standardized.to_csv(args.output, index=False)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,370 @@
+"""
+Traditional topic modeling of the Q&A transcripts: LDA (Gensim) and BERTopic.
+
+The corpus is tokenized once into a vocabulary and a sparse bag-of-words
+matrix (scipy CSR), cached on disk under the hash of the documents and of the
+tokenization options, so experiments with other topic counts or passes never
+rebuild them. LDA is trained with LdaMulticore, and the c_v and UMass
+coherences of every topic count are computed in parallel processes.
+
+Sentence embeddings for BERTopic are kept in a memory-mapped float32 matrix
+per embedding model, with one row per sentence keyed by the hash of its
+text: only sentences never seen before are encoded, so hyperparameter sweeps
+on CPU reuse the embeddings of every previous run.
+
+    python topic_modeling.py lda --topics 5 10 15 20 --workers 4
+    python topic_modeling.py embed
+    python topic_modeling.py bertopic --min-topic-size 10 20 40
+"""
+import os
+import re
+import json
+import time
+import argparse
+import threading
+from functools import lru_cache
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+from scipy import sparse
+from run_manifest import atomic_write_json, hash_text
+from data_folder import DATA_FOLDER, load_corpus
+
+CACHE_FOLDER = os.path.join(DATA_FOLDER, 'cache/topic_modeling/')
+
+# BERTimbau with mean pooling, loaded through sentence-transformers
+EMBEDDING_MODEL = 'neuralmind/bert-base-portuguese-cased'
+
+# Batches of new sentences encoded between two writes of the embedding index
+INDEX_CHECKPOINT = 8
+
+# Lowercase words of at least 3 letters (numbers and punctuation are dropped)
+WORD = re.compile(r"[a-zà-ÿ]{3,}")
+
+
+def portuguese_stopwords():
+    """NLTK's Portuguese stopwords, as in notebook 1."""
+    import nltk
+    from nltk.corpus import stopwords
+
+    nltk.download('stopwords', quiet=True)
+    return stopwords.words('portuguese')
+
+
+def tokenize(text, stop_words):
+    return [word for word in WORD.findall(text.lower()) if word not in stop_words]
+
+
+@lru_cache(maxsize=1)
+def _sent_tokenize():
+    import nltk
+    from nltk.tokenize import sent_tokenize
+
+    nltk.download('punkt', quiet=True)
+    nltk.download('punkt_tab', quiet=True)
+    return sent_tokenize
+
+
+def split_sentences(text):
+    """Sentences of a transcript, without the very short ones (get_sentences in notebook 3, with NLTK's Punkt)."""
+    sentences = _sent_tokenize()(text, language='portuguese')
+    return [s for s in sentences if len(s.strip()) > 2]
+
+
+class BowCorpus:
+    """
+    Vocabulary and document-term matrix of a corpus.
+
+    matrix is a scipy CSR matrix (documents x terms) of word counts, vocabulary
+    the list of terms by column, and doc_ids the documents by row.
+    """
+
+    def __init__(self, doc_ids, vocabulary, matrix):
+        self.doc_ids = doc_ids
+        self.vocabulary = vocabulary
+        self.matrix = matrix
+
+    def to_gensim(self):
+        """Return (dictionary, corpus) in Gensim's format, without tokenizing the corpus again."""
+        from gensim.corpora import Dictionary
+        from gensim.matutils import Sparse2Corpus
+
+        dictionary = Dictionary()
+        dictionary.token2id = {term: i for i, term in enumerate(self.vocabulary)}
+        dictionary.dfs = dict(enumerate(np.bincount(self.matrix.indices, minlength=len(self.vocabulary)).tolist()))
+        dictionary.num_docs = self.matrix.shape[0]
+        dictionary.num_nnz = self.matrix.nnz
+        dictionary.num_pos = int(self.matrix.sum())
+        return dictionary, Sparse2Corpus(self.matrix, documents_columns=False)
+
+    def texts(self, documents, stop_words):
+        """Tokenized documents restricted to the vocabulary (needed by the c_v coherence)."""
+        terms = set(self.vocabulary)
+        return [[word for word in tokenize(documents[doc_id], stop_words) if word in terms] for doc_id in self.doc_ids]
+
+    def save(self, folder):
+        os.makedirs(folder, exist_ok=True)
+        sparse.save_npz(os.path.join(folder, 'bow.npz'), self.matrix)
+        atomic_write_json(os.path.join(folder, 'vocabulary.json'), {"doc_ids": self.doc_ids, "vocabulary": self.vocabulary})
+
+    @classmethod
+    def load(cls, folder):
+        with open(os.path.join(folder, 'vocabulary.json'), 'r') as f:
+            data = json.load(f)
+        return cls(data["doc_ids"], data["vocabulary"], sparse.load_npz(os.path.join(folder, 'bow.npz')))
+
+
+def build_bow(documents, stop_words=None, no_below=5, no_above=0.5, keep_n=100000, cache_folder=CACHE_FOLDER):
+    """
+    Return the BowCorpus of documents ({doc_id: text}), with the same filtering
+    as Gensim's filter_extremes: terms in fewer than no_below documents or in
+    more than no_above of them are dropped, and at most keep_n terms are kept.
+    The result is cached under the hash of the documents and of the options.
+    """
+    if stop_words is None:
+        stop_words = portuguese_stopwords()
+    stop_words = set(stop_words)
+    doc_ids = sorted(documents)
+
+    key = hash_text(no_below, no_above, keep_n, *sorted(stop_words), *doc_ids, *(documents[d] for d in doc_ids))
+    folder = os.path.join(cache_folder, 'bow', key[:16]) if cache_folder else None
+    if folder and os.path.exists(os.path.join(folder, 'vocabulary.json')):
+        return BowCorpus.load(folder)
+
+    # One pass over the corpus: counts per document, kept as sparse rows
+    term_ids = {}
+    rows, columns, values = [], [], []
+    for row, doc_id in enumerate(doc_ids):
+        counts = Counter(tokenize(documents[doc_id], stop_words))
+        for term, count in counts.items():
+            rows.append(row)
+            columns.append(term_ids.setdefault(term, len(term_ids)))
+            values.append(count)
+    matrix = sparse.csr_matrix((values, (rows, columns)), shape=(len(doc_ids), len(term_ids)), dtype=np.int32)
+    terms = np.array(sorted(term_ids, key=term_ids.get), dtype=object)
+
+    # Document frequencies decide which terms are kept
+    document_frequency = np.bincount(matrix.indices, minlength=len(terms))
+    keep = (document_frequency >= no_below) & (document_frequency <= no_above * len(doc_ids))
+    kept = np.flatnonzero(keep)
+    if len(kept) > keep_n:
+        kept = kept[np.argsort(-document_frequency[kept], kind="stable")[:keep_n]]
+    kept = np.sort(kept)
+
+    bow = BowCorpus(doc_ids, terms[kept].tolist(), matrix[:, kept].tocsr())
+    if folder:
+        bow.save(folder)
+    return bow
+
+
+def train_lda(bow, num_topics, workers=None, passes=10, random_state=42):
+    """Train an LDA model on every core (workers defaults to the number of CPUs minus one)."""
+    from gensim.models import LdaMulticore
+
+    _, corpus = bow.to_gensim()
+    workers = workers or max(1, (os.cpu_count() or 2) - 1)
+    return LdaMulticore(corpus=corpus, id2word=dict(enumerate(bow.vocabulary)), num_topics=num_topics,
+                        workers=workers, passes=passes, random_state=random_state)
+
+
+def _coherence(args):
+    """Worker: c_v and UMass coherence of one trained model (given by its top words)."""
+    num_topics, topics, bow, texts = args
+    from gensim.models import CoherenceModel
+
+    dictionary, corpus = bow.to_gensim()
+    c_v = CoherenceModel(topics=topics, texts=texts, dictionary=dictionary, coherence='c_v', processes=1)
+    u_mass = CoherenceModel(topics=topics, corpus=corpus, dictionary=dictionary, coherence='u_mass', processes=1)
+    return num_topics, c_v.get_coherence(), u_mass.get_coherence()
+
+
+def lda_sweep(documents, topic_counts, stop_words=None, workers=None, passes=10, top_n=10, output_folder=None):
+    """
+    Train one LDA model per topic count and return {num_topics: {"c_v", "u_mass", "topics"}}.
+    The models are trained one after the other on every core; their coherences
+    are then computed in parallel, one process per model.
+    """
+    if stop_words is None:
+        stop_words = portuguese_stopwords()
+    bow = build_bow(documents, stop_words)
+    print(f"{len(bow.doc_ids)} documents, {len(bow.vocabulary)} terms, {bow.matrix.nnz} non-zero counts")
+
+    models = {}
+    for num_topics in topic_counts:
+        start = time.time()
+        models[num_topics] = train_lda(bow, num_topics, workers, passes)
+        print(f"LDA with {num_topics} topics trained in {time.time() - start:.1f}s")
+        if output_folder:
+            os.makedirs(output_folder, exist_ok=True)
+            models[num_topics].save(os.path.join(output_folder, f"lda_{num_topics}.model"))
+
+    texts = bow.texts(documents, stop_words)
+    topics = {
+        num_topics: [[word for word, _ in model.show_topic(i, topn=top_n)] for i in range(num_topics)]
+        for num_topics, model in models.items()
+    }
+    results = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        tasks = [(num_topics, topics[num_topics], bow, texts) for num_topics in topic_counts]
+        for num_topics, c_v, u_mass in executor.map(_coherence, tasks):
+            results[num_topics] = {"c_v": c_v, "u_mass": u_mass, "topics": topics[num_topics]}
+    return results
+
+
+class EmbeddingStore:
+    """
+    Sentence embeddings of one model, stored in a memory-mapped float32 matrix
+    (embeddings.f32) with an index from the hash of each sentence to its row
+    (index.json). Rows are only appended, so readers of older rows are never
+    affected by new ones.
+    """
+
+    def __init__(self, model_name=EMBEDDING_MODEL, cache_folder=CACHE_FOLDER):
+        self.model_name = model_name
+        self.folder = os.path.join(cache_folder, 'embeddings', model_name.replace('/', '__'))
+        os.makedirs(self.folder, exist_ok=True)
+        self.matrix_path = os.path.join(self.folder, 'embeddings.f32')
+        self.index_path = os.path.join(self.folder, 'index.json')
+        self._lock = threading.Lock()
+        self._encoder = None
+
+        self.index = {}
+        self.dim = None
+        if os.path.exists(self.index_path):
+            with open(self.index_path, 'r') as f:
+                data = json.load(f)
+            self.index, self.dim = data["index"], data["dim"]
+
+    def encoder(self):
+        if self._encoder is None:
+            from sentence_transformers import SentenceTransformer
+            self._encoder = SentenceTransformer(self.model_name)
+        return self._encoder
+
+    def _matrix(self):
+        if not self.index:
+            return None
+        return np.memmap(self.matrix_path, dtype=np.float32, mode='r', shape=(len(self.index), self.dim))
+
+    def _append(self, vectors):
+        # Write the new rows after the indexed ones (dropping rows of an interrupted run), then publish them in the index
+        vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+        with open(self.matrix_path, 'ab') as f:
+            f.truncate(len(self.index) * self.dim * 4)
+            f.write(vectors.tobytes())
+
+    def _save_index(self):
+        atomic_write_json(self.index_path, {"model": self.model_name, "dim": self.dim, "index": self.index})
+
+    def embed(self, sentences, batch_size=64, encode=None):
+        """
+        Return the embeddings of the sentences (one row per sentence), encoding
+        only the ones not in the store. encode(texts) may replace the
+        sentence-transformers model. The index is written every
+        INDEX_CHECKPOINT batches and at the end, so an interrupted run only
+        encodes again the rows written after the last checkpoint.
+        """
+        keys = [hash_text(sentence) for sentence in sentences]
+        with self._lock:
+            missing = list(dict.fromkeys(key for key in keys if key not in self.index))
+            if missing:
+                texts = {key: sentence for key, sentence in zip(keys, sentences)}
+                encode = encode or (lambda batch: self.encoder().encode(batch, batch_size=batch_size, convert_to_numpy=True))
+                start = time.time()
+                step = batch_size * 16
+                saved = len(self.index)
+                try:
+                    for number, i in enumerate(range(0, len(missing), step), 1):
+                        batch = missing[i:i + step]
+                        vectors = np.asarray(encode([texts[key] for key in batch]), dtype=np.float32)
+                        if self.dim is None:
+                            self.dim = vectors.shape[1]
+                        self._append(vectors)
+                        for key in batch:
+                            self.index[key] = len(self.index)
+                        if number % INDEX_CHECKPOINT == 0:
+                            self._save_index()
+                            saved = len(self.index)
+                finally:
+                    if len(self.index) > saved:
+                        self._save_index()
+                print(f"Encoded {len(missing)} new sentences in {time.time() - start:.1f}s "
+                      f"({len(keys) - len(missing)} read from the store)")
+            matrix = self._matrix()
+
+        if matrix is None:
+            return np.zeros((0, self.dim or 0), dtype=np.float32)
+        return matrix[[self.index[key] for key in keys]]
+
+
+def corpus_sentences(documents):
+    """Split the documents into sentences; returns the sentences and the doc_id of each one."""
+    sentences, owners = [], []
+    for doc_id in sorted(documents):
+        for sentence in split_sentences(documents[doc_id]):
+            sentences.append(sentence)
+            owners.append(doc_id)
+    return sentences, owners
+
+
+def bertopic_sweep(sentences, embeddings, param_grid):
+    """
+    Fit one BERTopic model per parameter set (dictionaries of BERTopic
+    arguments) on precomputed embeddings. Returns [(params, model, topics)].
+    """
+    from bertopic import BERTopic
+
+    results = []
+    for params in param_grid:
+        start = time.time()
+        model = BERTopic(embedding_model=None, calculate_probabilities=False, **params)
+        topics, _ = model.fit_transform(sentences, embeddings)
+        num_topics = len(set(topics)) - (1 if -1 in topics else 0)
+        outliers = sum(1 for topic in topics if topic == -1) / max(len(topics), 1)
+        print(f"BERTopic {params}: {num_topics} topics, {outliers:.1%} outliers, {time.time() - start:.1f}s")
+        results.append((params, model, topics))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="LDA and BERTopic on the Q&A transcripts.")
+    parser.add_argument("command", choices=["lda", "embed", "bertopic"])
+    parser.add_argument("--topics", nargs="+", type=int, default=[5, 10, 15, 20], help="Topic counts (lda)")
+    parser.add_argument("--passes", type=int, default=10, help="Passes over the corpus (lda)")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPUs minus one)")
+    parser.add_argument("--model", default=EMBEDDING_MODEL, help="Sentence embedding model (embed, bertopic)")
+    parser.add_argument("--min-topic-size", nargs="+", type=int, default=[10], help="Values to sweep (bertopic)")
+    parser.add_argument("--output", help="Folder for the trained models and the results")
+    parser.add_argument("--banks", nargs="+", help="Only the transcripts of these banks (default: all)")
+    parser.add_argument("--years", nargs=2, type=int, metavar=("FIRST", "LAST"),
+                        help="Only the transcripts of this inclusive year range")
+    parser.add_argument("--store", action="store_true", help="Read the transcripts from the corpus store")
+    args = parser.parse_args()
+
+    documents = load_corpus(os.path.join(DATA_FOLDER, 'qna/'), args.banks, args.years, args.store)
+    print(f"Loaded {len(documents)} transcripts")
+
+    if args.command == "lda":
+        results = lda_sweep(documents, args.topics, workers=args.workers, passes=args.passes, output_folder=args.output)
+        for num_topics, result in sorted(results.items()):
+            print(f"{num_topics:>3} topics: c_v {result['c_v']:.4f}, UMass {result['u_mass']:.4f}")
+        if args.output:
+            atomic_write_json(os.path.join(args.output, 'lda_coherence.json'), results)
+        return
+
+    sentences, owners = corpus_sentences(documents)
+    store = EmbeddingStore(args.model)
+    embeddings = store.embed(sentences)
+    print(f"{len(sentences)} sentences, embeddings {embeddings.shape} in {store.folder}")
+
+    if args.command == "bertopic":
+        grid = [{"min_topic_size": size} for size in args.min_topic_size]
+        for params, model, topics in bertopic_sweep(sentences, embeddings, grid):
+            if args.output:
+                os.makedirs(args.output, exist_ok=True)
+                model.save(os.path.join(args.output, f"bertopic_min{params['min_topic_size']}"),
+                           serialization="safetensors", save_ctfidf=True)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,389 @@
+"""
+Bank x quarter x topic aggregates of the model outputs (notebook 6).
+
+The notebook rebuilds its topic counts and sentiment trends from the outputs
+on every run: explode, bank/year/trimester columns split row by row, then a
+groupby or a pivot per chart. TrendCube keeps them precomputed in one int16
+array of shape (models, banks, quarters, topics, measures), the measures being
+
+    mentions    times the topic was extracted (canonical labels of topic_canonical.py)
+    answered    the structured output has an answer for the topic
+    present     answered "Sim" for present
+    positive, negative, neutral
+                sentiment of the topics answered present
+
+A transcript is one bank in one quarter, so each output fills one
+(model, bank, quarter) row. An update hashes every output file and only
+parses the ones that changed since the last update, overwriting their rows;
+new banks, quarters and topics extend the axes. The cube is saved as a
+compressed .npz (mostly zeros) with its axes and hashes.
+
+Queries take labels for each axis, sum the selected slice over the axes not
+kept and return a small array, without touching the outputs:
+
+    python trend_cube.py update
+    python trend_cube.py query --topics "Taxa Selic" --by period
+    python trend_cube.py query --banks itub bbas --years 2015 2020 --by bank topic --measures present positive
+    python trend_cube.py agreement --by period
+"""
+import os
+import json
+import time
+import argparse
+from collections import Counter
+from doc_ids import parse_doc_id
+from run_manifest import hash_text
+from data_folder import DATA_FOLDER
+
+CUBE_PATH = os.path.join(DATA_FOLDER, 'cache/trend_cube.npz')
+
+AXES = ["model", "bank", "period", "topic"]
+MEASURES = ["mentions", "answered", "present", "positive", "negative", "neutral"]
+# Measures filled by each kind of output
+SOURCE_MEASURES = {"extraction": ["mentions"], "structured": MEASURES[1:]}
+# Bump when the parsing changes, so every output is parsed again
+CUBE_VERSION = 4
+
+
+def period_label(year, quarter):
+    return f"{year}-{quarter}"
+
+
+class TrendCube:
+    """Counts per model, bank, quarter (period) and topic, updated document by document."""
+
+    def __init__(self, path=CUBE_PATH):
+        import numpy as np
+
+        self.path = path
+        self.labels = {axis: [] for axis in AXES}
+        self.positions = {axis: {} for axis in AXES}
+        self.hashes = {}    # {model: {source: {doc: hash of the output}}}
+        self.data = np.zeros((0, 0, 0, 0, len(MEASURES)), dtype=np.int16)
+        self._totals = None  # Sums over every bank and period, kept until the next update
+        if path and os.path.exists(path):
+            self._load(path)
+
+    # Axes
+
+    def _grow(self, new_labels):
+        """Add the labels ({axis: [labels]}) missing from the axes, resizing the array once."""
+        import numpy as np
+
+        padding = []
+        for axis in AXES:
+            added = 0
+            for label in new_labels.get(axis, []):
+                if label not in self.positions[axis]:
+                    self.positions[axis][label] = len(self.labels[axis])
+                    self.labels[axis].append(label)
+                    added += 1
+            padding.append((0, added))
+        if any(after for _, after in padding):
+            self.data = np.pad(self.data, padding + [(0, 0)])
+
+    def _indices(self, axis, labels):
+        import numpy as np
+
+        if labels is None:
+            # Every label, sorted, so the results do not depend on the order the outputs were parsed in
+            return np.array(sorted(range(len(self.labels[axis])), key=self.labels[axis].__getitem__), dtype=np.intp)
+        return np.array([self.positions[axis][label] for label in labels if label in self.positions[axis]], dtype=np.intp)
+
+    def periods(self, years=None, quarters=None):
+        """Period labels ("2019-3") of an inclusive (first, last) year range and a list of quarters."""
+        selected = []
+        for label in sorted(self.labels["period"]):
+            year, quarter = (int(part) for part in label.split("-"))
+            if years and not years[0] <= year <= years[1]:
+                continue
+            if quarters and quarter not in quarters:
+                continue
+            selected.append(label)
+        return selected
+
+    # Updates
+
+    def update(self, sources, topic_index=None):
+        """
+        Parse the outputs that changed since the last update. sources maps each
+        model to its {"extraction": folder, "structured": folder or CSV}; a
+        missing path is skipped. Documents whose output disappeared are removed.
+        Returns the number of documents parsed.
+        """
+        rows = []    # (model, source, doc, {topic: values of the source's measures})
+        removed = []
+        for model, paths in sources.items():
+            for source, path in paths.items():
+                if not path or not os.path.exists(path):
+                    continue
+                outputs = read_source(source, path)
+                known = self.hashes.get(model, {}).get(source, {})
+                hashes = {doc: hash_text(CUBE_VERSION, text) for doc, text in outputs.items()}
+                changed = {doc: outputs[doc] for doc in outputs if known.get(doc) != hashes[doc]}
+                for doc, counts in parse_source(source, changed, topic_index).items():
+                    rows.append((model, source, doc, counts))
+                removed += [(model, source, doc) for doc in known if doc not in outputs]
+                self.hashes.setdefault(model, {})[source] = hashes
+
+        # Topics differing only in case or spaces take the spelling already in the cube, or the first one seen
+        spellings = {label.strip().lower(): label for label in self.labels["topic"]}
+        rows = [(model, source, doc, _merge_topics(counts, spellings)) for model, source, doc, counts in rows]
+
+        new_labels = {axis: [] for axis in AXES}
+        for model, _, doc, counts in rows:
+            _, bank, year, quarter = parse_doc_id(doc)
+            new_labels["model"].append(model)
+            new_labels["bank"].append(bank)
+            new_labels["period"].append(period_label(year, quarter))
+            new_labels["topic"].extend(counts)
+        self._grow(new_labels)
+
+        for model, source, doc, counts in rows + [(model, source, doc, {}) for model, source, doc in removed]:
+            self._write_row(model, source, doc, counts)
+        if rows or removed:
+            self._totals = None
+        return len(rows)
+
+    def _write_row(self, model, source, doc, counts):
+        _, bank, year, quarter = parse_doc_id(doc)
+        cell = (self.positions["model"][model], self.positions["bank"][bank],
+                self.positions["period"][period_label(year, quarter)])
+        measures = [MEASURES.index(measure) for measure in SOURCE_MEASURES[source]]
+        row = self.data[cell]
+        row[:, measures] = 0
+        for topic, values in counts.items():
+            row[self.positions["topic"][topic], measures] = values
+
+    # Queries
+
+    def query(self, measures=None, by=(), models=None, banks=None, periods=None, topics=None):
+        """
+        Sum of the measures over the selected slice, keeping the axes in by.
+        Returns ({axis: labels} of the kept axes, array of shape
+        (len(labels) of each kept axis..., len(measures))).
+        """
+        import numpy as np
+
+        measures = measures or MEASURES
+        selection = {"model": models, "bank": banks, "period": periods, "topic": topics}
+        indices = {axis: self._indices(axis, selection[axis]) for axis in AXES}
+        columns = [MEASURES.index(m) for m in measures]
+        axes = AXES
+        if banks is None and periods is None and "bank" not in by and "period" not in by:
+            # Whole-corpus rankings come from the totals instead of the full array
+            if self._totals is None:
+                self._totals = self.data.sum(axis=(1, 2), dtype=np.int64)
+            axes = ["model", "topic"]
+            values = self._totals[np.ix_(indices["model"], indices["topic"], columns)]
+        else:
+            values = self.data[np.ix_(*(indices[axis] for axis in AXES), columns)]
+        summed = tuple(i for i, axis in enumerate(axes) if axis not in by)
+        values = values.sum(axis=summed, dtype=np.int64)
+        # Kept axes in the order asked
+        kept = [axis for axis in axes if axis in by]
+        values = np.moveaxis(values, [kept.index(axis) for axis in by], list(range(len(by))))
+        return {axis: [self.labels[axis][i] for i in indices[axis]] for axis in by}, values
+
+    def agreement(self, by=(), models=None, banks=None, periods=None, topics=None):
+        """
+        Share of the (bank, period, topic) cells answered by every selected
+        model in which all of them agree on present, keeping the axes in by
+        (bank, period or topic). Returns ({axis: labels}, ratios, cells).
+        """
+        import numpy as np
+
+        selection = {"model": models, "bank": banks, "period": periods, "topic": topics}
+        indices = {axis: self._indices(axis, selection[axis]) for axis in AXES}
+        values = self.data[np.ix_(*(indices[axis] for axis in AXES),
+                                  [MEASURES.index("answered"), MEASURES.index("present")])]
+        answered = (values[..., 0] > 0).all(axis=0)
+        agree = answered & (values[..., 1] == values[:1, ..., 1]).all(axis=0)
+        summed = tuple(i for i, axis in enumerate(AXES[1:]) if axis not in by)
+        cells = answered.sum(axis=summed)
+        agreeing = agree.sum(axis=summed)
+        kept = [axis for axis in AXES[1:] if axis in by]
+        order = [kept.index(axis) for axis in by]
+        cells = np.moveaxis(cells, order, list(range(len(by))))
+        agreeing = np.moveaxis(agreeing, order, list(range(len(by))))
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratios = agreeing / cells
+        return {axis: [self.labels[axis][i] for i in indices[axis]] for axis in by}, ratios, cells
+
+    def frame(self, measures=None, by=(), **selection):
+        """query() as a DataFrame, one row per combination of the kept labels, with the sentiment ratio."""
+        import pandas as pd
+
+        measures = measures or MEASURES
+        labels, values = self.query(measures, by, **selection)
+        index = pd.MultiIndex.from_product([labels[axis] for axis in by], names=list(by)) if by else [0]
+        frame = pd.DataFrame(values.reshape(-1, len(measures)), index=index, columns=measures)
+        if "present" in frame and "positive" in frame:
+            frame["positive_ratio"] = frame["positive"] / frame["present"].where(frame["present"] > 0)
+        return frame.sort_index() if by else frame
+
+    # Storage
+
+    def save(self, path=None):
+        """Save the cube as a compressed .npz, through a temporary file."""
+        import numpy as np
+
+        path = path or self.path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        meta = {"version": CUBE_VERSION, "labels": self.labels, "hashes": self.hashes}
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez_compressed(f, data=self.data, meta=np.array(json.dumps(meta, ensure_ascii=False)))
+        os.replace(tmp_path, path)
+
+    def _load(self, path):
+        import numpy as np
+
+        with np.load(path) as stored:
+            meta = json.loads(str(stored["meta"]))
+            if meta.get("version") != CUBE_VERSION:
+                return  # Parsed by another version: rebuilt by the next update
+            self.data = stored["data"]
+        self.labels = meta["labels"]
+        self.positions = {axis: {label: i for i, label in enumerate(labels)} for axis, labels in self.labels.items()}
+        self.hashes = meta["hashes"]
+
+
+def read_source(source, path):
+    """Outputs of a model as {doc: text}: extraction output files, or structured outputs (folder or CSV)."""
+    if source == "structured":
+        from structured_results import read_outputs
+        return read_outputs(path)
+
+    outputs = {}
+    for filename in sorted(os.listdir(path)):
+        if filename.endswith("output.txt"):
+            with open(os.path.join(path, filename), "r") as f:
+                # The ChatGPT files have no dot before "txt"
+                outputs[parse_doc_id(filename.replace("txt_output", ".txt_output"))[0]] = f.read()
+    return outputs
+
+
+def parse_source(source, outputs, topic_index=None):
+    """Per-document counts {doc: {topic: values of the source's measures}} of the outputs ({doc: text})."""
+    if not outputs:
+        return {}
+    if source == "extraction":
+        return _parse_extraction(outputs, topic_index)
+    return _parse_structured(outputs)
+
+
+def _parse_extraction(outputs, topic_index):
+    from format_validator import parse_tarefas
+    from topic_canonical import INDEX_PATH, TOPIC_MAPPING, TopicIndex, canonical_topics
+
+    if topic_index is None:
+        topic_index = TopicIndex(path=INDEX_PATH)
+        topic_index.seed(TOPIC_MAPPING)
+    docs, topics = [], []
+    for doc, text in outputs.items():
+        for topic in parse_tarefas(text)["topics"]:
+            docs.append(doc)
+            topics.append(topic)
+    # Canonical labels of every new topic in one call, so the index compares them in blocks
+    distinct = list(dict.fromkeys(topics))
+    labels = dict(zip(distinct, canonical_topics(distinct, topic_index)))
+    if topic_index.path:
+        topic_index.save()
+
+    counts = {doc: Counter() for doc in outputs}
+    for doc, topic in zip(docs, topics):
+        if labels[topic] is not None:
+            counts[doc][labels[topic]] += 1
+    return {doc: {topic: [count] for topic, count in doc_counts.items()} for doc, doc_counts in counts.items()}
+
+
+def _parse_structured(outputs):
+    import numpy as np
+    from structured_results import NEUTRAL, NO, YES, encode_labels, normalize_topics, parse_outputs
+
+    frame, failed = parse_outputs(outputs)
+    if failed:
+        print(f"{len(failed)} structured outputs could not be read")
+    counts = {doc: {} for doc in outputs}
+    if frame.empty:
+        return counts
+    # As in structured_results.build_results: anything but "Sim" is not present
+    present = encode_labels(frame["present"])
+    answered = np.ones(len(frame), dtype=np.int16)
+    present = (present == YES).astype(np.int16)
+    sentiment = encode_labels(frame["sentiment"])
+    positive = ((sentiment == YES) & (present == 1)).astype(np.int16)
+    negative = ((sentiment == NO) & (present == 1)).astype(np.int16)
+    neutral = ((sentiment == NEUTRAL) & (present == 1)).astype(np.int16)
+    # Spellings of a topic are merged as in structured_results, and a document's rows of a same topic summed
+    topics = normalize_topics(frame["topic"])
+    for doc, topic, *values in zip(frame["doc"], topics, answered, present, positive, negative, neutral):
+        previous = counts[doc].get(topic, [0] * len(values))
+        counts[doc][topic] = [total + int(value) for total, value in zip(previous, values)]
+    return counts
+
+
+def _merge_topics(counts, spellings):
+    """Counts ({topic: values}) with the topics in the spelling of spellings, the values of a same topic summed."""
+    merged = {}
+    for topic, values in counts.items():
+        topic = spellings.setdefault(topic.strip().lower(), topic.strip())
+        merged[topic] = [a + b for a, b in zip(merged[topic], values)] if topic in merged else list(values)
+    return merged
+
+
+def default_sources(models):
+    """Extraction and structured outputs of each model, where the pipeline writes them."""
+    from pipeline_config import extraction_folder
+    from structured_results import structured_source
+
+    return {model: {"extraction": extraction_folder(model), "structured": structured_source(model)} for model in models}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bank x quarter x topic aggregates of the model outputs.")
+    parser.add_argument("command", choices=["update", "query", "agreement"],
+                        help="update: parse the new outputs; query: counts of a slice; agreement: between models")
+    parser.add_argument("--cube", default=CUBE_PATH, help="Cube file")
+    parser.add_argument("--models", nargs="+", help="Models (update: default chatgpt, llama, qwen; query: all)")
+    parser.add_argument("--banks", nargs="+", help="Only these banks")
+    parser.add_argument("--years", nargs=2, type=int, metavar=("FIRST", "LAST"), help="Inclusive year range")
+    parser.add_argument("--quarters", nargs="+", type=int, help="Only these quarters")
+    parser.add_argument("--topics", nargs="+", help="Only these topics")
+    parser.add_argument("--measures", nargs="+", choices=MEASURES, help="Measures to show (default: all)")
+    parser.add_argument("--by", nargs="*", choices=AXES, default=["topic"], help="Axes kept in the result")
+    parser.add_argument("--output", help="Save the result to this CSV file")
+    args = parser.parse_args()
+
+    cube = TrendCube(args.cube)
+    if args.command == "update":
+        start = time.time()
+        parsed = cube.update(default_sources(args.models or ["chatgpt", "llama", "qwen"]))
+        cube.save()
+        print(f"{parsed} outputs parsed in {time.time() - start:.2f}s; cube of shape {cube.data.shape} saved to {cube.path}")
+        return
+
+    periods = cube.periods(args.years, args.quarters) if args.years or args.quarters else None
+    selection = {"models": args.models, "banks": args.banks, "periods": periods, "topics": args.topics}
+    start = time.perf_counter()
+    if args.command == "query":
+        cube.query(args.measures, args.by, **selection)
+        elapsed = time.perf_counter() - start
+        result = cube.frame(args.measures, args.by, **selection)
+    else:
+        by = [axis for axis in args.by if axis != "model"]
+        labels, ratios, cells = cube.agreement(by, **selection)
+        elapsed = time.perf_counter() - start
+        import pandas as pd
+        index = pd.MultiIndex.from_product([labels[axis] for axis in by], names=by) if by else [0]
+        result = pd.DataFrame({"agreement": ratios.ravel(), "cells": cells.ravel()}, index=index)
+    print(result.to_string())
+    print(f"Slice computed in {elapsed * 1000:.3f}ms")
+    if args.output:
+        result.to_csv(args.output)
+        print(f"Saved to {args.output}")
+
+
+if __name__ == '__main__':
+    main()